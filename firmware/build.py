@@ -0,0 +1,60 @@
+"""
+    Compiles the firmware in src/ to MicroPython bytecode (.mpy) in firmware/build/, ready to copy to
+    the Pico in place of src/.
+
+        python firmware/build.py [--mpy-cross mpy-cross]
+
+    Importing a .mpy skips compiling the source on the Pico, which is most of the cost of an import and
+    needs a lot of RAM for the bigger modules. main.py, which the Pico runs by name, and ClockSettings.py,
+    which holds your own settings, are copied as source. mpy-cross (pip install mpy-cross) must emit the
+    .mpy version the firmware on the Pico loads, see mpy-cross --version.
+
+    To freeze the modules into the MicroPython firmware image itself, which also keeps their bytecode
+    in flash rather than RAM, build MicroPython with firmware/manifest.py.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(_ROOT, "src")
+BUILD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "build")
+
+# Left as source on the Pico
+SOURCE_MODULES = ("main.py", "ClockSettings.py")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mpy-cross", default="mpy-cross", help="the mpy-cross compiler to use")
+    args = parser.parse_args()
+
+    if shutil.which(args.mpy_cross) is None:
+        sys.exit(f"{args.mpy_cross} not found, install it with: pip install mpy-cross")
+
+    if os.path.isdir(BUILD_DIR):
+        shutil.rmtree(BUILD_DIR)
+    os.makedirs(BUILD_DIR)
+
+    for name in sorted(os.listdir(SRC_DIR)):
+        if not name.endswith(".py"):
+            continue
+
+        source = os.path.join(SRC_DIR, name)
+        if name in SOURCE_MODULES:
+            shutil.copy(source, BUILD_DIR)
+            print(f"  {name}")
+            continue
+
+        # The RP2040 is a Cortex-M0+, which only matters to modules using @micropython.native or viper
+        output = os.path.join(BUILD_DIR, name[:-3] + ".mpy")
+        subprocess.run([args.mpy_cross, "-march=armv6m", "-o", output, "-s", name, source], check=True)
+        print(f"  {name[:-3]}.mpy")
+
+    print(f"Built {BUILD_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Freezes the clock firmware into a MicroPython image for the Pico W. From the MicroPython source tree:
+#
+#   make -C ports/rp2 BOARD=RPI_PICO_W FROZEN_MANIFEST=/path/to/SmartCuckooClock/firmware/manifest.py
+#
+# Frozen modules run their bytecode straight from flash, so importing one neither compiles it nor copies it
+# into RAM. main.py and ClockSettings.py are left out, so they still go on the Pico's filesystem and can be
+# changed without rebuilding the image.
+
+include("$(BOARD_DIR)/manifest.py")
+require("umqtt.simple")
+
+freeze(
+    "../src",
+    (
+        "Animation.py",
+        "Breathing.py",
+        "Chime.py",
+        "ChimeSchedule.py",
+        "Clock.py",
+        "ClockManager.py",
+        "Colour.py",
+        "ColourPipeline.py",
+        "CoreLink.py",
+        "DialRing.py",
+        "Dimmer.py",
+        "Discovery.py",
+        "LightMeter.py",
+        "Log.py",
+        "Metrics.py",
+        "MqttManager.py",
+        "Pendulum.py",
+        "PioNeoPixel.py",
+        "RenderCore.py",
+        "RingPatterns.py",
+        "Scheduler.py",
+        "TimeSync.py",
+    ),
+)
@@ -0,0 +1,3 @@
+"""
+    Host-side simulation of the clock firmware, used for benchmarking the code in src/ off-device.
+"""
@@ -0,0 +1,139 @@
+"""
+    Runs the clock firmware in the simulation and reports where the time and memory went.
+
+        python -m sim [--scenario day] [--hours 24] [--trace trace.csv] [--no-allocs] [--pio]
+
+    CPU time is real (host) CPU time grouped by firmware module and by core (the second core is a thread,
+    see RenderCore), allocations are the bytes allocated by each scheduler task (tracemalloc), and the
+    trace is every PWM, pin, NeoPixel and RTC write.
+"""
+import argparse
+import builtins
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+
+from sim import harness
+from sim.scenarios import SCENARIOS, HOUR_MS
+from sim.simulation import Simulation
+
+from ClockSettings import ClockSettings
+from Scheduler import Scheduler
+import neopixel
+import rp2
+
+
+def _profile_task_allocations() -> dict:
+    allocations = {}
+    run_task = Scheduler._run_task
+
+    def _run_task(self, task, now):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run_task(self, task, now)
+        entry = allocations.setdefault(task.name, [0, 0])
+        entry[0] += 1
+        entry[1] += max(0, tracemalloc.get_traced_memory()[1] - before)
+
+    Scheduler._run_task = _run_task
+    return allocations
+
+
+def _cpu_by_module(profile: cProfile.Profile) -> dict:
+    totals = {}
+    if not profile.getstats():
+        return totals
+    stats = pstats.Stats(profile).stats
+    for (filename, _, name), (_, _, tottime, _, _) in stats.items():
+        if "_thread.lock" in name:
+            # A core waiting for the other to move virtual time on, not doing anything
+            continue
+        if filename.startswith(harness.SRC_DIR):
+            module = os.path.basename(filename)
+        elif filename.startswith(harness.FAKES_DIR):
+            module = "(fake hardware)"
+        else:
+            module = "(host runtime)"
+        totals[module] = totals.get(module, 0) + tottime
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="day")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--trace", help="write the output trace to this CSV file")
+    parser.add_argument("--no-allocs", action="store_true", help="skip allocation tracking, which slows the run")
+    parser.add_argument("--verbose", action="store_true", help="show the firmware's console output")
+    parser.add_argument("--pio", action="store_true", help="drive the dial ring through the PIO / DMA backend")
+    args = parser.parse_args()
+
+    report = builtins.print
+    if not args.verbose:
+        builtins.print = lambda *a, **k: None
+
+    sim = Simulation()
+    ClockSettings.dial_ring_pio = args.pio
+    SCENARIOS[args.scenario](sim, args.hours)
+
+    allocations = {}
+    if not args.no_allocs:
+        tracemalloc.start()
+        allocations = _profile_task_allocations()
+
+    profile = cProfile.Profile()
+    harness.clock.core_profile = core_profile = cProfile.Profile()
+    wall_start = time.perf_counter()
+    profile.enable()
+    sim.run(int(args.hours * HOUR_MS))
+    profile.disable()
+    wall = time.perf_counter() - wall_start
+    sim.close()
+
+    report(f"Simulated {args.hours:g} h ({args.scenario}) in {wall:.1f} s, {args.hours * 3600 / wall:.0f}x real time")
+    report(f"Boot ready after {sim.boot_ms} ms (virtual)")
+
+    report("")
+    report(f"{'CPU by module':<28}{'core 0 s':>10}{'core 1 s':>10}{'us / sim hour':>16}")
+    cores = (_cpu_by_module(profile), _cpu_by_module(core_profile))
+    modules = set(cores[0]) | set(cores[1])
+    for module in sorted(modules, key=lambda m: -(cores[0].get(m, 0) + cores[1].get(m, 0))):
+        first, second = cores[0].get(module, 0), cores[1].get(module, 0)
+        report(f"{module:<28}{first:>10.3f}{second:>10.3f}{(first + second) * 1e6 / args.hours:>16.0f}")
+
+    if allocations:
+        report("")
+        report(f"{'Allocations by task':<28}{'runs':>10}{'bytes':>14}{'bytes / run':>14}")
+        for name, (runs, allocated) in sorted(allocations.items(), key=lambda i: -i[1][1]):
+            report(f"{name:<28}{runs:>10}{allocated:>14}{allocated / runs:>14.1f}")
+
+    report("")
+    report(f"{'Output trace':<28}{'writes':>10}")
+    for device, count in sorted(sim.trace.summary().items()):
+        report(f"{device:<28}{count:>10}")
+    report(f"{'MQTT publishes':<28}{len(sim.broker.published):>10}")
+
+    report("")
+    if args.pio:
+        transfers = rp2.transfers
+        report(f"Dial ring (PIO / DMA): {len(transfers)} frames, CPU blocked for {sum(t[3] for t in transfers)} us "
+               f"waiting on {sum(1 for t in transfers if t[3] > 0)} transfers, {len(rp2.merged)} sent before the last had latched")
+    else:
+        report(f"Dial ring (neopixel): {neopixel.NeoPixel.frames} frames, CPU blocked for {neopixel.NeoPixel.blocked_us} us")
+
+    metrics = sim.metrics()
+    if metrics:
+        report("")
+        report(f"{'Published metrics':<28}{'worst':>10}{'median':>10}   ({len(metrics)} reports)")
+        for key in ("frame_us_p99", "frame_us_max", "jitter_ms_p99", "jitter_ms_max", "mqtt_rtt_ms_p50", "gc_auto"):
+            values = sorted(m[key] for m in metrics)
+            report(f"{key:<28}{values[-1]:>10}{values[len(values) // 2]:>10}")
+
+    if args.trace:
+        sim.trace.write_csv(args.trace)
+        report(f"Trace written to {args.trace}")
+
+if __name__ == "__main__":
+    main()
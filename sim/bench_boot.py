@@ -0,0 +1,152 @@
+"""
+    Profiles the clock's boot: when it gets to each phase, from power on to being connected to MQTT
+    with the time set.
+
+        python -m sim.bench_boot [--rtt 0] [--legacy]
+
+    Each phase is reported at its virtual time, which is where the boot waits on the network, and at
+    the host time taken to get there, which is where it imports modules and sets up the hardware. The
+    host doesn't run at the Pico's speed, so compare host times between runs rather than reading them
+    as the Pico's. The first frame is when the boot pattern first lit the dial ring.
+
+    --rtt is the round trip (ms) to the MQTT broker. --legacy emulates the boot before modules were
+    imported lazily: everything imported up front, the MQTT manager created before the boot pattern
+    is shown, joining the access point left to the first connectivity tick, and the time set with a
+    single blocking NTP request before connecting MQTT.
+
+    Run it in a fresh process for each mode, as a module is only imported once. Exits with 1 if (other
+    than with --legacy) the boot pattern isn't lit within FIRST_FRAME_BUDGET_MS, or the clock isn't ready
+    within READY_BUDGET_MS plus two round trips to the broker (CONNECT and SUBSCRIBE).
+"""
+import argparse
+import builtins
+import importlib
+import os
+import socket
+import struct
+import sys
+import time
+
+from sim import harness
+from sim.simulation import Simulation
+
+from ClockSettings import ClockSettings  # noqa: E402
+from machine import RTC  # noqa: E402
+
+# Virtual ms from power on to the boot pattern first lighting the dial, and to being ready
+FIRST_FRAME_BUDGET_MS = 100
+READY_BUDGET_MS = 2000
+
+# Imported by main(), so that the import is timed as part of the boot as main.py's is on the Pico
+manager_module = None
+
+# Host time at each boot phase, and the firmware modules that had been imported by the time the boot pattern was shown
+_host = []
+_imported_by_pattern = set()
+
+
+def _use_legacy() -> None:
+    def boot(self):
+        # The old ClockManager imported MqttManager (and with it umqtt, Discovery and json) at the top
+        from MqttManager import MqttManager
+        self._phase("modules")
+        self._clock = manager_module.Clock(self._scheduler)
+        self._clock.reset()
+        self._phase("hardware")
+        self._mqtt_manager = MqttManager(ClockSettings.mqtt_address, ClockSettings.mqtt_username,
+                                         ClockSettings.mqtt_password, self._clock, self._scheduler)
+        self._clock.show_waiting()
+        self._phase("boot pattern")
+        self._connectivityTask = self._scheduler.periodic(manager_module._CONNECTING_TICK_MS, self._tick,
+                                                          "Connectivity", manager_module.PRIORITY_LOW)
+
+    def set_time():
+        addr = socket.getaddrinfo(ClockSettings.ntp_host, ClockSettings.ntp_port)[0][-1]
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.settimeout(1)
+            s.sendto(b"\x1b" + bytes(47), addr)
+            harness.clock.deliver()
+            msg = s.recv(48)
+        finally:
+            s.close()
+        tm = time.gmtime(struct.unpack("!I", msg[40:44])[0] - 2208988800)
+        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+    def _start_time_sync(self):
+        # Called before connecting MQTT, which waited for it
+        if all(name != "time" for name, _ in self.boot_phases):
+            set_time()
+            self._phase("time")
+
+    manager_module.ClockManager.boot = boot
+    manager_module.ClockManager._start_time_sync = _start_time_sync
+
+
+def _time_phases() -> None:
+    # Notes the host time at each phase as well
+    phase = manager_module.ClockManager._phase
+
+    def _phase(self, name):
+        if all(recorded != name for recorded, _ in self.boot_phases):
+            _host.append(time.perf_counter())
+            if name == "boot pattern":
+                _imported_by_pattern.update(n for n in sys.modules if n in _firmware_modules())
+        phase(self, name)
+
+    manager_module.ClockManager._phase = _phase
+
+
+def _firmware_modules() -> set:
+    return {name[:-3] for name in os.listdir(harness.SRC_DIR) if name.endswith(".py")} | {"umqtt.simple"}
+
+
+def main() -> None:
+    global manager_module
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=int, default=0, help="round trip to the MQTT broker (ms)")
+    parser.add_argument("--legacy", action="store_true", help="emulate the boot before lazy imports")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    start_host = time.perf_counter()
+    manager_module = importlib.import_module("ClockManager")
+    if args.legacy:
+        _use_legacy()
+    _time_phases()
+
+    sim = Simulation()
+    sim.broker.rtt_ms = args.rtt
+    sim.trace.events.clear()
+    start_ms = sim.now_ms()
+    sim.run(10_000)
+    sim.close()
+
+    # The dial ring is cleared as the hardware is set up, the first frame with anything lit is the boot pattern
+    frames = [ms for ms, device, value in sim.trace.events if device == "neopixel27" and any(value)]
+    phases = sim.manager.boot_phases
+    later = sorted(n for n in sys.modules if n in _firmware_modules() and n not in _imported_by_pattern)
+
+    report(f"Boot, {'before lazy imports' if args.legacy else 'lazy imports'}, MQTT round trip {args.rtt} ms")
+    report(f"{'phase':<16}{'virtual ms':>12}{'host ms':>10}")
+    for (name, ticks), host in zip(phases, _host):
+        report(f"{name:<16}{ticks - start_ms:>12}{(host - start_host) * 1000:>10.1f}")
+    if frames:
+        report(f"{'first frame':<16}{frames[0] - start_ms:>12}")
+    report(f"{'ready':<16}{sim.boot_ms - start_ms if sim.boot_ms != None else '-':>12}")
+    report(f"Firmware modules imported before the boot pattern: {len(_imported_by_pattern)}, after: {len(later)} ({', '.join(later)})")
+
+    failures = []
+    if not args.legacy:
+        if not frames or frames[0] - start_ms > FIRST_FRAME_BUDGET_MS:
+            failures.append(f"the boot pattern wasn't lit within {FIRST_FRAME_BUDGET_MS} ms")
+        ready_budget = READY_BUDGET_MS + 2 * args.rtt
+        if sim.boot_ms == None or sim.boot_ms - start_ms > ready_budget:
+            failures.append(f"the clock wasn't ready within {ready_budget} ms")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
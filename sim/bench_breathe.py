@@ -0,0 +1,185 @@
+"""
+    Compares the pendulum's breathing light against the old per-tick breathe algorithm: the PWM output
+    each produces and how long a tick takes.
+
+        python -m sim.bench_breathe [--colour 255,120,40] [--ticks 2000] [--period-ms 6000] [--easing sine]
+                                    [--trace breathe.csv]
+
+    Output is the duty written to each channel on every tick. Reported per algorithm: the breath
+    period, the peak duty reached against the target, the largest jump between two ticks (lower is
+    smoother) and how far the colour drifts from the target's hue during the breath.
+    Exits with 1 if the pendulum's breath drifts more than 1% in hue, peaks more than 1% from the
+    target, or is more than a tick off the period.
+"""
+import argparse
+import builtins
+import time
+
+from sim import harness
+
+harness.install(virtual=True)
+
+from Pendulum import Pendulum  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+
+TICK_MS = 33
+
+# How far the breath can stray from the target's hue, and its peak from the target, as fractions
+HUE_BUDGET = 0.01
+PEAK_BUDGET = 0.01
+
+
+def _legacy_breath_cycle(self, t) -> None:
+    # The old Pendulum._breath_cycle, which stepped each channel towards the target or back to 0
+    current_red = self.red.duty_u16()
+    current_green = self.green.duty_u16()
+    current_blue = self.blue.duty_u16()
+
+    target_red, target_green, target_blue = self._legacy_target
+
+    step = (int)(65025 / 100)
+
+    new_red = current_red
+    new_blue = current_blue
+    new_green = current_green
+    if self._legacy_up:
+        if (current_red < target_red):
+            new_red = min(int(current_red + step * 0.6), 65025)
+        if (current_blue < target_blue):
+            new_blue = min(current_blue + step, 65025)
+        if (current_green < target_green):
+            new_green = min(current_green + step, 65025)
+
+        if new_red >= target_red and new_green >= target_green and new_blue >= target_blue:
+            self._legacy_up = False
+    else:
+        if (current_red > 0):
+            new_red = max(int(current_red - step * 0.6), 0)
+        if (current_blue > 0):
+            new_blue = max(current_blue - step, 0)
+        if (current_green > 0):
+            new_green = max(current_green - step, 0)
+
+        if new_red <= 0 and new_green <= 0 and new_blue <= 0:
+            self._legacy_up = True
+
+    self.red.duty_u16(new_red)
+    self.green.duty_u16(new_green)
+    self.blue.duty_u16(new_blue)
+
+
+def _run(colour: tuple, ticks: int, legacy: bool, period_ms: int, easing: str) -> dict:
+    pendulum = Pendulum(6, 9, 10, 17, Scheduler())
+    pendulum.breathe_period = period_ms
+    pendulum.breathe_easing = easing
+    pendulum.set_light(*colour, True, 0)
+    pendulum._stop_breathing()
+    target = pendulum._breatheKey[:3]
+
+    tick = pendulum._breath_cycle
+    if legacy:
+        pendulum._legacy_target = target
+        pendulum._legacy_up = True
+        for pwm in (pendulum.red, pendulum.green, pendulum.blue):
+            pwm.duty_u16(0)
+        tick = lambda t: _legacy_breath_cycle(pendulum, t)  # noqa: E731
+
+    output = []
+    elapsed = 0
+    for _ in range(ticks):
+        harness.clock.advance_us(TICK_MS * 1000)
+        start = time.perf_counter_ns()
+        tick(None)
+        elapsed += time.perf_counter_ns() - start
+        output.append((pendulum.red.duty_u16(), pendulum.green.duty_u16(), pendulum.blue.duty_u16()))
+
+    return {"target": target, "output": output, "tick_ns": elapsed / ticks}
+
+
+def _analyse(result: dict) -> dict:
+    target = result["target"]
+    output = result["output"]
+
+    # The breath period is the time between the light going fully off
+    offs = [i for i in range(1, len(output)) if sum(output[i]) == 0 and sum(output[i - 1]) > 0]
+    periods = [b - a for a, b in zip(offs, offs[1:])]
+
+    biggest = max(range(3), key=lambda c: target[c])
+    peak = max(row[biggest] for row in output)
+    jump = max(abs(output[i][c] - output[i - 1][c]) for i in range(1, len(output)) for c in range(3))
+
+    # How far each channel's share of the light strays from the target's, while the light is on
+    total = sum(target)
+    drift = 0.0
+    for row in output:
+        lit = sum(row)
+        if lit > total * 0.05:
+            drift = max(drift, max(abs(row[c] / lit - target[c] / total) for c in range(3)))
+
+    return {
+        "period_ms": sum(periods) * TICK_MS // len(periods) if periods else None,
+        "peak": peak,
+        "target": target[biggest],
+        "max_jump": jump,
+        "hue_drift": drift,
+        "tick_ns": result["tick_ns"],
+    }
+
+
+def _format(analysis: dict) -> dict:
+    return {
+        "period_ms": analysis["period_ms"],
+        "peak": f"{analysis['peak']} / {analysis['target']}",
+        "max_jump": analysis["max_jump"],
+        "hue_drift": f"{analysis['hue_drift'] * 100:.1f}%",
+        "tick_ns": f"{analysis['tick_ns']:.0f}",
+    }
+
+
+def check(analysis: dict, period_ms: int) -> list:
+    # The breathing light has to keep the colour it was given, reach it, and take the period it was asked for
+    failures = []
+    if analysis["hue_drift"] > HUE_BUDGET:
+        failures.append(f"hue drifts {analysis['hue_drift'] * 100:.1f}%, budget is {HUE_BUDGET * 100:.0f}%")
+    if abs(analysis["peak"] - analysis["target"]) > analysis["target"] * PEAK_BUDGET:
+        failures.append(f"peak {analysis['peak']} is more than {PEAK_BUDGET * 100:.0f}% from {analysis['target']}")
+    if analysis["period_ms"] is None or abs(analysis["period_ms"] - period_ms) > TICK_MS:
+        failures.append(f"period {analysis['period_ms']} ms is more than a tick from {period_ms} ms")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--colour", default="255,120,40")
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--period-ms", type=int, default=6000)
+    parser.add_argument("--easing", default="sine")
+    parser.add_argument("--trace", help="write both outputs to this CSV file")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    colour = tuple(int(c) for c in args.colour.split(","))
+    results = {
+        "legacy": _run(colour, args.ticks, True, args.period_ms, args.easing),
+        "table": _run(colour, args.ticks, False, args.period_ms, args.easing),
+    }
+
+    report(f"Breathing ({', '.join(str(c) for c in colour)}), {args.ticks} ticks of {TICK_MS} ms")
+    analyses = {name: _analyse(result) for name, result in results.items()}
+    for name, analysis in analyses.items():
+        report(f"  {name:8s} {_format(analysis)}")
+
+    if args.trace:
+        with open(args.trace, "w") as f:
+            f.write("tick,legacy_r,legacy_g,legacy_b,table_r,table_g,table_b\n")
+            for i, (old, new) in enumerate(zip(results["legacy"]["output"], results["table"]["output"])):
+                f.write(f"{i},{old[0]},{old[1]},{old[2]},{new[0]},{new[1]},{new[2]}\n")
+        report(f"Trace written to {args.trace}")
+
+    harness.finish(check(analyses["table"], args.period_ms), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+    Sends the chime a burst of requests on virtual time, with another task keeping the loop busy, and
+    checks the solenoids from the output trace: how many cuckoos came out, and how far each pulse was
+    from the configured timing.
+
+        python -m sim.bench_chime [--requests 20] [--busy-ms 30] [--busy-every 97] [--legacy]
+
+    Requests of 1 to 4 cuckoos arrive a random 0 to 10 s apart. Every --busy-every ms a task blocks
+    the loop for --busy-ms, as a slow frame or MQTT publish would.
+
+    --legacy emulates the old chime: a coroutine that slept between steps and ignored any chime asked
+    for while it was going, so "chime 3 times" only ever cuckooed once.
+
+    Exits with 1 if (other than with --legacy) any cuckoo asked for didn't come out, or any pulse was
+    out by more than the loop was blocked for (--busy-ms), plus PULSE_BUDGET_MS.
+"""
+import argparse
+import builtins
+import random
+
+from sim import harness, virtual_time
+
+harness.install(virtual=True)
+
+from Chime import Chime  # noqa: E402
+from Scheduler import Scheduler, PRIORITY_NORMAL, sleep_ms  # noqa: E402
+
+PULSE_MS = 1700
+RESET_MS = 500
+
+# How far (ms) a pulse can be from its target on top of the time the loop is blocked for
+PULSE_BUDGET_MS = 5
+
+
+class _LegacyChime(Chime):
+    def chime(self, count: int = 1) -> None:
+        for _ in range(count):
+            if self._remaining > 0:
+                self.dropped += 1
+                continue
+            self._remaining = 1
+            self._scheduler.spawn(self._chime_internal())
+
+    async def _chime_internal(self) -> None:
+        try:
+            self._chime.on()
+            await sleep_ms(PULSE_MS)
+            self._reset.on()
+            self._chime.off()
+            await sleep_ms(RESET_MS)
+            self._reset.off()
+        finally:
+            self._remaining = 0
+
+
+def _widths(events: list, device: str) -> list:
+    # How long (ms) each pulse on a pin lasted
+    widths = []
+    on = None
+    for ms, name, value in events:
+        if name != device:
+            continue
+        if value and on is None:
+            on = ms
+        elif not value and on is not None:
+            widths.append(ms - on)
+            on = None
+    return widths
+
+
+async def _requests(chime: Chime, requests: list) -> None:
+    for gap_ms, count in requests:
+        await sleep_ms(gap_ms)
+        chime.chime(count)
+
+
+async def _main(scheduler: Scheduler, chime: Chime, requests: list) -> None:
+    scheduler.spawn(_requests(chime, requests))
+    await scheduler.run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--busy-ms", type=int, default=30)
+    parser.add_argument("--busy-every", type=int, default=97)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--legacy", action="store_true", help="emulate the old chime coroutine")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    rng = random.Random(args.seed)
+    requests = [(rng.randint(0, 10_000), rng.randint(1, 4)) for _ in range(args.requests)]
+
+    scheduler = Scheduler()
+    chime = (_LegacyChime if args.legacy else Chime)(14, 15, scheduler, PULSE_MS, RESET_MS)
+    if args.busy_ms > 0:
+        scheduler.periodic(args.busy_every, lambda t: harness.clock.advance_us(args.busy_ms * 1000), "Busy", PRIORITY_NORMAL)
+
+    harness.trace.events.clear()
+    duration_ms = sum(gap for gap, _ in requests) + sum(count for _, count in requests) * (PULSE_MS + RESET_MS + 1000) + 10_000
+    virtual_time.run(harness.clock, _main(scheduler, chime, requests), duration_ms)
+
+    pulses = _widths(harness.trace.events, "pin14")
+    resets = _widths(harness.trace.events, "pin15")
+    pulse_err = [abs(w - PULSE_MS) for w in pulses]
+    reset_err = [abs(w - RESET_MS) for w in resets]
+    report(f"{'old chime coroutine' if args.legacy else 'step sequencer'}: {args.requests} requests, "
+           f"loop blocked {args.busy_ms} ms every {args.busy_every} ms")
+    report(f"  cuckoos            {len(pulses)} of {sum(count for _, count in requests)} asked for, {chime.dropped} dropped")
+    report(f"  chime pulse ms     mean error {sum(pulse_err) / len(pulse_err):6.1f}   max error {max(pulse_err):4}   (target {PULSE_MS})")
+    report(f"  reset pulse ms     mean error {sum(reset_err) / len(reset_err):6.1f}   max error {max(reset_err):4}   (target {RESET_MS})")
+    if not args.legacy:
+        report(f"  latest step        {chime.late_max} ms")
+
+    failures = []
+    if not args.legacy:
+        asked = sum(count for _, count in requests)
+        if len(pulses) != asked:
+            failures.append(f"{len(pulses)} cuckoos came out of {asked} asked for")
+        budget = args.busy_ms + PULSE_BUDGET_MS
+        if max(pulse_err + reset_err) > budget:
+            failures.append(f"a pulse was out by {max(pulse_err + reset_err)} ms, budget is {budget} ms")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+    Measures the heap cost of Colour over a simulated hour of dial ring animation, with Home Assistant
+    changing the dial's effect and colour every 30 s.
+
+        python -m sim.bench_colour_heap [--minutes 60] [--legacy]
+
+    --legacy swaps in the old Colour, a plain class (with a per-instance __dict__) where every colour
+    is a new instance. Reported: Colours created, bytes per Colour, the bytes allocated by firmware
+    code (src/) that are still live at the end (tracemalloc), and how many times the garbage
+    collector ran. The GC counts are for the whole simulation, including its own allocations.
+    Exits with 1 if (other than with --legacy) more Colours were created than Colour.of() interns, as
+    then the dial is making new ones as it runs.
+"""
+import argparse
+import builtins
+import gc
+import random
+import sys
+import tracemalloc
+
+from sim import harness
+from sim.simulation import Simulation
+
+import Colour as colour_module  # noqa: E402
+
+_created = 0
+
+
+class _LegacyColour:
+    """
+        The Colour class before it was interned, with the same interface.
+    """
+    def __init__(self, r, g, b) -> None:
+        global _created
+        _created += 1
+        self.red = r
+        self.green = g
+        self.blue = b
+        self.value = (r << 16) | (g << 8) | b
+
+    @staticmethod
+    def of(r, g, b):
+        return _LegacyColour(r, g, b)
+
+    def is_black(self) -> bool:
+        return self.value == 0
+
+    def write_grb(self, buf, index) -> None:
+        i = index * 3
+        buf[i] = self.green
+        buf[i + 1] = self.red
+        buf[i + 2] = self.blue
+
+    def fill_grb(self, buf) -> None:
+        for i in range(0, len(buf), 3):
+            buf[i] = self.green
+            buf[i + 1] = self.red
+            buf[i + 2] = self.blue
+
+
+def _count_created() -> None:
+    init = colour_module.Colour.__init__
+
+    def counting_init(self, r, g, b):
+        global _created
+        _created += 1
+        init(self, r, g, b)
+
+    colour_module.Colour.__init__ = counting_init
+
+
+def _size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+# Colours someone might pick in Home Assistant
+PALETTE = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 180, 100), (150, 150, 150), (255, 255, 255)]
+EFFECTS = ["", "AlertPattern", "ErrorPattern", "CurrentTimePattern"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--legacy", action="store_true", help="use the old, uninterned Colour")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    if args.legacy:
+        colour_module.Colour = _LegacyColour
+    else:
+        _count_created()
+    colour_class = colour_module.Colour
+
+    collections = [0, 0, 0]
+
+    def on_gc(phase, info):
+        if phase == "start":
+            collections[info["generation"]] += 1
+
+    sim = Simulation()
+    rng = random.Random(args.seed)
+
+    def change_dial(s):
+        r, g, b = rng.choice(PALETTE)
+        effect = rng.choice(EFFECTS)
+        s.command("dial", f'{{"state": "ON", "effect": "{effect}", "color": {{"r": {r}, "g": {g}, "b": {b}}}}}')
+
+    for t in range(30_000, args.minutes * 60_000, 30_000):
+        sim.at(t, change_dial)
+
+    # Start measuring once booted, so imports and setup aren't counted
+    def start_measuring(s):
+        global _created
+        _created = 0
+        gc.collect()
+        gc.callbacks.append(on_gc)
+        tracemalloc.start()
+
+    sim.at(10_000, start_measuring)
+    sim.run(args.minutes * 60_000)
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, f"{harness.SRC_DIR}/*")])
+    firmware_bytes = sum(stat.size for stat in snapshot.statistics("filename"))
+    tracemalloc.stop()
+    gc.callbacks.remove(on_gc)
+    sim.close()
+
+    report(f"Colour: {'legacy' if args.legacy else 'interned, __slots__'}, {args.minutes} simulated minutes")
+    created = _created
+    size = _size(colour_class(1, 2, 3))
+    report(f"  Colours created:    {created}")
+    report(f"  Bytes per Colour:   {size}")
+    report(f"  Colour bytes:       {created * size} allocated over the run")
+    report(f"  Firmware heap:      {firmware_bytes} bytes live at the end")
+    report(f"  GC runs:            {collections[0]} gen 0, {collections[1]} gen 1, {collections[2]} gen 2")
+
+    failures = []
+    if not args.legacy and created > colour_module._MAX_INTERNED:
+        failures.append(f"{created} Colours created, budget is {colour_module._MAX_INTERNED}")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
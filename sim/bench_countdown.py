@@ -0,0 +1,159 @@
+"""
+    Runs a dial ring countdown from start to finish on virtual time, a frame at a time, and compares
+    CountdownPattern against the old float-based version that logged every frame.
+
+        python -m sim.bench_countdown [--seconds 120] [--frame-ms 33]
+
+    Reported per version: render time, bytes written to the serial console per frame, LEDs changed
+    per frame, how far the light the ring gives out strays from the time left (after the dial ring's
+    gamma correction, as a fraction of one LED), and how many times completion was signalled.
+    Exits with 1 if CountdownPattern writes anything to the console, signals completion other than
+    once, or strays more than LIGHT_BUDGET_LEDS from the time left.
+"""
+import argparse
+import builtins
+import math
+import time
+
+from sim import harness
+
+harness.install(virtual=True)
+
+import ColourPipeline  # noqa: E402
+import RingPatterns  # noqa: E402
+
+LEDS = 20
+
+# How far the light the countdown gives out can stray from the time left, as a fraction of one LED
+LIGHT_BUDGET_LEDS = 0.1
+
+
+class _LegacyCountdown:
+    """
+        CountdownPattern as it was, rendering the whole ring with floats and logging every frame.
+    """
+    def __init__(self, timer_seconds) -> None:
+        self._timer_seconds = timer_seconds
+        self._end_time = time.ticks_add(time.ticks_ms(), timer_seconds * 1000)
+        print(f"Timer set. Seconds = {timer_seconds}, Start time = {time.ticks_ms()}, End Time = {self._end_time}")
+
+    @property
+    def version(self) -> int:
+        diff = time.ticks_diff(self._end_time, time.ticks_ms())
+        if diff < 0:
+            return -1
+        return diff * 2000 // (self._timer_seconds * 1000)
+
+    def render(self, buf) -> bool:
+        diff = time.ticks_diff(self._end_time, time.ticks_ms())
+        print(f"Timer callback. Diff = {diff}, Now = {time.ticks_ms()}, End Time = {self._end_time}")
+
+        if diff < 0:
+            print("Stopped.")
+            return False
+
+        pc = diff / (self._timer_seconds * 1000)
+        self._setValue(buf, 20 * pc, 100)
+        return True
+
+    def _setValue(self, buf, value, level) -> None:
+        for i in range(len(buf)):
+            buf[i] = 0
+        if value == 0:
+            return
+
+        whole = (int)(math.floor(value))
+        for i in range(whole * 3):
+            buf[i] = level
+
+        remainder = value - whole
+        if remainder > 0:
+            brightness = (int)(level * remainder)
+            i = whole * 3
+            buf[i] = brightness
+            buf[i + 1] = brightness
+            buf[i + 2] = brightness
+
+
+def _run(pattern_factory, seconds: int, frame_ms: int, brightness: int) -> dict:
+    # Light given out for each value, as the dial ring's gamma correction leaves it, and by a fully lit LED
+    light = ColourPipeline.DIAL._linear[ColourPipeline.GREEN]
+    full = light[brightness]
+
+    serial = [0]
+    finished = [0]
+    real_print = builtins.print
+    builtins.print = lambda *a, **k: serial.__setitem__(0, serial[0] + len(" ".join(str(x) for x in a)) + 1)
+    try:
+        start = time.ticks_ms()
+        pattern = pattern_factory(seconds, lambda: finished.__setitem__(0, finished[0] + 1))
+        buf = bytearray(LEDS * 3)
+        previous = bytes(buf)
+
+        times = []
+        changed = 0
+        error = 0.0
+        shown = None
+        while True:
+            harness.clock.advance_us(frame_ms * 1000)
+            version = pattern.version
+            if version == shown:
+                continue
+            shown = version
+
+            t = time.perf_counter_ns()
+            ok = pattern.render(buf)
+            times.append(time.perf_counter_ns() - t)
+            if not ok:
+                break
+
+            changed += sum(1 for i in range(0, len(buf), 3) if buf[i] != previous[i])
+            previous = bytes(buf)
+
+            left = time.ticks_diff(time.ticks_add(start, seconds * 1000), time.ticks_ms()) / (seconds * 1000)
+            given = sum(light[buf[i]] for i in range(0, len(buf), 3)) / full
+            error = max(error, abs(given - left * LEDS))
+    finally:
+        builtins.print = real_print
+
+    frames = len(times)
+    ordered = sorted(times)
+    return {
+        "frames": frames,
+        "render_mean_us": round(sum(times) / frames / 1000, 2),
+        "render_p99_us": round(ordered[int(frames * 0.99)] / 1000, 2),
+        "serial_bytes_per_frame": round(serial[0] / frames, 1),
+        "leds_changed_per_frame": round(changed / frames, 2),
+        "max_light_error_leds": round(error, 3),
+        "completions": finished[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--frame-ms", type=int, default=33)
+    args = parser.parse_args()
+
+    results = {
+        "legacy": _run(lambda seconds, on_finished: _LegacyCountdown(seconds), args.seconds, args.frame_ms, 100),
+        "fixed point": _run(RingPatterns.CountdownPattern, args.seconds, args.frame_ms, RingPatterns._COUNTDOWN_BRIGHTNESS),
+    }
+
+    print(f"Countdown of {args.seconds} s at {args.frame_ms} ms a frame")
+    for name, result in results.items():
+        print(f"  {name:12s} {result}")
+
+    result = results["fixed point"]
+    failures = []
+    if result["serial_bytes_per_frame"] > 0:
+        failures.append(f"writes {result['serial_bytes_per_frame']} bytes to the console per frame")
+    if result["completions"] != 1:
+        failures.append(f"signalled completion {result['completions']} times")
+    if result["max_light_error_leds"] > LIGHT_BUDGET_LEDS:
+        failures.append(f"light strays {result['max_light_error_leds']} LEDs from the time left, budget is {LIGHT_BUDGET_LEDS}")
+    harness.finish(failures)
+
+
+if __name__ == "__main__":
+    main()
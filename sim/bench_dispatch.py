@@ -0,0 +1,122 @@
+"""
+    Measures the cost of dispatching an MQTT command to its handler, under a flood of commands.
+
+        python -m sim.bench_dispatch [--messages 100000]
+
+    Handlers are replaced with no-ops, so only the dispatch itself is timed: the topic lookup in
+    MqttManager._handle_new_message, against the old decode and str.startswith chain. The full cost
+    (handler included) of each command type is reported as well. Exits with 1 if the topic table
+    isn't at least SPEEDUP_BUDGET times as quick as the old chain.
+"""
+import argparse
+import builtins
+import random
+import time
+
+from sim import harness
+
+harness.install(virtual=True)
+
+from Clock import Clock  # noqa: E402
+from MqttManager import MqttManager  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+import Discovery  # noqa: E402
+
+# A command for each entity that takes them
+MESSAGES = {
+    "pendulum_swing": b"ON",
+    "chime": b"OFF",
+    "timer": b"0",
+    "pendulum_light": b'{"state": "ON", "color": {"r": 10, "g": 20, "b": 30}}',
+    "dial": b'{"state": "ON", "effect": "ErrorPattern", "color": {"r": 10, "g": 20, "b": 30}}',
+}
+
+# How many times as quick as the old chain the topic table has to be. Host times vary from run to run, so this
+# is well under what it usually measures
+SPEEDUP_BUDGET = 4
+
+
+def _legacy_dispatch(manager: MqttManager, topic: bytes, message: bytes) -> None:
+    # The old _handle_new_message, including its chime / dial fall-through
+    topic = bytes.decode(topic)
+    message = bytes.decode(message)
+
+    print(f"Topic '{topic}' recived message: {message}")
+
+    if topic.startswith("homeassistant/light/cuckoo_clock_pendulum_light"):
+        manager._handle_pendulum_light_message(message)
+    elif topic.startswith("homeassistant/switch/cuckoo_clock_pendulum_swing"):
+        manager._handle_pendulum_swing_message(message)
+    elif topic.startswith("homeassistant/number/cuckoo_clock_timer"):
+        manager._handle_timer_message(message)
+
+    if topic.startswith("homeassistant/switch/cuckoo_clock_chime"):
+        manager._handle_chime_message(message)
+
+    if topic.startswith("homeassistant/light/cuckoo_clock_dial"):
+        manager._handle_dial_message(message)
+
+    manager._record_command_latency()
+
+
+def _make_manager() -> MqttManager:
+    return MqttManager("sim-broker", "", "", Clock(Scheduler()), Scheduler())
+
+
+def _stub_handlers(manager: MqttManager) -> None:
+    def noop(message):
+        pass
+
+    for name in Discovery.HANDLERS.values():
+        setattr(manager, name, noop)
+    manager._handlers = {topic: noop for topic in manager._handlers}
+
+
+def _flood(dispatch, messages: list) -> float:
+    start = time.perf_counter_ns()
+    for topic, message in messages:
+        dispatch(topic, message)
+    return (time.perf_counter_ns() - start) / len(messages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    rng = random.Random(args.seed)
+    entities = list(MESSAGES)
+    flood = []
+    for _ in range(args.messages):
+        entity = rng.choice(entities)
+        flood.append((Discovery.COMMAND_TOPICS[entity], MESSAGES[entity]))
+
+    manager = _make_manager()
+    _stub_handlers(manager)
+    table_ns = _flood(manager._handle_new_message, flood)
+    legacy_ns = _flood(lambda t, m: _legacy_dispatch(manager, t, m), flood)
+
+    report(f"Dispatch only, {args.messages} messages")
+    report(f"  topic table:       {table_ns:8.0f} ns / message")
+    report(f"  startswith chain:  {legacy_ns:8.0f} ns / message")
+
+    failures = []
+    if table_ns * SPEEDUP_BUDGET > legacy_ns:
+        failures.append(f"the topic table is only {legacy_ns / table_ns:.1f} times as quick as the startswith chain, "
+                        f"budget is {SPEEDUP_BUDGET}")
+
+    report("Dispatch and handler, per command type")
+    manager = _make_manager()
+    for entity in entities:
+        messages = [(Discovery.COMMAND_TOPICS[entity], MESSAGES[entity])] * 2000
+        report(f"  {entity:18s} {_flood(manager._handle_new_message, messages):8.0f} ns / message")
+
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+    Keeps the pendulum light breathing through a storm of MQTT reconnects on a slow network, and
+    measures from the output trace how steadily its frames came out.
+
+        python -m sim.bench_dualcore [--minutes 10] [--drop-every-ms 3000] [--rtt-ms 300] [--legacy]
+
+    Once the clock has booted Home Assistant sets the pendulum light breathing, which changes the LED
+    duties every 33 ms, and the broker then drops the connection every --drop-every-ms. Every CONNECT
+    and SUBSCRIBE waits --rtt-ms for its reply, blocking the core that sent it. (The dial isn't used:
+    each reconnect clears it.) Reported: the gaps between frames, and how many were late.
+
+    --legacy runs everything on one core (ClockSettings.dual_core = False), as before RenderCore.
+
+    Exits with 1 if (other than with --legacy) any frame came more than JITTER_BUDGET_MS from when it
+    was due, or more than 1% of the frames were missed.
+"""
+import argparse
+import builtins
+import json
+
+from sim import harness
+from sim.simulation import Simulation
+
+import machine  # noqa: E402
+from ClockSettings import ClockSettings  # noqa: E402
+
+# The breathe table has a row every 33 ms, written to the pendulum's PWMs
+STEP_MS = 33
+RED_PIN = 6
+
+# Time to let the clock boot before the storm starts
+SETTLE_MS = 10_000
+
+# How far (ms) a frame can be from when it was due
+JITTER_BUDGET_MS = 5
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--drop-every-ms", type=int, default=3000)
+    parser.add_argument("--rtt-ms", type=int, default=300)
+    parser.add_argument("--legacy", action="store_true", help="run everything on one core")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    ClockSettings.dual_core = not args.legacy
+
+    # The trace only has the writes that change a duty, and a breath has runs of rows that don't, so time
+    # every write to the red LED's PWM instead
+    frames = []
+    duty_u16 = machine.PWM.duty_u16
+
+    def timed_duty_u16(pwm, d=None):
+        if d is not None and pwm.pin.id == RED_PIN:
+            frames.append(sim.now_ms())
+        return duty_u16(pwm, d)
+
+    machine.PWM.duty_u16 = timed_duty_u16
+
+    sim = Simulation()
+    sim.broker.rtt_ms = args.rtt_ms
+    start = sim.now_ms() + SETTLE_MS
+    end = start + int(args.minutes * 60_000)
+
+    breathe = json.dumps({"state": "ON", "effect": "breathe", "color": {"r": 255, "g": 200, "b": 120}})
+    sim.at(start, lambda s: s.command("pendulum_light", breathe))
+    t = start + args.drop_every_ms
+    while t < end:
+        sim.at(t, lambda s: s.broker.drop_all())
+        t += args.drop_every_ms
+
+    sim.run(end - sim.now_ms())
+    sim.close()
+
+    # Leave out the writes from before, and when, the breathing was started
+    frames = [ms for ms in frames if ms > start][1:]
+    gaps = sorted(b - a for a, b in zip(frames, frames[1:]))
+    jitter = [abs(g - STEP_MS) for g in gaps]
+    connects = [ms for ms in sim.broker.connected_at if ms >= start]
+
+    report(f"{'one core' if args.legacy else 'render core'}: {args.minutes:g} min, connection dropped every "
+           f"{args.drop_every_ms} ms, RTT {args.rtt_ms} ms")
+    report(f"  reconnects         {len(connects)}")
+    report(f"  frames             {len(frames)} (at most {(end - start) // STEP_MS})")
+    report(f"  frame gap ms       p50 {gaps[len(gaps) // 2]}   p99 {gaps[int(len(gaps) * 0.99)]}   max {gaps[-1]}")
+    report(f"  jitter ms          mean {sum(jitter) / len(jitter):.1f}   max {max(jitter)}")
+    report(f"  late frames        {sum(1 for g in gaps if g > STEP_MS)}")
+
+    failures = []
+    if not args.legacy:
+        if max(jitter) > JITTER_BUDGET_MS:
+            failures.append(f"a frame came {max(jitter)} ms from when it was due, budget is {JITTER_BUDGET_MS} ms")
+        expected = (end - start) // STEP_MS
+        if len(frames) < expected * 0.99:
+            failures.append(f"{expected - len(frames)} of {expected} frames were missed")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+    Counts the allocations made by one dial ring frame, for the original list-of-Colour pipeline and
+    the frame buffer pipeline in src/DialRing.py.
+
+        python -m sim.bench_frame_alloc [--frames N]
+
+    Under CPython the byte counts come from tracemalloc and include interpreter overhead that
+    MicroPython doesn't have (range iterators, etc.), the Colour count is exact on both. Under the
+    MicroPython unix port the byte counts come from gc.mem_alloc() with the GC disabled.
+    Exits with 1 if a frame buffer frame creates any Colours.
+"""
+import argparse
+import gc
+import math
+import sys
+
+from sim import harness
+
+harness.install()
+
+import time  # noqa: E402
+from machine import Pin  # noqa: E402
+import neopixel  # noqa: E402
+from Colour import Colour  # noqa: E402
+import RingPatterns  # noqa: E402
+from DialRing import DialRing  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+
+_MICROPYTHON = sys.implementation.name == "micropython"
+if not _MICROPYTHON:
+    import tracemalloc
+
+
+class _FixedLightMeter:
+    def __init__(self, value: float) -> None:
+        self._value = value
+
+    def GetOffset(self) -> float:
+        return self._value
+
+
+_colours_created = 0
+_colour_init = Colour.__init__
+
+
+def _counting_init(self, r, g, b):
+    global _colours_created
+    _colours_created += 1
+    _colour_init(self, r, g, b)
+
+
+# The pipeline as it was before the frame buffer: patterns return a list of 20 Colours, and each
+# pixel is corrected into a new Colour and written to the NeoPixel as a tuple
+class _LegacySolid:
+    def __init__(self):
+        self._colour = Colour(0, 0, 200)
+
+    def show(self):
+        return [self._colour] * 20
+
+
+class _LegacyRotating:
+    def __init__(self, lit):
+        self._lit = lit
+        self._current = 19
+
+    def show(self):
+        array = [Colour(0, 0, 0)] * 20
+        if self._current < 0:
+            self._current = 19
+        array[self._current] = self._lit
+        self._current -= 1
+        return array
+
+
+class _LegacyCountdown:
+    def __init__(self, seconds):
+        self._timer_seconds = seconds
+        self._end_time = time.ticks_add(time.ticks_ms(), seconds * 1000)
+
+    def show(self):
+        diff = time.ticks_diff(self._end_time, time.ticks_ms())
+        value = 20 * (diff / (self._timer_seconds * 1000))
+        array = [Colour(0, 0, 0)] * 20
+        whole = int(math.floor(value))
+        for i in range(whole):
+            array[i] = Colour(100, 100, 100)
+        remainder = value - whole
+        if remainder > 0:
+            brightness = int(100 * remainder)
+            array[whole] = Colour(brightness, brightness, brightness)
+        return array
+
+
+def _legacy_correct(colour, reading):
+    offset = reading * 60
+    red = 0 if colour.red == 0 else max(10, colour.red - offset)
+    green = 0 if colour.green == 0 else max(10, colour.green - offset)
+    blue = 0 if colour.blue == 0 else max(10, colour.blue - offset)
+    return Colour(int(red), int(green), int(blue))
+
+
+def _legacy_frame(np, pattern, light_meter):
+    array = pattern.show()
+    for i in range(20):
+        corrected = _legacy_correct(array[i], light_meter.GetOffset())
+        np[i] = (corrected.red, corrected.green, corrected.blue)
+    np.write()
+
+
+def _measure(frame, frames: int):
+    global _colours_created
+
+    # Warm up, so one-off caches don't count against the steady state
+    for _ in range(10):
+        frame()
+
+    total_bytes = 0
+    _colours_created = 0
+    for _ in range(frames):
+        if _MICROPYTHON:
+            gc.collect()
+            gc.disable()
+            before = gc.mem_alloc()
+            frame()
+            total_bytes += gc.mem_alloc() - before
+            gc.enable()
+        else:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            frame()
+            total_bytes += tracemalloc.get_traced_memory()[1] - before
+
+    return _colours_created / frames, total_bytes / frames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    light_meter = _FixedLightMeter(0.25)
+    cases = [
+        ("SolidPattern", _LegacySolid(), RingPatterns.SolidPattern(Colour(0, 0, 200))),
+        ("ErrorPattern", _LegacyRotating(Colour(50, 0, 0)), RingPatterns.AnimationPattern(RingPatterns.ERROR)),
+        ("BootingPattern", _LegacyRotating(Colour(0, 50, 0)), RingPatterns.AnimationPattern(RingPatterns.BOOTING)),
+        ("CountdownPattern", _LegacyCountdown(3600), RingPatterns.CountdownPattern(3600)),
+    ]
+
+    Colour.__init__ = _counting_init
+    if not _MICROPYTHON:
+        tracemalloc.start()
+
+    failures = []
+    print(f"{'pattern':<18}{'path':<8}{'Colours/frame':>15}{'bytes/frame':>13}")
+    for name, legacy, pattern in cases:
+        np = neopixel.NeoPixel(Pin(0), 20)
+        legacy_result = _measure(lambda: _legacy_frame(np, legacy, light_meter), args.frames)
+
+        scheduler = Scheduler()
+        ring = DialRing(0, light_meter, scheduler)
+        pattern.start(scheduler)
+        ring._pattern = pattern
+        ring._refreshTimer = None
+        buffer_result = _measure(lambda: ring._swap_pattern_callback(None), args.frames)
+        pattern.stop()
+
+        print(f"{name:<18}{'before':<8}{legacy_result[0]:>15.1f}{legacy_result[1]:>13.0f}")
+        print(f"{'':<18}{'after':<8}{buffer_result[0]:>15.1f}{buffer_result[1]:>13.0f}")
+        if buffer_result[0] > 0:
+            failures.append(f"{name}: creates {buffer_result[0]:.1f} Colours per frame")
+
+    Colour.__init__ = _colour_init
+    harness.finish(failures)
+
+
+if __name__ == "__main__":
+    main()
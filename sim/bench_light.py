@@ -0,0 +1,148 @@
+"""
+    Runs the light meter and the dial's dimmer over a simulated day of noisy light, on virtual time, and
+    compares LightMeter against the old one that read the ADC from whichever caller found its 2 s cache
+    stale and scaled it into a fixed window.
+
+        python -m sim.bench_light [--hours 24] [--frame-ms 100] [--noise 25] [--legacy]
+
+    The light follows sim.scenarios.daylight, plus --noise ADC units of random noise on every reading, and
+    a lamp is switched on for a few minutes every couple of hours. Reported: how many frames read the ADC
+    themselves, how often the dimmer changed level (and how many of those changes were undone within 10 s,
+    i.e. flicker), how far the level was from the noise-free light across its whole range, and how many
+    light level updates would have been published. Exits with 1 if (other than with --legacy) any frame
+    read the ADC, the dimmer flickered, or the p99 level error is over LEVEL_BUDGET.
+"""
+import argparse
+import builtins
+import random
+import time
+
+from sim import harness, virtual_time
+
+harness.install(virtual=True)
+
+from sim.scenarios import daylight, HOUR_MS  # noqa: E402
+
+import machine  # noqa: E402
+from Dimmer import Dimmer  # noqa: E402
+from LightMeter import LightMeter  # noqa: E402
+from Scheduler import Scheduler, PRIORITY_NORMAL  # noqa: E402
+
+# Every LAMP_EVERY_MS the lamp brightens the room by LAMP for LAMP_MS
+LAMP_EVERY_MS = 2 * HOUR_MS + 17 * 60_000
+LAMP_MS = 5 * 60_000
+LAMP = 300
+
+# The darkest daylight() gives, and the brightest with the lamp on too
+DARK = 2100
+BRIGHT = 900 - LAMP
+
+REVERSAL_MS = 10_000
+
+# Largest p99 level error, as a fraction of the whole range
+LEVEL_BUDGET = 0.3
+
+
+def _light(ms: int) -> int:
+    return daylight(ms) - (LAMP if ms % LAMP_EVERY_MS < LAMP_MS else 0)
+
+
+class _LegacyLightMeter:
+    _min = 950
+    _max = 1100
+
+    def __init__(self, lightPin, scheduler=None, report_threshold=0.05) -> None:
+        self._adc = machine.ADC(machine.Pin(lightPin))
+        self._lastReadTicks = None
+        self._cachedValue = 0
+        self.on_change = None
+
+    def GetOffset(self) -> float:
+        now = time.ticks_ms()
+        if self._lastReadTicks is not None:
+            if time.ticks_diff(now, self._lastReadTicks) < 2000:
+                return self._cachedValue
+        self._lastReadTicks = now
+        value = min(self._max, max(0, self._adc.read_u16() - self._min))
+        self._cachedValue = value / (self._max - self._min)
+        return self._cachedValue
+
+    def get_reported(self) -> float:
+        return round(self._cachedValue, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--frame-ms", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=25)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--legacy", action="store_true", help="emulate the old cached, fixed window light meter")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    rng = random.Random(args.seed)
+    machine.ADC.source = lambda ms: int(_light(ms) + rng.gauss(0, args.noise))
+
+    scheduler = Scheduler()
+    meter = (_LegacyLightMeter if args.legacy else LightMeter)(28, scheduler)
+    dimmer = Dimmer(meter)
+    start_ms = harness.clock.now_ms()
+
+    published = [0]
+    meter.on_change = lambda entity: published.__setitem__(0, published[0] + 1)
+
+    # (ms, bucket) each time the dimmer changed level
+    changes = []
+    errors = []
+    frames = [0, 0]
+
+    def frame(t):
+        adc = meter._adc
+        reads = adc.reads
+        version = dimmer.version
+        dimmer.update()
+        frames[0] += 1
+        if adc.reads != reads:
+            frames[1] += 1
+        now = harness.clock.now_ms()
+        if dimmer.version != version:
+            changes.append((now, dimmer._bucket))
+
+        # The level the noise-free light would give, after an hour to calibrate
+        if now - start_ms >= HOUR_MS:
+            ideal = (_light(now) - BRIGHT) / (DARK - BRIGHT)
+            errors.append(abs(meter.GetOffset() - ideal))
+
+    scheduler.periodic(args.frame_ms, frame, "Frame", PRIORITY_NORMAL)
+    virtual_time.run(harness.clock, scheduler.run(), int(args.hours * HOUR_MS))
+
+    # A change undone (back to the level before it) within REVERSAL_MS
+    reversals = 0
+    for (ms, bucket), (next_ms, next_bucket), before in zip(changes[1:], changes[2:], changes):
+        if next_ms - ms <= REVERSAL_MS and next_bucket == before[1]:
+            reversals += 1
+
+    ordered = sorted(errors)
+    report(f"{'old light meter' if args.legacy else 'LightMeter'}: {args.hours:g} h, noise {args.noise:g}, "
+           f"a frame every {args.frame_ms} ms")
+    report(f"  frames reading the ADC   {frames[1]} of {frames[0]}")
+    report(f"  dimmer level changes     {len(changes)} ({reversals} undone within {REVERSAL_MS // 1000} s)")
+    report(f"  level error              mean {sum(errors) / len(errors):.3f}   p99 {ordered[int(len(ordered) * 0.99)]:.3f}")
+    report(f"  light level updates      {'none, publishing was disabled' if args.legacy else published[0]}")
+
+    failures = []
+    if not args.legacy:
+        if frames[1] > 0:
+            failures.append(f"{frames[1]} frames read the ADC")
+        if reversals > 0:
+            failures.append(f"the dimmer undid {reversals} level changes within {REVERSAL_MS // 1000} s")
+        if ordered[int(len(ordered) * 0.99)] > LEVEL_BUDGET:
+            failures.append(f"p99 level error {ordered[int(len(ordered) * 0.99)]:.3f} is over {LEVEL_BUDGET}")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+    Measures what logging costs while handling MQTT commands: each command is dispatched to its
+    handler, and the clock's scheduled tasks (publishing the resulting state changes, the pendulum's
+    swing, the dial ring's frames) run between commands, as on the clock.
+
+        python -m sim.bench_logging [--messages 20000]
+
+    Modes:
+        print         every record formatted and written to the console where it is logged, as
+                      print() did before src/Log.py
+        ring          Log at DEBUG: records kept in the ring, formatted and flushed every 1000 ms
+        level off     Log.level above ERROR, so records are dropped as they are logged
+        compiled out  Log.BUILD_LEVEL above ERROR, so the log functions do nothing
+
+    Reported: the host time for one Log.debug() call, host time per command, and the bytes and separate writes to the console per command.
+    On the Pico each console write blocks on the USB serial, which the host doesn't show.
+    Exits with 1 if the ring makes more than WRITES_BUDGET of print's console writes, or the level off
+    and compiled out modes write anything.
+"""
+import argparse
+import builtins
+import random
+import time
+
+from sim import harness
+
+harness.install(virtual=True)
+
+from Clock import Clock  # noqa: E402
+from MqttManager import MqttManager  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+import Discovery  # noqa: E402
+import Log  # noqa: E402
+
+MESSAGES = {
+    "pendulum_swing": b"ON",
+    "chime": b"OFF",
+    "pendulum_light": b'{"state": "ON", "color": {"r": 10, "g": 20, "b": 30}}',
+    "dial": b'{"state": "ON", "effect": "AlertPattern", "color": {"r": 10, "g": 20, "b": 30}}',
+}
+
+# Commands arrive this far apart (virtual time)
+COMMAND_MS = 50
+FLUSH_MS = 1000
+
+# Console writes the ring may make, as a fraction of those print() made
+WRITES_BUDGET = 0.25
+
+_console_bytes = 0
+_console_writes = 0
+
+
+def _console(*args, **kwargs) -> None:
+    global _console_bytes, _console_writes
+    _console_bytes += len(" ".join(str(a) for a in args)) + 1
+    _console_writes += 1
+
+
+def _print_now(fmt, a=Log._MISSING, b=Log._MISSING, c=Log._MISSING) -> None:
+    # What print(f"...") in the firmware did: format and write it out there and then
+    args = tuple(x for x in (a, b, c) if x is not Log._MISSING)
+    print(fmt % args if args else fmt)
+
+
+class _Client:
+    sock = None
+
+    def publish(self, topic, data) -> None:
+        pass
+
+
+def _set_mode(mode: str) -> None:
+    functions = {"debug": Log._debug, "info": Log._info, "warning": Log._warning, "error": Log._error}
+    for name, function in functions.items():
+        if mode == "print":
+            function = _print_now
+        elif mode == "compiled out":
+            function = Log._off
+        setattr(Log, name, function)
+    Log.level = Log.ERROR + 1 if mode == "level off" else Log.DEBUG
+
+
+def _time_call(calls: int = 100_000) -> float:
+    debug = Log.debug
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        debug("Updating %s", "dial")
+    elapsed = time.perf_counter_ns() - start
+    Log.flush()
+    return elapsed / calls
+
+
+def _run(mode: str, flood: list) -> tuple:
+    global _console_bytes, _console_writes
+    _set_mode(mode)
+    call = _time_call()
+
+    scheduler = Scheduler()
+    manager = MqttManager("sim-broker", "", "", Clock(scheduler), scheduler)
+    manager._mqtt_client = _Client()
+    manager.is_connected = True
+
+    _console_bytes = 0
+    _console_writes = 0
+    elapsed = 0
+    since_flush = 0
+    for topic, message in flood:
+        harness.clock.advance_us(COMMAND_MS * 1000)
+        start = time.perf_counter_ns()
+        manager._handle_new_message(topic, message)
+        scheduler.run_pending()
+
+        since_flush += COMMAND_MS
+        if since_flush >= FLUSH_MS:
+            since_flush = 0
+            Log.flush()
+        elapsed += time.perf_counter_ns() - start
+
+    Log.flush()
+    count = len(flood)
+    return call, elapsed / count, _console_bytes / count, _console_writes / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = _console
+
+    rng = random.Random(args.seed)
+    entities = list(MESSAGES)
+    flood = []
+    for _ in range(args.messages):
+        entity = rng.choice(entities)
+        flood.append((Discovery.COMMAND_TOPICS[entity], MESSAGES[entity]))
+
+    report(f"Handling {args.messages} MQTT commands")
+    results = {}
+    for mode in ("print", "ring", "level off", "compiled out"):
+        call, ns, console, writes = results[mode] = _run(mode, flood)
+        report(f"  {mode:13s} {call:5.0f} ns / call  {ns:8.0f} ns / command  {console:6.1f} console bytes  {writes:6.3f} console writes / command")
+
+    builtins.print = report
+
+    failures = []
+    if results["ring"][3] > results["print"][3] * WRITES_BUDGET:
+        failures.append(f"ring makes {results['ring'][3]:.3f} console writes per command, budget is "
+                        f"{results['print'][3] * WRITES_BUDGET:.3f}")
+    for mode in ("level off", "compiled out"):
+        if results[mode][2] > 0:
+            failures.append(f"{mode} writes {results[mode][2]:.1f} console bytes per command")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
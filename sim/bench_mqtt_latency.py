@@ -0,0 +1,118 @@
+"""
+    Measures how long Home Assistant commands take to be acted on, from the broker sending them to the
+    clock's hardware changing, in virtual time.
+
+        python -m sim.bench_mqtt_latency [--commands 200] [--poll-ms 500]
+
+    --poll-ms swaps the event-driven receive path for the old behaviour of calling check_msg() on a
+    timer, for comparison. Also reports how many times the receive path woke up.
+    Exits with 1 if (other than with --poll-ms) any command took longer than LATENCY_BUDGET_MS.
+"""
+import argparse
+import builtins
+import random
+import select
+
+from sim import harness
+from sim.simulation import Simulation
+
+from Scheduler import sleep_ms  # noqa: E402
+import MqttManager as mqtt_module  # noqa: E402
+
+# The longest a command can take to be acted on, a dial ring frame and a half
+LATENCY_BUDGET_MS = 50
+
+_wakeups = 0
+
+
+def _use_polling(period_ms: int) -> None:
+    async def _poll_messages(self, client):
+        global _wakeups
+        while self._mqtt_client is client:
+            await sleep_ms(period_ms)
+            _wakeups += 1
+            try:
+                # check_msg() handles one message per call, so drain everything that arrived since the last poll
+                while self._mqtt_client is client and select.select([client.sock], [], [], 0)[0]:
+                    client.check_msg()
+            except OSError:
+                self.stop()
+
+    mqtt_module.MqttManager._receive_messages = _poll_messages
+
+
+def _count_wakeups() -> None:
+    wait_readable = mqtt_module.wait_readable
+
+    async def _counting_wait(sock):
+        global _wakeups
+        await wait_readable(sock)
+        _wakeups += 1
+
+    mqtt_module.wait_readable = _counting_wait
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--poll-ms", type=int, help="emulate the old timer-driven check_msg() with this period")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    if args.poll_ms:
+        _use_polling(args.poll_ms)
+    else:
+        _count_wakeups()
+
+    sim = Simulation()
+    rng = random.Random(args.seed)
+    latencies = []
+    pending = []
+
+    def send(s):
+        # Alternate the swing on and off, so every command changes the swing pin
+        pending.append(s.now_ms())
+        s.command("pendulum_swing", "ON" if len(pending) % 2 else "OFF")
+
+    start = 10_000
+    t = start
+    for _ in range(args.commands):
+        t += rng.randint(2_000, 4_000)
+        sim.at(t, send)
+
+    sim.run(t + 5_000)
+    sim.close()
+
+    sent = iter(pending)
+    for ms, device, _ in sim.trace.events:
+        if device == "pin17":
+            latencies.append(ms - next(sent))
+
+    latencies.sort()
+    duration_s = (t - start) / 1000
+    mode = f"polling every {args.poll_ms} ms" if args.poll_ms else "event driven"
+    report(f"Receive path: {mode}")
+    report(f"Commands: {len(latencies)}")
+    report(f"Latency ms: mean {sum(latencies) / len(latencies):.1f}, "
+           f"p50 {latencies[len(latencies) // 2]}, p99 {latencies[int(len(latencies) * 0.99)]}, max {latencies[-1]}")
+    report(f"Receive wakeups: {_wakeups} ({_wakeups / duration_s:.2f} / s)")
+
+    if not args.poll_ms:
+        metrics = sim.manager._mqtt_manager.get_metrics()
+        # Virtual time stands still while firmware code runs, so this only shows the wait for the render core to
+        # pick a command up (or nothing, on one core). On the device it includes the time spent handling it too
+        report(f"MqttManager.get_metrics(): {metrics}")
+
+    failures = []
+    if len(latencies) != args.commands:
+        failures.append(f"{args.commands - len(latencies)} of {args.commands} commands weren't acted on")
+    if not args.poll_ms and latencies[-1] > LATENCY_BUDGET_MS:
+        failures.append(f"a command took {latencies[-1]} ms, budget is {LATENCY_BUDGET_MS} ms")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+    Takes the Wi-Fi away for a while and measures how the clock copes: how soon it is back on MQTT once
+    the network returns, how many times it tried to join in the meantime, and whether the dial's
+    waiting animation kept moving smoothly throughout.
+
+        python -m sim.bench_outage [--outages 5,30,120,600] [--trials 5] [--legacy]
+
+    Backoff delays are random, so each outage length is run --trials times, each with its own seed.
+
+    --legacy emulates the old health check, which retried the Wi-Fi every 11 s for as long as the
+    outage lasted (10 s of polling a second apart, then 1 s until the next check) and slept 6 s
+    after getting it back before reconnecting MQTT.
+
+    Back on MQTT is when the connection that stayed up to the end of the run was made. Exits with 1 if
+    (other than with --legacy) the clock took longer than RECOVERY_BUDGET_MS to get back on MQTT after any
+    outage, connected more than once after it, was left with more than one connection on the broker, or
+    the dial's animation was late with a frame.
+"""
+import argparse
+import builtins
+import random
+import socket
+import struct
+import time
+
+from sim import harness
+from sim.simulation import Simulation
+
+import ClockManager as manager_module  # noqa: E402
+from MqttManager import MqttManager  # noqa: E402
+import network  # noqa: E402
+from ClockSettings import ClockSettings  # noqa: E402
+from machine import RTC  # noqa: E402
+from Scheduler import PRIORITY_LOW, sleep_ms  # noqa: E402
+
+OUTAGE_AT_MS = 20_000
+
+# The waiting pattern moves a LED every 50 ms
+STEP_MS = 50
+
+# The longest the clock may take to be back on MQTT once the network returns: the longest backoff, then the connect
+RECOVERY_BUDGET_MS = manager_module._BACKOFF_MAX_MS + 5_000
+
+
+def _use_legacy() -> None:
+    # The old ClockManager's boot and health check, as coroutines on the scheduler
+    async def main(self):
+        self._heath_check_busy = False
+        self._trying_reconnection = False
+        self._scheduler.spawn(boot(self))
+        await self._scheduler.run()
+
+    async def boot(self):
+        self._clock = manager_module.Clock(self._scheduler)
+        self._clock.reset()
+        self._mqtt_manager = MqttManager(ClockSettings.mqtt_address, ClockSettings.mqtt_username,
+                                         ClockSettings.mqtt_password, self._clock, self._scheduler)
+        while True:
+            try:
+                self._clock.show_waiting()
+                await connect_wifi(self)
+                set_time()
+                self._mqtt_manager.connect()
+                self._mqtt_manager.publish_autoconf()
+                self._clock.clear_ring_pattern()
+                break
+            except Exception:
+                self._clock.show_boot_error()
+                await sleep_ms(10000)
+        self.state = manager_module.CONNECTED
+        self._scheduler.periodic(1000, lambda t: health_check(self), "Health check", PRIORITY_LOW)
+
+    def health_check(self):
+        if self._heath_check_busy:
+            return
+        if self._wlan.status() == 3 and self._mqtt_manager.is_connected:
+            return
+        self._heath_check_busy = True
+        self._scheduler.spawn(check_connections(self))
+
+    async def check_connections(self):
+        try:
+            if self._wlan.status() != 3:
+                try:
+                    if not self._trying_reconnection:
+                        self._clock.show_waiting()
+                        self._trying_reconnection = True
+                    self._mqtt_manager.stop()
+                    await connect_wifi(self)
+                    await sleep_ms(6000)
+                    self._trying_reconnection = False
+                except Exception:
+                    return
+
+            if self._mqtt_manager.is_connected is False:
+                if not self._trying_reconnection:
+                    self._clock.show_waiting()
+                    self._trying_reconnection = True
+                try:
+                    self._mqtt_manager.connect()
+                    self._mqtt_manager.publish_autoconf()
+                    self._clock.clear_ring_pattern()
+                    self._trying_reconnection = False
+                except Exception:
+                    pass
+        finally:
+            self._heath_check_busy = False
+
+    def set_time():
+        addr = socket.getaddrinfo(ClockSettings.ntp_host, ClockSettings.ntp_port)[0][-1]
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.settimeout(1)
+            s.sendto(b"\x1b" + bytes(47), addr)
+            harness.clock.deliver()
+            msg = s.recv(48)
+        finally:
+            s.close()
+        tm = time.gmtime(struct.unpack("!I", msg[40:44])[0] - 2208988800)
+        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+    async def connect_wifi(self):
+        self._wlan.active(True)
+        self._wlan.connect(ClockSettings.wifi_name, ClockSettings.wifi_psk)
+        max_wait = 10
+        while max_wait > 0:
+            if self._wlan.status() < 0 or self._wlan.status() >= 3:
+                break
+            max_wait -= 1
+            await sleep_ms(1000)
+        if self._wlan.status() != 3:
+            raise RuntimeError("wifi connection failed")
+
+    manager_module.ClockManager.main = main
+
+
+def _run(outage_ms: int) -> dict:
+    # Virtual time and the output trace carry on from any earlier run
+    sim = Simulation()
+    sim.trace.events.clear()
+    lost = sim.now_ms() + OUTAGE_AT_MS
+    restored = lost + outage_ms
+    sim.outage(lost, outage_ms)
+    sim.run(restored + 90_000 - sim.now_ms())
+    sim.close()
+
+    # The last connect is the one that stayed up, if the clock is still connected at the end
+    reconnected = [ms for ms in sim.broker.connected_at if ms >= restored]
+    stayed_up = reconnected and sim.manager._mqtt_manager.is_connected
+
+    # Frames written to the dial while the clock was showing it was waiting for the network
+    frames = [ms for ms, device, _ in sim.trace.events if device == "neopixel27" and lost < ms < restored]
+    gaps = [b - a for a, b in zip(frames, frames[1:])]
+    return {
+        "back_on_mqtt_ms": reconnected[-1] - restored if stayed_up else None,
+        "connects": len(reconnected),
+        "broker_clients": len(sim.broker.clients),
+        "join_attempts": network.sim.connects,
+        "dial_frames": len(frames),
+        "dial_max_gap_ms": max(gaps) if gaps else None,
+        "dial_late_frames": sum(1 for g in gaps if g > STEP_MS),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--outages", default="5,30,120,600", help="outage lengths, in seconds")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--legacy", action="store_true", help="emulate the old health check")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    if args.legacy:
+        _use_legacy()
+
+    report(f"Wi-Fi outages, {'old health check' if args.legacy else 'state machine'}, {args.trials} trials each")
+    report(f"{'outage s':>10}{'back on MQTT ms':>18}{'(max)':>8}{'joins':>8}{'connects':>10}{'max frame gap ms':>18}"
+           f"{'late frames':>13}")
+    failures = []
+    for seconds in (int(s) for s in args.outages.split(",")):
+        results = []
+        for trial in range(args.trials):
+            random.seed(trial)
+            network.sim.connects = 0
+            results.append(_run(seconds * 1000))
+
+        back = [r["back_on_mqtt_ms"] for r in results if r["back_on_mqtt_ms"] != None]
+        connects = max(r["connects"] for r in results)
+        report(f"{seconds:>10}{sum(back) / len(back) if back else float('nan'):>18.0f}{max(back) if back else '-':>8}"
+               f"{sum(r['join_attempts'] for r in results) / len(results):>8.1f}{connects:>10}"
+               f"{max(r['dial_max_gap_ms'] for r in results):>18}{sum(r['dial_late_frames'] for r in results):>13}")
+
+        if not args.legacy:
+            if len(back) < len(results):
+                failures.append(f"{seconds} s outage: not connected at the end of {len(results) - len(back)} trials")
+            elif max(back) > RECOVERY_BUDGET_MS:
+                failures.append(f"{seconds} s outage: back on MQTT after {max(back)} ms, budget is {RECOVERY_BUDGET_MS} ms")
+            if connects > 1:
+                failures.append(f"{seconds} s outage: connected {connects} times after the network came back")
+            clients = max(r["broker_clients"] for r in results)
+            if clients > 1:
+                failures.append(f"{seconds} s outage: {clients} connections left on the broker")
+            late = sum(r["dial_late_frames"] for r in results)
+            if late > 0:
+                failures.append(f"{seconds} s outage: {late} late dial frames")
+
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+    Benchmarks render() for every dial ring pattern (every subclass of RingPatterns.BasePattern, and
+    every Animation defined in RingPatterns) and checks each fits in the frame budget.
+
+        python -m sim.bench_patterns [--frames 5000] [--budget-ms 33] [--alloc-budget BYTES]
+                                     [--baseline old.json] [--tolerance 0.2] [--output results.json]
+
+    Patterns are animated on virtual time, a frame apart, so time-based patterns move as they would on
+    the clock. Results are printed as JSON. The exit status is 1 if any pattern's p99 render time is
+    over budget, allocates more than --alloc-budget bytes per frame, or (with --baseline) has a p99
+    more than --tolerance slower than the baseline run.
+
+    Allocation figures come from tracemalloc under CPython: alloc_bytes_per_frame is the high-water
+    mark of memory allocated during a render, retained_bytes_per_frame is what was still allocated
+    afterwards. Under the MicroPython unix port they come from gc.mem_alloc() with the GC disabled
+    and are exact, and allocs_per_frame is the number of 16 byte heap blocks.
+"""
+import argparse
+import builtins
+import gc
+import json
+import sys
+import time
+
+from sim import harness
+
+harness.install(virtual=True)
+
+from Animation import Animation  # noqa: E402
+from Colour import Colour  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+import RingPatterns  # noqa: E402
+
+_MICROPYTHON = sys.implementation.name == "micropython"
+if not _MICROPYTHON:
+    import tracemalloc
+
+FRAME_MS = 33
+
+# Constructor arguments for patterns that need them
+PATTERN_ARGS = {
+    "SolidPattern": lambda: (Colour(0, 80, 200),),
+    "CountdownPattern": lambda: (600,),
+}
+
+
+def _pattern_classes(base=RingPatterns.BasePattern) -> list:
+    found = []
+    for cls in base.__subclasses__():
+        found.append(cls)
+        found.extend(_pattern_classes(cls))
+    return found
+
+
+def _all_patterns() -> list:
+    """
+        (name, factory) for every pattern class, and an AnimationPattern for every Animation.
+    """
+    found = []
+    for cls in _pattern_classes():
+        if cls is RingPatterns.AnimationPattern:
+            continue
+        args = PATTERN_ARGS.get(cls.__name__, lambda: ())
+        found.append((cls.__name__, lambda cls=cls, args=args: cls(*args())))
+
+    for value in vars(RingPatterns).values():
+        if isinstance(value, Animation):
+            found.append((value.name, lambda animation=value: RingPatterns.AnimationPattern(animation)))
+    return found
+
+
+class _PatternRunner:
+    """
+        Runs a pattern's animation on virtual time and renders it, restarting it if it finishes.
+    """
+    def __init__(self, factory) -> None:
+        self._factory = factory
+        self._scheduler = Scheduler()
+        self.buf = bytearray(60)
+        self._start()
+
+    def _start(self) -> None:
+        self.pattern = self._factory()
+        self.pattern.start(self._scheduler)
+
+    def next_frame(self) -> None:
+        harness.clock.advance_us(FRAME_MS * 1000)
+        self._scheduler.run_pending()
+
+    def render(self) -> bool:
+        return self.pattern.render(self.buf)
+
+    def restart_if_finished(self, finished: bool) -> None:
+        if finished:
+            self.pattern.stop()
+            self._start()
+
+
+def _time_pattern(factory, frames: int) -> list:
+    runner = _PatternRunner(factory)
+    times = []
+    for _ in range(frames):
+        runner.next_frame()
+        start = time.perf_counter_ns()
+        ok = runner.render()
+        times.append(time.perf_counter_ns() - start)
+        runner.restart_if_finished(not ok)
+    return times
+
+
+def _measure_allocations(factory, frames: int) -> dict:
+    runner = _PatternRunner(factory)
+    peak_total = 0
+    retained_total = 0
+    for _ in range(frames):
+        runner.next_frame()
+        if _MICROPYTHON:
+            gc.collect()
+            gc.disable()
+            before = gc.mem_alloc()
+            ok = runner.render()
+            allocated = gc.mem_alloc() - before
+            gc.enable()
+            peak_total += allocated
+            retained_total += allocated
+        else:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            ok = runner.render()
+            current, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - before
+            retained_total += current - before
+        runner.restart_if_finished(not ok)
+
+    result = {
+        "alloc_bytes_per_frame": round(peak_total / frames, 1),
+        "retained_bytes_per_frame": round(retained_total / frames, 1),
+    }
+    if _MICROPYTHON:
+        result["allocs_per_frame"] = round(peak_total / 16 / frames, 2)
+    return result
+
+
+def _percentile(values: list, pc: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pc))]
+
+
+def run(frames: int) -> dict:
+    results = {}
+    for name, factory in _all_patterns():
+        times = _time_pattern(factory, frames)
+        if not _MICROPYTHON:
+            tracemalloc.start()
+        allocations = _measure_allocations(factory, min(frames, 1000))
+        if not _MICROPYTHON:
+            tracemalloc.stop()
+
+        result = {
+            "mean_us": round(sum(times) / len(times) / 1000, 2),
+            "p99_us": round(_percentile(times, 0.99) / 1000, 2),
+            "max_us": round(max(times) / 1000, 2),
+        }
+        result.update(allocations)
+        results[name] = result
+    return results
+
+
+def check(results: dict, budget_ms: float, alloc_budget, baseline: dict, tolerance: float) -> list:
+    failures = []
+    for name, result in results.items():
+        if result["p99_us"] > budget_ms * 1000:
+            failures.append(f"{name}: p99 {result['p99_us']} us is over the {budget_ms} ms budget")
+        if alloc_budget is not None and result["alloc_bytes_per_frame"] > alloc_budget:
+            failures.append(f"{name}: allocates {result['alloc_bytes_per_frame']} bytes per frame, budget is {alloc_budget}")
+        if baseline is not None and name in baseline:
+            limit = baseline[name]["p99_us"] * (1 + tolerance)
+            if result["p99_us"] > limit:
+                failures.append(f"{name}: p99 {result['p99_us']} us regressed from {baseline[name]['p99_us']} us")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--budget-ms", type=float, default=FRAME_MS, help="max p99 render time per frame")
+    parser.add_argument("--alloc-budget", type=float, help="max bytes allocated per frame")
+    parser.add_argument("--baseline", help="JSON output of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p99 slowdown against the baseline")
+    parser.add_argument("--output", help="also write the JSON to this file")
+    args = parser.parse_args()
+
+    # Keep anything the firmware logs out of the JSON
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    results = run(args.frames)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["patterns"]
+
+    failures = check(results, args.budget_ms, args.alloc_budget, baseline, args.tolerance)
+    output = {
+        "implementation": sys.implementation.name,
+        "frames": args.frames,
+        "budget_ms": args.budget_ms,
+        "patterns": results,
+        "failures": failures,
+    }
+
+    text = json.dumps(output, indent=2)
+    report(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+    Drives the dial ring through the PIO / DMA backend on virtual time and checks that every frame
+    reaches the LEDs: a frame started before the last one has latched runs on from it and is lost.
+
+        python -m sim.bench_pio [--frames 300]
+
+    Covers a clear() followed straight away by a static pattern's first frame (which is then never
+    redrawn, so a lost frame stays wrong) and an animation at the full frame rate. Exits with 1 if any
+    frame was sent too soon.
+"""
+import argparse
+import sys
+
+from sim import harness
+
+harness.install(virtual=True)
+
+import rp2  # noqa: E402
+from Colour import Colour  # noqa: E402
+from DialRing import DialRing  # noqa: E402
+import RingPatterns  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+
+
+class _FixedLightMeter:
+    def GetOffset(self) -> float:
+        return 0.0
+
+
+def _run(name: str, action) -> bool:
+    merged = len(rp2.merged)
+    transfers = len(rp2.transfers)
+    action()
+    lost = rp2.merged[merged:]
+    sent = rp2.transfers[transfers:]
+    waited = sum(t[3] for t in sent)
+    print(f"  {name:<28}{len(sent):>8}{len(lost):>8}{waited:>12}")
+    return not lost
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    scheduler = Scheduler()
+    ring = DialRing(27, _FixedLightMeter(), scheduler, use_pio=True)
+
+    def clear_then_solid():
+        for _ in range(args.frames // 10):
+            ring.clear()
+            ring.set_dial_ring(Colour(0, 0, 200), None)
+
+    def animation():
+        ring.showPattern(RingPatterns.AnimationPattern(RingPatterns.BOOTING))
+        for _ in range(args.frames):
+            harness.clock.advance_us(ring._pattern.refresh_period * 1000)
+            ring._swap_pattern_callback(None)
+
+    print(f"  {'case':<28}{'frames':>8}{'lost':>8}{'waited us':>12}")
+    ok = _run("clear, then solid colour", clear_then_solid)
+    ok = _run("booting animation", animation) and ok
+    ring.clear()
+    ring.np.deinit()
+
+    if not ok:
+        print("Frames were sent before the last one had latched")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+    Measures how long the clock takes to be ready again after losing its MQTT connection: from the
+    reconnect to every entity's state having been published, in virtual time.
+
+        python -m sim.bench_reconnect [--reconnects 50] [--rtt-ms 80] [--legacy]
+
+    --rtt-ms is the simulated network round trip, paid by every packet the client waits on a reply
+    for (CONNECT and each SUBSCRIBE). --legacy emulates the old publish_autoconf(), which subscribed
+    to one topic at a time and serialized and published every discovery config on each reconnect.
+    Also reports packets and bytes sent per reconnect and the CPU time spent reconnecting.
+    Exits with 1 if (other than with --legacy) a connect sent more than one SUBSCRIBE, or a reconnect took
+    longer than two round trips (CONNECT and SUBSCRIBE) plus READY_BUDGET_MS to be ready.
+"""
+import argparse
+import builtins
+import json
+import time
+
+from sim import harness
+from sim.simulation import Simulation
+
+import Discovery  # noqa: E402
+import MqttManager as mqtt_module  # noqa: E402
+
+# Time (ms) a reconnect may take to be ready, on top of its round trips to the broker
+READY_BUDGET_MS = 50
+
+_cpu_ns = 0
+
+
+def _use_legacy() -> None:
+    def _subscribe_all(self, client):
+        for topic in Discovery.COMMAND_TOPICS.values():
+            client.subscribe(topic)
+
+    def publish_autoconf(self):
+        for topic, payload in Discovery.CONFIGS:
+            # The old code built and serialized every config on each connect
+            self._mqtt_client.publish(topic, json.dumps(json.loads(payload)))
+        self._publish_all_state()
+
+    mqtt_module.MqttManager._subscribe_all = _subscribe_all
+    mqtt_module.MqttManager.publish_autoconf = publish_autoconf
+
+
+def _time_cpu(name: str) -> None:
+    method = getattr(mqtt_module.MqttManager, name)
+
+    def timed(self, *args):
+        global _cpu_ns
+        start = time.perf_counter_ns()
+        try:
+            return method(self, *args)
+        finally:
+            _cpu_ns += time.perf_counter_ns() - start
+
+    setattr(mqtt_module.MqttManager, name, timed)
+
+
+def _ready_times(sim: Simulation) -> list:
+    # For each connect, how long until the state of every published entity had gone out. Home Assistant ignores
+    # state it has no config for, so if the configs were published, only state published after them counts
+    state_topics = [Discovery.STATE_TOPICS[e] for e in mqtt_module.ENTITIES]
+    config_topics = {topic for topic, _ in Discovery.CONFIGS}
+    connects = sim.broker.connected_at + [None]
+    times = []
+    for start, end in zip(connects, connects[1:]):
+        seen = {}
+        for ms, topic, _, _ in sim.broker.published:
+            if ms < start or (end is not None and ms >= end):
+                continue
+            if topic in config_topics:
+                seen = {}
+            elif topic in state_topics:
+                seen.setdefault(topic, ms)
+        if len(seen) == len(state_topics):
+            times.append(max(seen.values()) - start)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reconnects", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=int, default=80)
+    parser.add_argument("--legacy", action="store_true", help="emulate the old publish_autoconf()")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    if args.legacy:
+        _use_legacy()
+    for name in ("connect", "publish_autoconf", "_publish_discovery"):
+        _time_cpu(name)
+
+    sim = Simulation()
+    sim.broker.rtt_ms = args.rtt_ms
+
+    start = 10_000
+    t = start
+    for _ in range(args.reconnects):
+        t += 10_000
+        sim.at(t, lambda s: s.broker.drop_all())
+
+    sim.run(t + 10_000)
+    sim.close()
+
+    # The first connect is boot, which also has to publish the configs
+    ready = _ready_times(sim)
+    reconnect_ready = sorted(ready[1:])
+    reconnects = len(sim.broker.connected_at)
+
+    report(f"Discovery: {'legacy' if args.legacy else 'cached'}, RTT {args.rtt_ms} ms")
+    report(f"Boot connect to ready: {ready[0]} ms")
+    report(f"Reconnects: {len(reconnect_ready)}")
+    report(f"Reconnect to ready ms: mean {sum(reconnect_ready) / len(reconnect_ready):.1f}, "
+           f"max {reconnect_ready[-1]}")
+    report(f"Per connect: {sim.broker.subscribe_packets / reconnects:.1f} SUBSCRIBE packets, "
+           f"{sim.broker.publish_packets / reconnects:.1f} PUBLISH packets, "
+           f"{sim.broker.publish_bytes / reconnects:.0f} bytes published")
+    report(f"CPU per connect: {_cpu_ns / reconnects / 1000:.0f} us")
+
+    failures = []
+    if not args.legacy:
+        if sim.broker.subscribe_packets > reconnects:
+            failures.append(f"{sim.broker.subscribe_packets} SUBSCRIBE packets for {reconnects} connects")
+        budget = 2 * args.rtt_ms + READY_BUDGET_MS
+        if reconnect_ready[-1] > budget:
+            failures.append(f"a reconnect took {reconnect_ready[-1]} ms to be ready, budget is {budget} ms")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
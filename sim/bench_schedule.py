@@ -0,0 +1,138 @@
+"""
+    Runs the clock for a day of virtual time with a chime schedule and checks the cuckoo: how many times
+    it called each hour, how long after the hour it started, and how often the schedule had to wake up.
+
+        python -m sim.bench_schedule [--hours 24] [--resync-ms 10] [--legacy]
+
+    The schedule cuckoos the hour (on a 12 hour clock) and once at half past, silent from 22:00 to 07:00.
+    The simulated day starts at midnight UTC. --resync-ms after every hour and half hour the clock is told
+    the time has been set again, as it is after the RTC is set, which must not lose that cuckoo (-1 not to).
+    Exits with 1 if any half hour had the wrong cuckoos.
+
+    --legacy emulates doing the same by polling the RTC every second from a periodic task, with the old
+    chime that ignored a chime asked for while it was already going.
+"""
+import argparse
+import builtins
+import json
+import sys
+
+from sim.simulation import Simulation
+
+from Chime import Chime  # noqa: E402
+from Clock import Clock  # noqa: E402
+from ClockSettings import ClockSettings  # noqa: E402
+from machine import RTC  # noqa: E402
+from Scheduler import PRIORITY_NORMAL  # noqa: E402
+
+HOUR_MS = 3_600_000
+
+SCHEDULE = {
+    "utc_offset": 0,
+    "quiet": [22, 7],
+    "rules": [
+        {"at": "*:00", "do": "chime", "count": "hour"},
+        {"at": "*:30", "do": "chime", "count": 1},
+    ],
+}
+
+
+def _expected(hour: int, minute: int) -> int:
+    if hour >= 22 or hour < 7:
+        return 0
+    if minute == 30:
+        return 1
+    return hour % 12 or 12
+
+
+def _use_legacy(polls: list) -> None:
+    chime_once = Chime.chime
+
+    def chime(self, count=1):
+        if not self.is_chiming:
+            chime_once(self, 1)
+
+    def time_changed(self, now_ms=None):
+        if getattr(self, "_poll", None) != None:
+            return
+        last = [None]
+
+        def poll(t):
+            polls[0] += 1
+            dt = RTC().datetime()
+            if dt[5] not in (0, 30) or last[0] == dt[4:6] or _expected(dt[4], dt[5]) == 0:
+                return
+            last[0] = dt[4:6]
+            for _ in range(_expected(dt[4], dt[5])):
+                self._chime.chime()
+
+        self._poll = self._scheduler.periodic(1000, poll, "Chime poll", PRIORITY_NORMAL)
+
+    Chime.chime = chime
+    Clock.time_changed = time_changed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--resync-ms", type=int, default=10)
+    parser.add_argument("--legacy", action="store_true", help="emulate polling the RTC with the old chime")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    polls = [0]
+    if args.legacy:
+        _use_legacy(polls)
+
+    sim = Simulation()
+    sim.trace.events.clear()
+    start_ms = sim.now_ms()
+    sim.at(start_ms + 10_000, lambda s: s.command("schedule", json.dumps(SCHEDULE)))
+    if args.resync_ms >= 0:
+        slot = start_ms // (HOUR_MS // 2) + 1
+        while slot * (HOUR_MS // 2) < start_ms + args.hours * HOUR_MS:
+            sim.at(slot * (HOUR_MS // 2) + args.resync_ms, lambda s: s.manager._clock.time_changed(s.manager._timeSync.now_ms))
+            slot += 1
+    sim.run(int(args.hours * HOUR_MS))
+    sim.close()
+
+    # Cuckoos, by the half hour they came in
+    cuckoos = {}
+    for ms, device, value in sim.trace.events:
+        if device == "pin14" and value:
+            slot = ms // (HOUR_MS // 2)
+            first, count = cuckoos.get(slot, (ms, 0))
+            cuckoos[slot] = (first, count + 1)
+
+    slots = range(start_ms // (HOUR_MS // 2) + 1, (start_ms + int(args.hours * HOUR_MS)) // (HOUR_MS // 2))
+    right = wrong = 0
+    late = []
+    for slot in slots:
+        hour, minute = slot // 2 % 24, 30 * (slot % 2)
+        first, count = cuckoos.get(slot, (None, 0))
+        if count == _expected(hour, minute):
+            right += 1
+        else:
+            wrong += 1
+        if first != None:
+            late.append(first - slot * (HOUR_MS // 2))
+
+    # With the hardware on the second core, the manager only has a RemoteClock
+    clock = sim.manager._clock._core.clock if ClockSettings.dual_core else sim.manager._clock
+    schedule = clock._schedule
+    wakes = polls[0] if args.legacy else schedule.wakes
+    report(f"{'polling the RTC, old chime' if args.legacy else 'ChimeSchedule'}: {args.hours:g} h")
+    report(f"  half hours with the right cuckoos   {right} of {right + wrong}")
+    report(f"  cuckoos                             {sum(c for _, c in cuckoos.values())} "
+           f"(expected {sum(_expected(s // 2 % 24, 30 * (s % 2)) for s in slots)})")
+    if late:
+        report(f"  first cuckoo after the time ms      mean {sum(late) / len(late):.0f}   max {max(late)}")
+    report(f"  wake ups                            {wakes} ({wakes / args.hours:.1f} / h)")
+    if wrong > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+    Runs the dial ring, pendulum and chime on the scheduler for a while, then prints each task's timing stats.
+
+        python -m sim.bench_scheduler [--seconds N]
+
+    Runs on the host's own time, not virtual time. Exits with 1 if any task missed its deadline.
+"""
+import argparse
+
+from sim import harness
+
+harness.install()
+
+from Scheduler import Scheduler, asyncio  # noqa: E402
+from Pendulum import Pendulum  # noqa: E402
+from LightMeter import LightMeter  # noqa: E402
+from DialRing import DialRing  # noqa: E402
+from Chime import Chime  # noqa: E402
+import RingPatterns  # noqa: E402
+
+
+def print_stats(stats: list) -> None:
+    print(f"{'task':<22}{'period':>8}{'runs':>7}{'late avg':>10}{'late max':>10}{'misses':>8}{'run avg us':>12}{'run max us':>12}")
+    for s in stats:
+        print(f"{s['name']:<22}{s['period']:>8}{s['runs']:>7}{s['late_avg']:>10.2f}{s['late_max']:>10}"
+              f"{s['deadline_misses']:>8}{s['run_avg_us']:>12}{s['run_max_us']:>12}")
+
+
+async def _scenario(scheduler: Scheduler, seconds: float) -> None:
+    pendulum = Pendulum(6, 9, 10, 17, scheduler)
+    ring = DialRing(27, LightMeter(28, scheduler), scheduler)
+    chime = Chime(14, 15, scheduler)
+
+    ring.showPattern(RingPatterns.AnimationPattern(RingPatterns.BOOTING))
+    pendulum.set_light(200, 100, 50, True, 0)
+    chime.chime()
+
+    runner = scheduler.spawn(scheduler.run())
+    await asyncio.sleep(seconds)
+    runner.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    scheduler = Scheduler()
+    asyncio.run(_scenario(scheduler, args.seconds))
+    stats = scheduler.get_stats()
+    print_stats(stats)
+    harness.finish([f"{s['name']} missed its deadline {s['deadline_misses']} times" for s in stats if s["deadline_misses"] > 0])
+
+
+if __name__ == "__main__":
+    main()
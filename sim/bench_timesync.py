@@ -0,0 +1,106 @@
+"""
+    Runs TimeSync against the fake NTP server for days of virtual time and measures how far the RTC
+    strays from the true time.
+
+        python -m sim.bench_timesync [--days 3] [--drift-ppm 40] [--delay-ms 40] [--jitter-ms 30] [--samples 4] [--legacy]
+
+    The server's time runs --drift-ppm faster than the Pico's crystal (virtual time), and each packet
+    takes half of --delay-ms plus up to --jitter-ms to get there. The RTC's error is checked every
+    minute, counting from an hour in so the first syncs have settled.
+
+    --legacy emulates the old _set_time: one blocking request at boot, whole seconds only, never repeated.
+
+    Exits with 1 if (other than with --legacy) the p99 RTC error is outside TimeSync's target.
+"""
+import argparse
+import asyncio
+import builtins
+import socket
+import struct
+import time
+
+from sim import harness, virtual_time
+
+harness.install(virtual=True)
+
+from sim.ntp_server import FakeNtpServer  # noqa: E402
+
+import machine  # noqa: E402
+from Scheduler import Scheduler  # noqa: E402
+import TimeSync as time_sync  # noqa: E402
+from TimeSync import TimeSync  # noqa: E402
+
+HOUR_MS = 3_600_000
+CHECK_MS = 60_000
+
+
+def _legacy_set_time(address) -> None:
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.settimeout(1)
+        s.sendto(b"\x1b" + bytes(47), address)
+        harness.clock.deliver()
+        msg = s.recv(48)
+    finally:
+        s.close()
+    tm = time.gmtime(struct.unpack("!I", msg[40:44])[0] - 2208988800)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+
+
+async def _check(server: FakeNtpServer, errors: list, settle_ms: int) -> None:
+    while True:
+        await asyncio.sleep(CHECK_MS / 1000)
+        if harness.clock.now_ms() >= settle_ms:
+            errors.append((machine.rtc_unix() - server.time()) * 1000)
+
+
+async def _main(scheduler: Scheduler, server: FakeNtpServer, sync, errors: list, settle_ms: int) -> None:
+    asyncio.get_event_loop().create_task(_check(server, errors, settle_ms))
+    if sync != None:
+        sync.start()
+    else:
+        _legacy_set_time(server.address)
+    await scheduler.run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=3)
+    parser.add_argument("--drift-ppm", type=float, default=40)
+    parser.add_argument("--delay-ms", type=float, default=40)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--legacy", action="store_true", help="emulate the old one-off blocking _set_time")
+    args = parser.parse_args()
+
+    report = builtins.print
+    builtins.print = lambda *a, **k: None
+
+    server = FakeNtpServer(delay_ms=args.delay_ms, jitter_ms=args.jitter_ms, drift_ppm=args.drift_ppm, seed=args.seed)
+    scheduler = Scheduler()
+    sync = None if args.legacy else TimeSync(scheduler, *server.address, samples=args.samples)
+
+    errors = []
+    start_ms = harness.clock.now_ms()
+    virtual_time.run(harness.clock, _main(scheduler, server, sync, errors, start_ms + HOUR_MS), int(args.days * 24 * HOUR_MS))
+    server.close()
+
+    ordered = sorted(abs(e) for e in errors)
+    report(f"{'old one-off _set_time' if args.legacy else f'TimeSync, {args.samples} samples'}: {args.days:g} days, "
+           f"drift {args.drift_ppm:g} ppm, round trip {args.delay_ms:g} ms + up to 2 x {args.jitter_ms:g} ms")
+    report(f"  RTC error ms     mean {sum(errors) / len(errors):8.1f}   p99 |err| {ordered[int(len(ordered) * 0.99)]:8.1f}   max |err| {ordered[-1]:8.1f}")
+    report(f"  NTP requests     {server.requests}")
+    if sync != None:
+        report(f"  syncs            {sync.syncs} ({sync.steps} steps, {sync.failures} failed), DNS lookups {sync.lookups}")
+        report(f"  drift estimate   {sync.drift_ppb / 1000:.1f} ppm, sync interval now {sync.interval_ms // 60000} min")
+
+    failures = []
+    p99 = ordered[int(len(ordered) * 0.99)]
+    if sync != None and p99 > time_sync._TARGET_MS:
+        failures.append(f"p99 |err| {p99:.1f} ms is outside the {time_sync._TARGET_MS} ms target")
+    harness.finish(failures, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+    An in-process MQTT broker for the fake umqtt client, standing in for the real broker and Home Assistant.
+"""
+import socket
+
+from sim import harness
+
+_current = None
+
+
+def current() -> "FakeBroker":
+    if _current is None:
+        raise OSError(113, "no broker")
+    return _current
+
+
+def topic_matches(topic_filter: bytes, topic: bytes) -> bool:
+    filter_parts = topic_filter.split(b"/")
+    topic_parts = topic.split(b"/")
+    for i, part in enumerate(filter_parts):
+        if part == b"#":
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != b"+" and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class FakeBroker:
+    def __init__(self) -> None:
+        self.up = True
+        self.clients = []
+        self.subscriptions = {}
+        self.retained = {}
+
+        # (ms, topic, payload, retain) for everything clients published
+        self.published = []
+
+        # Control packets each client sent, the things that cost a round trip on a real network
+        self.connects = 0
+        self.subscribe_packets = 0
+        self.publish_packets = 0
+        self.publish_bytes = 0
+
+        # Virtual ms of every successful connect
+        self.connected_at = []
+
+        # Simulated network round trip (ms). Packets the client waits for a reply to (CONNECT, SUBSCRIBE)
+        # block it for this long
+        self.rtt_ms = 0
+
+        # Send the retained messages for a SUBSCRIBE before its SUBACK rather than after, which MQTT allows
+        self.retained_first = False
+
+    def install(self) -> "FakeBroker":
+        global _current
+        _current = self
+        return self
+
+    def _check_link(self) -> None:
+        import network
+        if not self.up or not network.sim.available:
+            self.drop_all()
+            raise OSError(113, "broker unreachable")
+
+    def connect(self, client, clean_session: bool = True) -> bool:
+        self._check_link()
+        self._round_trip()
+        self.connects += 1
+        self.connected_at.append(harness.clock.now_ms())
+        client.sock, client._peer = socket.socketpair()
+        client._inbox = []
+        self.clients.append(client)
+        self.subscriptions[client] = []
+        return False
+
+    def disconnect(self, client) -> None:
+        if client in self.clients:
+            self.clients.remove(client)
+            del self.subscriptions[client]
+            client._peer.close()
+
+    def drop_all(self) -> None:
+        """
+            Closes every client's connection, as if the broker had gone away.
+        """
+        for client in list(self.clients):
+            self.disconnect(client)
+
+    def ping(self, client) -> None:
+        self._check_link()
+        client._peer.send(b"\xd0")
+
+    def publish(self, client, topic: bytes, payload: bytes, retain: bool) -> None:
+        self._check_link()
+        self.publish_packets += 1
+        self.publish_bytes += len(topic) + len(payload)
+        self.published.append((harness.clock.now_ms(), topic, payload, retain))
+        self._route(topic, payload, retain)
+
+    def subscribe(self, client, topic_filters: list, pid: bytes = None) -> None:
+        """
+            Handles a SUBSCRIBE packet. If pid is given, sends a SUBACK with that packet id.
+        """
+        self._check_link()
+        self._round_trip()
+        self.subscribe_packets += 1
+
+        # Like a real broker, the SUBACK goes first and the retained messages for the new subscriptions follow it
+        suback = None
+        if pid is not None:
+            suback = b"\x90" + bytes([2 + len(topic_filters)]) + pid + bytes(len(topic_filters))
+            if not self.retained_first:
+                client._peer.send(suback)
+                suback = None
+
+        for topic_filter in topic_filters:
+            if client not in self.clients:
+                # Dropped while the retained messages were delivered
+                return
+            self.subscriptions[client].append(topic_filter)
+            for topic, payload in self.retained.items():
+                if topic_matches(topic_filter, topic):
+                    self._deliver(client, topic, payload)
+
+        if suback is not None and client in self.clients:
+            client._peer.send(suback)
+
+    def _round_trip(self) -> None:
+        if self.rtt_ms > 0:
+            harness.clock.advance_us(self.rtt_ms * 1000)
+
+    def send(self, topic, payload, retain: bool = False) -> None:
+        """
+            Publishes a message from outside the clock, e.g. a Home Assistant command.
+        """
+        topic = topic.encode() if isinstance(topic, str) else topic
+        payload = payload.encode() if isinstance(payload, str) else payload
+        self._route(topic, payload, retain)
+
+    def last_published(self, topic) -> bytes:
+        topic = topic.encode() if isinstance(topic, str) else topic
+        for _, t, payload, _ in reversed(self.published):
+            if t == topic:
+                return payload
+        return None
+
+    def _route(self, topic: bytes, payload: bytes, retain: bool) -> None:
+        if retain:
+            if len(payload) == 0:
+                self.retained.pop(topic, None)
+            else:
+                self.retained[topic] = payload
+
+        for client in list(self.clients):
+            if any(topic_matches(f, topic) for f in self.subscriptions[client]):
+                self._deliver(client, topic, payload)
+
+    def _deliver(self, client, topic: bytes, payload: bytes) -> None:
+        client._inbox.append((topic, payload))
+        try:
+            client._peer.send(b"\x30")
+        except OSError:
+            # The client has closed its end without a DISCONNECT, which a real broker finds out the same way, when a
+            # write to the dead connection fails. Drop it, rather than failing whoever published the message
+            self.disconnect(client)
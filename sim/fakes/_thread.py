@@ -0,0 +1,68 @@
+"""
+    Fake of MicroPython's _thread module. Threads are real CPython threads, but are counted so the
+    simulation can report them. On virtual time they run in lockstep with the main thread, see
+    sim/virtual_time.py, and a lock the second core waits for parks it until the main thread releases it.
+"""
+import _thread as _real
+
+from sim import harness
+
+started = []
+
+
+def start_new_thread(function, args, kwargs=None):
+    started.append(getattr(function, "__name__", repr(function)))
+    if harness.clock.virtual:
+        harness.clock.start_core(lambda: function(*args, **(kwargs or {})), ())
+        return None
+    return _real.start_new_thread(function, args, kwargs or {})
+
+
+class _VirtualLock:
+    """
+        A lock for threads in lockstep. Only one thread runs at a time, so there is nothing to protect the lock's own
+        state from: acquiring it when it is held parks the second core until the main thread releases it.
+    """
+    def __init__(self):
+        self._locked = False
+        self._waiter = None
+
+    def acquire(self, waitflag=1, timeout=-1):
+        while self._locked:
+            if not waitflag:
+                return False
+            self._waiter = harness.clock.blocked_core()
+            harness.clock.block()
+        self._locked = True
+        return True
+
+    def release(self):
+        if not self._locked:
+            raise RuntimeError("release unlocked lock")
+        self._locked = False
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            harness.clock.wake(waiter)
+
+    def locked(self):
+        return self._locked
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def allocate_lock():
+    if harness.clock.virtual:
+        return _VirtualLock()
+    return _real.allocate_lock()
+
+
+def get_ident():
+    return _real.get_ident()
+
+
+def stack_size(size=None):
+    return 0 if size is None else None
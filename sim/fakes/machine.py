@@ -0,0 +1,141 @@
+"""
+    Fake of the parts of MicroPython's machine module used by the clock. Outputs are recorded in
+    sim.harness.trace and timers run on sim.harness.clock.
+"""
+import time
+
+from sim import harness
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = 0 if value is None else value
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        v = 1 if v else 0
+        if v != self._value:
+            harness.trace.record(f"pin{self.id}", v)
+        self._value = v
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+
+class PWM:
+    def __init__(self, pin):
+        self.pin = pin
+        self._freq = 0
+        self._duty = 0
+        self.writes = 0
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self._duty
+        self.writes += 1
+        if d != self._duty:
+            harness.trace.record(f"pwm{self.pin.id}", d)
+        self._duty = d
+
+
+class ADC:
+    """
+        Reads the simulated ambient light. Set ADC.source to a function of virtual ms to vary it over time.
+    """
+    source = None
+    value = 1000
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.reads = 0
+
+    def read_u16(self):
+        self.reads += 1
+        if ADC.source is not None:
+            return ADC.source(harness.clock.now_ms())
+        return ADC.value
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, callback=None, hard=False):
+        self.callback = None
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback, hard=hard)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, hard=False):
+        harness.clock.remove_timer(self)
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+        self.due_us = harness.clock.now_us() + period * 1000
+        harness.clock.add_timer(self)
+
+    def deinit(self):
+        self.callback = None
+        harness.clock.remove_timer(self)
+
+    def fire(self):
+        callback = self.callback
+        if self.mode == Timer.PERIODIC:
+            self.due_us += self.period * 1000
+        else:
+            self.deinit()
+        if callback is not None:
+            callback(self)
+
+
+# The Pico's RTC starts at 2021-01-01 until it is set. Setting it restarts its seconds from that moment,
+# so the RTC keeps the unix time it was set to and the virtual time (us) it was set at
+_rtc_unix = 1609459200
+_rtc_set_us = 0
+
+
+class RTC:
+    def datetime(self, value=None):
+        global _rtc_unix, _rtc_set_us
+        if value is not None:
+            year, month, day, _, hour, minute, second, _ = value
+            _rtc_unix = _unix_time(year, month, day, hour, minute, second)
+            _rtc_set_us = harness.clock.now_us()
+            harness.trace.record("rtc", _rtc_unix)
+            return
+
+        tm = time.gmtime(_rtc_unix + (harness.clock.now_us() - _rtc_set_us) // 1000000)
+        return (tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0)
+
+
+def rtc_unix() -> float:
+    """
+        The time the RTC is showing, including how far it is into the current second. Not part of MicroPython.
+    """
+    return _rtc_unix + (harness.clock.now_us() - _rtc_set_us) / 1000000
+
+
+def _unix_time(year, month, day, hour, minute, second) -> int:
+    import calendar
+    return calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+
+
+def reset():
+    pass
+
+
+def freq(hz=None):
+    return 125000000
@@ -0,0 +1,7 @@
+"""
+    Fake of MicroPython's micropython module.
+"""
+
+
+def const(value):
+    return value
@@ -0,0 +1,49 @@
+"""
+    Fake of MicroPython's neopixel module. Pixels are stored in GRB order, like the real driver, and
+    every write is recorded in sim.harness.trace. Like the real driver, write() bit-bangs the whole
+    frame before returning, so it takes as long as the transfer on virtual time.
+"""
+from sim import harness
+
+# Time to send one bit to a WS2812
+_BIT_US = 1.25
+
+
+class NeoPixel:
+    ORDER = (1, 0, 2, 3)
+
+    # Across all instances, for reports
+    frames = 0
+    blocked_us = 0
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.buf = bytearray(n * bpp)
+        self.writes = 0
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, value):
+        offset = index * self.bpp
+        for i in range(self.bpp):
+            self.buf[offset + self.ORDER[i]] = value[i]
+
+    def __getitem__(self, index):
+        offset = index * self.bpp
+        return tuple(self.buf[offset + self.ORDER[i]] for i in range(self.bpp))
+
+    def fill(self, value):
+        for i in range(self.n):
+            self[i] = value
+
+    def write(self):
+        self.writes += 1
+        harness.trace.record(f"neopixel{self.pin.id}", bytes(self.buf))
+        transfer_us = int(len(self.buf) * 8 * _BIT_US)
+        NeoPixel.frames += 1
+        NeoPixel.blocked_us += transfer_us
+        if harness.clock.virtual:
+            harness.clock.advance_us(transfer_us)
@@ -0,0 +1,80 @@
+"""
+    Fake of MicroPython's network module. Set network.sim.available to False to simulate an outage, and
+    network.sim.connect_delay_ms for how long joining the access point takes.
+"""
+from sim import harness
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+
+class _SimState:
+    def __init__(self):
+        self.available = True
+        self.connect_delay_ms = 1500
+        self.connects = 0
+        self._active = False
+        self._connecting_since = None
+        self._connected = False
+
+    def set_available(self, available: bool) -> None:
+        self.available = available
+        if not available:
+            # The link drops, the driver reports it as down until told to connect again
+            self._connected = False
+            self._connecting_since = None
+
+
+sim = _SimState()
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return sim._active
+        sim._active = bool(is_active)
+        if not is_active:
+            sim._connected = False
+            sim._connecting_since = None
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        sim.connects += 1
+        sim._connected = False
+        sim._connecting_since = harness.clock.now_ms()
+
+    def disconnect(self):
+        sim._connected = False
+        sim._connecting_since = None
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def status(self, param=None):
+        if not sim._active:
+            return STAT_IDLE
+        if sim._connected:
+            return STAT_GOT_IP
+        if sim._connecting_since is None:
+            return STAT_IDLE
+        if sim.available and harness.clock.now_ms() - sim._connecting_since >= sim.connect_delay_ms:
+            sim._connected = True
+            return STAT_GOT_IP
+        return STAT_CONNECTING
+
+    def ifconfig(self, config=None):
+        return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def config(self, *args, **kwargs):
+        if args == ("mac",):
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        return None
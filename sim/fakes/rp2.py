@@ -0,0 +1,128 @@
+"""
+    Fake of the parts of MicroPython's rp2 module used to drive the dial ring from PIO and DMA.
+
+    PIO programs aren't run. A DMA transfer into a state machine's TX FIFO is taken to be WS2812 data:
+    the frame is recorded in sim.harness.trace under the state machine's pin (as neopixel.NeoPixel
+    would), and the transfer takes as long as the real one would, on virtual time. The DMA finishes
+    once the last bytes are in the TX FIFO, which then drains a byte at a time. Every transfer is
+    kept in `transfers` so its timing can be checked, and a frame started before the last one had
+    latched (the line low for WS2812_LATCH_US after it) is kept in `merged`, as the LEDs would lose it.
+"""
+from sim import harness
+
+# Time to send one bit to a WS2812
+WS2812_BIT_US = 1.25
+WS2812_BYTE_US = int(8 * WS2812_BIT_US)
+
+# How long the line has to be low after a frame for the LEDs to latch it
+WS2812_LATCH_US = 280
+
+# Entries in a TX FIFO (not joined), each holding one byte here, plus the one in the output shift register
+FIFO_DEPTH = 4
+
+_PIO_BASE = (0x50200000, 0x50300000)
+_TXF0 = 0x010
+
+# TX FIFO address -> StateMachine
+_fifos = {}
+
+# (start_us, end_us, bytes, waited_us) for every DMA transfer, waited_us is how long the CPU then
+# spent spinning on DMA.active() waiting for it
+transfers = []
+
+# (start_us, gap_us) for every transfer that started gap_us after the last one finished shifting out,
+# too soon for the LEDs to have latched it
+merged = []
+
+
+def asm_pio(**kw):
+    def decorator(f):
+        return f
+    return decorator
+
+
+class PIO:
+    OUT_LOW = 0
+    OUT_HIGH = 1
+    IN_LOW = 0
+    IN_HIGH = 1
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+
+
+class StateMachine:
+    def __init__(self, id, prog=None, freq=-1, **kw):
+        self.id = id
+        self.prog = prog
+        self.freq = freq
+        self.pin = kw.get("sideset_base")
+        self._active = False
+
+        # When the data the DMA last put in the FIFO will have been shifted out
+        self._shift_end_us = None
+        _fifos[_PIO_BASE[id // 4] + _TXF0 + 4 * (id % 4)] = self
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+
+    def tx_fifo(self):
+        if self._shift_end_us is None:
+            return 0
+        remaining = self._shift_end_us - WS2812_BYTE_US - harness.clock.now_us()
+        if remaining <= 0:
+            return 0
+
+        # The caller is normally spinning until the FIFO is empty, so let the next byte go out
+        entries = min(FIFO_DEPTH, -(-remaining // WS2812_BYTE_US))
+        if harness.clock.virtual:
+            harness.clock.advance_us(remaining - (entries - 1) * WS2812_BYTE_US)
+        return entries
+
+
+class DMA:
+    def __init__(self):
+        self._end_us = 0
+        self._transfer = None
+
+    def pack_ctrl(self, **kw):
+        return kw
+
+    def config(self, read=None, write=None, count=None, ctrl=None, trigger=False):
+        self._read = read
+        self._write = write
+        self._count = count
+        if trigger:
+            self._start()
+
+    def _start(self):
+        sm = _fifos.get(self._write)
+        if sm is None or not sm.active():
+            raise OSError("DMA target isn't an active state machine")
+
+        data = bytes(self._read[:self._count])
+        harness.trace.record(f"neopixel{sm.pin.id}", data)
+
+        start = harness.clock.now_us()
+        if sm._shift_end_us is not None and start - sm._shift_end_us < WS2812_LATCH_US:
+            merged.append((start, start - sm._shift_end_us))
+
+        sm._shift_end_us = start + len(data) * WS2812_BYTE_US
+        self._end_us = max(start, sm._shift_end_us - (FIFO_DEPTH + 1) * WS2812_BYTE_US)
+        self._transfer = [start, self._end_us, len(data), 0]
+        transfers.append(self._transfer)
+
+    def active(self):
+        remaining = self._end_us - harness.clock.now_us()
+        if remaining <= 0:
+            return False
+
+        # The caller is spinning until the transfer is done, so let the time pass
+        self._transfer[3] += remaining
+        if harness.clock.virtual:
+            harness.clock.advance_us(remaining)
+        return True
+
+    def close(self):
+        self._end_us = 0
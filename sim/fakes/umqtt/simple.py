@@ -0,0 +1,155 @@
+"""
+    Fake of micropython-lib's umqtt.simple, talking to the in-process broker in sim/broker.py.
+
+    Like the real client, `sock` wraps a real socket (one end of a socketpair held by the broker), so it
+    can be polled for readability. Each delivered message is signalled by one byte on the socket.
+    Packets written straight to `sock` (as umqtt.simple's own methods do) are parsed and passed to
+    the broker, currently only SUBSCRIBE is understood.
+"""
+from sim import broker as _broker
+
+
+class MQTTException(Exception):
+    pass
+
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0, ssl=False, ssl_params={}):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.ssl = ssl
+        self.sock = None
+        self.cb = None
+        self.pid = 0
+        self.lw_topic = None
+        self._inbox = []
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.lw_topic = topic
+
+    def connect(self, clean_session=True, timeout=None):
+        result = _broker.current().connect(self, clean_session)
+        self.sock = _ClientSocket(self, self.sock)
+        self.sock.settimeout(timeout)
+        return result
+
+    def disconnect(self):
+        _broker.current().disconnect(self)
+        self.sock.close()
+
+    def ping(self):
+        self._broker().ping(self)
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self._broker().publish(self, _bytes(topic), _bytes(msg), retain)
+
+    def subscribe(self, topic, qos=0):
+        assert self.cb is not None, "Subscribe callback is not set"
+        self._broker().subscribe(self, [_bytes(topic)])
+
+    def wait_msg(self):
+        try:
+            res = self.sock.recv(1)
+        except BlockingIOError:
+            res = None
+        finally:
+            if self.sock.fileno() >= 0:
+                self.sock.setblocking(True)
+
+        if res is None:
+            return None
+        if res == b"":
+            raise OSError(-1)
+
+        op = res[0]
+        if op == 0xD0:
+            # PINGRESP
+            return None
+        if op & 0xF0 != 0x30:
+            # Anything else (e.g. a SUBACK) is left for the caller to read
+            return op
+
+        topic, msg = self._inbox.pop(0)
+        self.cb(topic, msg)
+        return None
+
+    def _recv_len(self):
+        n = 0
+        sh = 0
+        while True:
+            b = self.sock.read(1)[0]
+            n |= (b & 0x7F) << sh
+            if not b & 0x80:
+                return n
+            sh += 7
+
+    def check_msg(self):
+        self.sock.setblocking(False)
+        return self.wait_msg()
+
+    def _broker(self):
+        if self.sock is None or self.sock.fileno() < 0:
+            raise OSError(-1)
+        return _broker.current()
+
+
+class _ClientSocket:
+    def __init__(self, client, sock):
+        self._client = client
+        self._sock = sock
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def setblocking(self, flag):
+        self._sock.setblocking(flag)
+
+    def settimeout(self, value):
+        self._sock.settimeout(value)
+
+    def recv(self, n):
+        return self._sock.recv(n)
+
+    def read(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self._sock.recv(n - len(data))
+            if chunk == b"":
+                break
+            data += chunk
+        return data
+
+    def write(self, data):
+        data = bytes(data)
+        if data[0] != 0x82:
+            raise NotImplementedError(f"Packet type {data[0]:#x}")
+
+        # Remaining length, then the packet id and (length, topic, QoS) for each topic filter
+        i = 1
+        while data[i] & 0x80:
+            i += 1
+        i += 1
+        pid = data[i:i + 2]
+        i += 2
+        topics = []
+        while i < len(data):
+            length = (data[i] << 8) | data[i + 1]
+            topics.append(data[i + 2:i + 2 + length])
+            i += 3 + length
+
+        self._client._broker().subscribe(self._client, topics, pid)
+        return len(data)
+
+    def close(self):
+        self._sock.close()
+
+
+def _bytes(value) -> bytes:
+    return value.encode() if isinstance(value, str) else bytes(value)
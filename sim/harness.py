@@ -0,0 +1,89 @@
+"""
+    Makes the firmware in src/ importable under CPython, by putting the fake hardware modules in
+    sim/fakes ahead of it on the path and adding the MicroPython extensions to the time module.
+
+    With virtual=True the ticks functions, time.sleep and the fake machine.Timer all run on virtual
+    time, see sim/virtual_time.py.
+"""
+import gc
+import importlib.util
+import os
+import sys
+import time
+import tracemalloc
+
+from sim.trace import OutputTrace
+from sim.virtual_time import VirtualClock
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(_ROOT, "src")
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes")
+
+# Shared with the fake modules
+clock = VirtualClock(virtual=False)
+trace = OutputTrace(clock)
+
+# The Pico W's MicroPython heap, for the fake gc.mem_free()
+PICO_HEAP_BYTES = 192 * 1024
+
+# The true unix time at virtual time 0, which the fake NTP server reports
+WALL_EPOCH = 1697932800  # 2023-10-22 00:00:00 UTC
+
+_installed = False
+_real_sleep = time.sleep
+
+
+def _load_fake(name: str, filename: str) -> None:
+    # Used for fakes of modules CPython has built in, which a sys.path entry can't shadow
+    spec = importlib.util.spec_from_file_location(name, os.path.join(FAKES_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    sys.modules[name] = module
+
+
+def install(virtual: bool = False) -> None:
+    global _installed
+    clock.virtual = virtual
+    if _installed:
+        return
+
+    for path in (SRC_DIR, FAKES_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_us = clock.ticks_us
+    time.ticks_add = clock.ticks_add
+    time.ticks_diff = clock.ticks_diff
+    time.sleep = clock.sleep
+    time.sleep_ms = lambda ms: clock.sleep(ms / 1000)
+    time.sleep_us = lambda us: clock.sleep(us / 1000000)
+
+    # MicroPython's heap stats. The host has no equivalent, so they come from tracemalloc when it is
+    # running (which counts the simulation's allocations too) and are 0 otherwise
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = lambda: max(0, PICO_HEAP_BYTES - _mem_alloc())
+
+    _load_fake("_thread", "_thread.py")
+    _installed = True
+
+
+def _mem_alloc() -> int:
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def wall_time() -> float:
+    return WALL_EPOCH + clock.now_us() / 1000000
+
+
+def real_sleep(seconds: float) -> None:
+    _real_sleep(seconds)
+
+
+def finish(failures: list, report=print) -> None:
+    """
+        Ends a bench: reports each budget it missed and exits with 1 if there were any, so a run can fail a build.
+    """
+    for failure in failures:
+        report(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,97 @@
+"""
+    A fake NTP server on localhost, answering with the simulation's wall clock.
+
+    Requests are answered on virtual time: the server is pumped by the event loop (see
+    VirtualClock.add_pump), and a reply reaches the client delay_ms after the request was sent, give
+    or take jitter_ms each way. Code that blocks on the socket, rather than waiting on the loop, must call
+    harness.clock.deliver() after sending.
+"""
+import random
+import socket
+import struct
+
+from sim import harness
+
+NTP_DELTA = 2208988800
+
+
+def _ntp_timestamp(unix: float) -> tuple:
+    seconds = int(unix) + NTP_DELTA
+    fraction = int((unix % 1) * (1 << 32))
+    return seconds, fraction
+
+
+class FakeNtpServer:
+    def __init__(self, offset: float = 0.0, delay_ms: float = 0.0, jitter_ms: float = 0.0, drift_ppm: float = 0.0,
+                 seed: int = 0) -> None:
+        # How far (seconds) the server's answers are from the true simulated time, to test bad servers
+        self.offset = offset
+
+        # Round trip to the server, and the most a packet can be held up by on top of that in each direction
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+
+        # How fast (parts per million) true time runs compared with the Pico's crystal, i.e. virtual time
+        self.drift_ppm = drift_ppm
+
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.setblocking(False)
+        self.address = self._sock.getsockname()
+
+        # (virtual us the reply arrives, reply, address) for replies on their way back
+        self._replies = []
+        harness.clock.add_pump(self.pump)
+
+    def time(self, us: int = None) -> float:
+        """
+            The true unix time at virtual time us (now by default), which the server answers with.
+        """
+        if us is None:
+            us = harness.clock.now_us()
+        return harness.WALL_EPOCH + us / 1000000 * (1 + self.drift_ppm / 1000000) + self.offset
+
+    def _one_way_us(self) -> int:
+        return int((self.delay_ms / 2 + self._rng.uniform(0, self.jitter_ms)) * 1000)
+
+    def pump(self):
+        import network
+        now = harness.clock.now_us()
+        while True:
+            try:
+                request, addr = self._sock.recvfrom(48)
+            except (BlockingIOError, OSError):
+                break
+
+            # Requests sent while the network is down go nowhere
+            if not network.sim.available or len(request) < 48:
+                continue
+
+            self.requests += 1
+            received = now + self._one_way_us()
+            seconds, fraction = _ntp_timestamp(self.time(received))
+            response = bytearray(48)
+            response[0] = 0x24  # LI 0, version 4, mode 4 (server)
+            response[1] = 1     # stratum
+            response[24:32] = request[40:48]  # originate = the client's transmit time
+            struct.pack_into("!II", response, 32, seconds, fraction)  # receive
+            struct.pack_into("!II", response, 40, seconds, fraction)  # transmit
+            self._replies.append((received + self._one_way_us(), response, addr))
+
+        due = None
+        for reply in list(self._replies):
+            if reply[0] <= now:
+                self._replies.remove(reply)
+                try:
+                    self._sock.sendto(reply[1], reply[2])
+                except OSError:
+                    pass
+            elif due is None or reply[0] < due:
+                due = reply[0]
+        return due
+
+    def close(self) -> None:
+        harness.clock.remove_pump(self.pump)
+        self._sock.close()
@@ -0,0 +1,64 @@
+"""
+    Scripted days in the life of the clock, for the simulation.
+"""
+import json
+import math
+
+from sim.simulation import Simulation
+
+import machine  # noqa: E402
+
+HOUR_MS = 3600 * 1000
+
+
+def daylight(ms: int) -> int:
+    """
+        Raw light sensor reading over a day: bright (low readings) around midday, dark at night.
+    """
+    hour = (ms / HOUR_MS) % 24
+    brightness = max(0.0, math.sin((hour - 6) / 12 * math.pi))
+    return int(2100 - 1200 * brightness)
+
+
+def boot(sim: Simulation, hours: float) -> None:
+    pass
+
+
+def day(sim: Simulation, hours: float) -> None:
+    """
+        Every hour Home Assistant chimes the clock, breathes the pendulum light for ten minutes, shows the time on
+        the dial for five minutes and runs a two minute timer.
+    """
+    machine.ADC.source = daylight
+
+    for hour in range(int(math.ceil(hours))):
+        base = hour * HOUR_MS
+        sim.at(base + 60_000, lambda s: s.command("chime", "ON"))
+        sim.at(base + 65_000, lambda s: s.command("pendulum_swing", "ON"))
+        sim.at(base + 125_000, lambda s: s.command("pendulum_swing", "OFF"))
+        sim.at(base + 120_000, lambda s: s.command("pendulum_light", json.dumps(
+            {"state": "ON", "effect": "breathe", "color": {"r": 255, "g": 120, "b": 40}})))
+        sim.at(base + 720_000, lambda s: s.command("pendulum_light", json.dumps({"state": "OFF"})))
+        sim.at(base + 900_000, lambda s: s.command("dial", json.dumps({"state": "ON", "effect": "CurrentTimePattern"})))
+        sim.at(base + 1_200_000, lambda s: s.command("dial", json.dumps({"state": "OFF"})))
+        sim.at(base + 1_500_000, lambda s: s.command("timer", "120"))
+        sim.at(base + 1_800_000, lambda s: s.command("dial", json.dumps({"state": "ON", "effect": "AlertPattern"})))
+        sim.at(base + 2_400_000, lambda s: s.command("dial", json.dumps(
+            {"state": "ON", "color": {"r": 0, "g": 80, "b": 200}})))
+        sim.at(base + 2_700_000, lambda s: s.command("dial", json.dumps({"state": "OFF"})))
+
+
+def outage(sim: Simulation, hours: float) -> None:
+    """
+        The day scenario, with a two minute Wi-Fi outage every hour.
+    """
+    day(sim, hours)
+    for hour in range(int(math.ceil(hours))):
+        sim.outage(hour * HOUR_MS + 1_000_000, 120_000)
+
+
+SCENARIOS = {
+    "boot": boot,
+    "day": day,
+    "outage": outage,
+}
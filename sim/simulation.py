@@ -0,0 +1,107 @@
+"""
+    Runs the whole clock firmware (ClockManager.main) against the fake hardware, network, MQTT broker
+    and NTP server, on virtual time.
+
+        sim = Simulation()
+        sim.at(60_000, lambda s: s.command("chime", "ON"))
+        sim.run(3_600_000)
+"""
+import asyncio
+import json
+
+from sim import harness
+
+harness.install(virtual=True)
+
+from sim import virtual_time  # noqa: E402
+from sim.broker import FakeBroker  # noqa: E402
+from sim.ntp_server import FakeNtpServer  # noqa: E402
+
+import network  # noqa: E402
+from ClockSettings import ClockSettings  # noqa: E402
+
+# The command topics Home Assistant publishes to
+COMMAND_TOPICS = {
+    "chime": "homeassistant/switch/cuckoo_clock_chime/set",
+    "pendulum_swing": "homeassistant/switch/cuckoo_clock_pendulum_swing/set",
+    "timer": "homeassistant/number/cuckoo_clock_timer/set",
+    "pendulum_light": "homeassistant/light/cuckoo_clock_pendulum_light/set",
+    "dial": "homeassistant/light/cuckoo_clock_dial/set",
+    "schedule": "cuckoo_clock/schedule/set",
+}
+
+
+class Simulation:
+    def __init__(self) -> None:
+        harness.install(virtual=True)
+        self.clock = harness.clock
+        self.trace = harness.trace
+        self.broker = FakeBroker().install()
+        self.ntp = FakeNtpServer()
+        self.network = network.sim
+
+        ClockSettings.wifi_name = "sim"
+        ClockSettings.wifi_psk = "sim"
+        ClockSettings.mqtt_address = "sim-broker"
+        ClockSettings.ntp_host, ClockSettings.ntp_port = self.ntp.address
+
+        # CPython's collector is slow and its pauses say nothing about the Pico's, so don't force collections.
+        # Collections are still counted from the heap, when tracemalloc is running
+        ClockSettings.metrics_gc_collect = False
+
+        from ClockManager import ClockManager
+        self.manager = ClockManager()
+
+        self.boot_ms = None
+        self._events = []
+
+    def now_ms(self) -> int:
+        return self.clock.now_ms()
+
+    def at(self, ms: int, action) -> None:
+        """
+            Runs action(simulation) at ms of virtual time.
+        """
+        self._events.append((ms, action))
+
+    def command(self, entity: str, payload: str) -> None:
+        self.broker.send(COMMAND_TOPICS[entity], payload)
+
+    def outage(self, start_ms: int, duration_ms: int) -> None:
+        self.at(start_ms, lambda s: s.network.set_available(False))
+        self.at(start_ms + duration_ms, lambda s: s.network.set_available(True))
+
+    @property
+    def booted(self) -> bool:
+        return self.manager.is_ready
+
+    async def _script(self) -> None:
+        for ms, action in sorted(self._events, key=lambda e: e[0]):
+            delay = ms - self.now_ms()
+            if delay > 0:
+                await asyncio.sleep(delay / 1000)
+            action(self)
+
+    async def _watch_boot(self) -> None:
+        while not self.booted:
+            await asyncio.sleep(0.01)
+        self.boot_ms = self.now_ms()
+
+    async def _main(self) -> None:
+        asyncio.get_event_loop().create_task(self._script())
+        asyncio.get_event_loop().create_task(self._watch_boot())
+        await self.manager.main()
+
+    def metrics(self) -> list:
+        """
+            Every metrics document the clock has published, oldest first.
+        """
+        # Imported here rather than at the top, so the firmware still imports it itself as it would on the Pico
+        import Discovery
+        return [json.loads(payload) for _, topic, payload, _ in self.broker.published if topic == Discovery.METRICS_TOPIC]
+
+    def run(self, duration_ms: int) -> None:
+        virtual_time.run(self.clock, self._main(), duration_ms)
+
+    def close(self) -> None:
+        self.ntp.close()
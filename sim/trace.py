@@ -0,0 +1,31 @@
+"""
+    Records what the fake hardware was told to do, so outputs can be compared between runs.
+"""
+import csv
+
+
+class OutputTrace:
+    def __init__(self, clock) -> None:
+        self._clock = clock
+        self.enabled = True
+        self.events = []
+
+    def record(self, device: str, value) -> None:
+        if self.enabled:
+            self.events.append((self._clock.now_ms(), device, value))
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for e in self.events if e[1].startswith(prefix))
+
+    def summary(self) -> dict:
+        devices = {}
+        for _, device, _ in self.events:
+            devices[device] = devices.get(device, 0) + 1
+        return devices
+
+    def write_csv(self, path: str) -> None:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ms", "device", "value"])
+            for ms, device, value in self.events:
+                writer.writerow([ms, device, value.hex() if isinstance(value, (bytes, bytearray)) else value])
@@ -0,0 +1,292 @@
+"""
+    Virtual time for the simulation. The clock only moves forward when the firmware would otherwise be idle
+    (an asyncio sleep, a time.sleep or a machine.Timer wait), so hours of clock time run in seconds.
+
+    A thread the firmware starts (i.e. code on the Pico's second core) runs in lockstep with the main thread: it
+    runs only while the main thread is waiting for virtual time to pass, and when it sleeps (or its fake hardware
+    keeps it busy) it waits for the main thread to move time on to when it wakes. So the two cores overlap in
+    virtual time as they would on the Pico, and a run is still repeatable.
+"""
+import asyncio
+import selectors
+import sys
+import threading
+import time
+import traceback
+
+_TICKS_PERIOD = 1 << 30
+
+# When a blocked core wakes if nothing wakes it
+_FOREVER_US = 1 << 62
+
+
+class _CoreStopped(BaseException):
+    pass
+
+
+class _Core:
+    """
+        A thread standing in for the Pico's second core, see the module docstring.
+    """
+    def __init__(self) -> None:
+        self.wake_us = 0
+        self.stopping = False
+        self.done = False
+
+        # Handed back and forth so only one of the two threads runs at a time. Plain locks rather than
+        # threading.Event, as the core is woken every few ms of virtual time
+        self._go = threading.Lock()
+        self._parked = threading.Lock()
+        self._go.acquire()
+        self._parked.acquire()
+
+    def resume(self) -> None:
+        # Main thread: let the core run until it next waits for time to pass (or ends)
+        self._go.release()
+        self._parked.acquire()
+
+    def wait(self) -> None:
+        # Core thread: wait to be resumed
+        self._go.acquire()
+        if self.stopping:
+            raise _CoreStopped()
+
+    def park(self, wake_us: int) -> None:
+        # Core thread: wait for the main thread to move time on to wake_us
+        self.wake_us = wake_us
+        self._parked.release()
+        self.wait()
+
+    def finish(self) -> None:
+        self.done = True
+        self._parked.release()
+
+
+class VirtualClock:
+    def __init__(self, virtual: bool = True) -> None:
+        self.virtual = virtual
+        self._us = 0
+        self._timers = []
+        self._pumps = []
+        self._cores = []
+        self._core_threads = {}
+
+        # If set, a cProfile.Profile that profiles the second core's thread
+        self.core_profile = None
+
+    def now_us(self) -> int:
+        if self.virtual:
+            return self._us
+        return int(time.monotonic() * 1000000)
+
+    def now_ms(self) -> int:
+        return self.now_us() // 1000
+
+    def add_timer(self, timer) -> None:
+        self._timers.append(timer)
+
+    def remove_timer(self, timer) -> None:
+        if timer in self._timers:
+            self._timers.remove(timer)
+
+    def add_pump(self, pump) -> None:
+        """
+            pump() is called whenever the loop checks for I/O, to move simulated traffic on (e.g. the fake NTP
+            server answering requests). It returns the virtual us at which it next has something to deliver, or None.
+        """
+        self._pumps.append(pump)
+
+    def remove_pump(self, pump) -> None:
+        if pump in self._pumps:
+            self._pumps.remove(pump)
+
+    def pump(self):
+        """
+            Runs the pumps, returning the earliest time (virtual us) any of them next needs to run, or None.
+        """
+        due = None
+        for pump in list(self._pumps):
+            next_us = pump()
+            if next_us is not None and (due is None or next_us < due):
+                due = next_us
+        return due
+
+    def deliver(self) -> None:
+        """
+            Runs the pumps until they have nothing left to deliver, moving virtual time on as needed. For code that
+            blocks on a socket, where the loop can't do it.
+        """
+        due = self.pump()
+        while due is not None:
+            self.advance_us(max(0, due - self._us))
+            due = self.pump()
+
+    def start_core(self, function, args) -> None:
+        """
+            Runs function(*args) on a thread in lockstep with this one, as the Pico's second core.
+        """
+        core = _Core()
+
+        def run():
+            self._core_threads[threading.get_ident()] = core
+            profile = self.core_profile
+            try:
+                core.wait()
+                if profile is not None:
+                    profile.enable()
+                function(*args)
+            except _CoreStopped:
+                pass
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                del self._core_threads[threading.get_ident()]
+                self._cores.remove(core)
+                core.finish()
+
+        self._cores.append(core)
+        threading.Thread(target=run, daemon=True).start()
+        core.resume()
+
+    def stop_cores(self) -> None:
+        """
+            Ends every thread started with start_core, as if the Pico had been switched off.
+        """
+        for core in list(self._cores):
+            core.stopping = True
+            core.resume()
+
+    def block(self) -> None:
+        """
+            Called on the second core: waits, without moving time on, until the main thread calls wake().
+        """
+        core = self._core_threads.get(threading.get_ident())
+        if core is None:
+            raise RuntimeError("only the second core can block, the main thread would wait forever")
+        core.park(_FOREVER_US)
+
+    def blocked_core(self):
+        """
+            The core that is calling, for wake(), or None on the main thread.
+        """
+        return self._core_threads.get(threading.get_ident())
+
+    def wake(self, core) -> None:
+        """
+            Lets a core that is blocked (or sleeping) run again as soon as the main thread next waits for time to pass.
+        """
+        if core.wake_us > self._us:
+            core.wake_us = self._us
+
+    def advance_us(self, delta: int) -> None:
+        """
+            Moves virtual time forward, firing any fake machine.Timers that fall due on the way and running any
+            second core that wakes up on the way. Called on the second core, waits for the main thread to do that.
+        """
+        core = self._core_threads.get(threading.get_ident())
+        if core is not None:
+            # Always let some time pass, so a core that keeps asking to sleep for 0 can't stop the clock
+            core.park(self._us + max(1, delta))
+            return
+
+        end = self._us + delta
+        while True:
+            timer = None
+            for t in self._timers:
+                if t.due_us <= end and (timer is None or t.due_us < timer.due_us):
+                    timer = t
+            woken = None
+            for c in self._cores:
+                if c.wake_us <= end and (woken is None or c.wake_us < woken.wake_us):
+                    woken = c
+            if timer is None and woken is None:
+                break
+
+            if woken is None or (timer is not None and timer.due_us <= woken.wake_us):
+                self._us = max(self._us, timer.due_us)
+                timer.fire()
+            else:
+                self._us = max(self._us, woken.wake_us)
+                woken.resume()
+        self._us = end
+
+    def sleep(self, seconds: float) -> None:
+        if self.virtual:
+            self.advance_us(int(seconds * 1000000))
+        else:
+            time.sleep(seconds)
+
+    # MicroPython's time.ticks_* functions
+    def ticks_ms(self) -> int:
+        return self.now_ms() & (_TICKS_PERIOD - 1)
+
+    def ticks_us(self) -> int:
+        return self.now_us() & (_TICKS_PERIOD - 1)
+
+    @staticmethod
+    def ticks_add(ticks: int, delta: int) -> int:
+        return (ticks + delta) & (_TICKS_PERIOD - 1)
+
+    @staticmethod
+    def ticks_diff(end: int, start: int) -> int:
+        diff = (end - start) & (_TICKS_PERIOD - 1)
+        return diff - _TICKS_PERIOD if diff >= _TICKS_PERIOD // 2 else diff
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+        Checks real file descriptors (the fake MQTT broker's sockets, the fake NTP server) without blocking, and if
+        nothing is ready advances virtual time by the timeout instead of waiting for it, stopping early if
+        a pump has traffic to deliver before then.
+    """
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        due = self._clock.pump()
+        ready = super().select(0)
+        if ready or timeout == 0:
+            return ready
+
+        if timeout is None and due is None:
+            # Nothing is scheduled, so only real I/O can wake the loop
+            return super().select(0.01)
+
+        # Don't go past the point a pump has something to deliver, it is delivered the next time round
+        advance = None if timeout is None else max(1, int(timeout * 1000000 + 0.999))
+        if due is not None:
+            until_due = max(1, due - self._clock.now_us())
+            advance = until_due if advance is None else min(advance, until_due)
+        self._clock.advance_us(advance)
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__(_VirtualSelector(clock))
+        self._clock = clock
+
+    def time(self) -> float:
+        return self._clock.now_us() / 1000000
+
+
+def run(clock: VirtualClock, main, duration_ms: int):
+    """
+        Runs the coroutine main for duration_ms of (virtual) time, returning the loop's task for it.
+    """
+    loop = VirtualTimeLoop(clock) if clock.virtual else asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        task = loop.create_task(main)
+        loop.run_until_complete(asyncio.sleep(duration_ms / 1000))
+        return task
+    finally:
+        for pending in asyncio.all_tasks(loop):
+            pending.cancel()
+        loop.run_until_complete(asyncio.sleep(0))
+        asyncio.set_event_loop(None)
+        loop.close()
+        clock.stop_cores()
@@ -0,0 +1,144 @@
+import time
+
+# Marks a frame with no dot
+_NO_DOT = 255
+
+class Animation:
+    """
+        Describes a dial ring animation as data: the colour of the whole ring over time, as keyframes that are faded between,
+        and optionally a dot of another colour that steps round the ring.
+        It is compiled, the first time it is played, into one small record per frame (ring colour and dot position), so
+        rendering a frame is a lookup and a fill however the animation was described.
+    """
+    def __init__(self, name: str, keyframes: tuple, dot: tuple = None, step_ms: int = 0, direction: int = 1, start: int = 0,
+                 loops: int = 0, frame_ms: int = 33, leds: int = 20) -> None:
+        """
+            keyframes: ((ms, (r, g, b)), ...) in time order, starting at 0. The ring fades linearly from each to the next,
+                and the last one's time is the length of a cycle (a single keyframe is a constant colour).
+            dot: (r, g, b) of a dot that moves one LED every step_ms, from LED start, in direction (1 or -1).
+            loops: how many cycles to play before finishing, 0 plays forever. A cycle is the longer of the fade and one
+                revolution of the dot.
+            frame_ms: how often the ring changes while fading. Without a fade the ring only changes when the dot moves.
+        """
+        self.name = name
+        self.keyframes = keyframes
+        self.dot = dot
+        self.step_ms = step_ms
+        self.direction = direction
+        self.start = start
+        self.loops = loops
+        self.leds = leds
+
+        self._fade_ms = keyframes[-1][0]
+        self._spin_ms = leds * step_ms if dot != None else 0
+        self.cycle_ms = max(self._fade_ms, self._spin_ms)
+        self.frame_ms = frame_ms if self._fade_ms > 0 or dot == None else step_ms
+
+        # Frames are counted in whole frame_ms, so a dot that never moves, or frames that take no time, can't be played
+        if dot != None and step_ms <= 0:
+            raise ValueError("A dot needs a step_ms above 0")
+        if self.frame_ms <= 0:
+            raise ValueError("frame_ms must be above 0")
+
+        self.frames = None
+        self.frame_count = 0
+
+    def _colour_at(self, ms: int) -> tuple:
+        keyframes = self.keyframes
+        if self._fade_ms == 0:
+            return keyframes[0][1]
+
+        ms %= self._fade_ms
+        for i in range(1, len(keyframes)):
+            end_ms, end = keyframes[i]
+            if ms < end_ms:
+                start_ms, start = keyframes[i - 1]
+                span = end_ms - start_ms
+                t = ms - start_ms
+                return tuple((start[c] * (span - t) + end[c] * t) // span for c in range(3))
+        return keyframes[-1][1]
+
+    def compile(self) -> None:
+        if self.frames != None:
+            return
+
+        count = max(1, self.cycle_ms // self.frame_ms)
+        frames = bytearray(count * 4)
+        for n in range(count):
+            ms = n * self.frame_ms
+            r, g, b = self._colour_at(ms)
+            dot = _NO_DOT
+            if self.dot != None:
+                dot = (self.start + self.direction * ((ms % self._spin_ms) // self.step_ms)) % self.leds
+
+            i = n * 4
+            frames[i] = g
+            frames[i + 1] = r
+            frames[i + 2] = b
+            frames[i + 3] = dot
+
+        self.frame_count = count
+        self.frames = frames
+
+class Player:
+    """
+        Plays a compiled Animation against the clock, so it needs no timer of its own.
+    """
+    def __init__(self, animation: Animation) -> None:
+        animation.compile()
+        self._animation = animation
+        self._frames = animation.frames
+        self._count = animation.frame_count
+        self._frame_ms = animation.frame_ms
+        self._end = animation.loops * animation.frame_count
+        self._started = None
+
+        # Whole cycles played before _started, which is moved on past each one
+        self._cycles = 0
+
+        dot = animation.dot if animation.dot != None else (0, 0, 0)
+        self._dot_r, self._dot_g, self._dot_b = dot
+
+    def start(self) -> None:
+        self._started = time.ticks_ms()
+        self._cycles = 0
+
+    def frame(self) -> int:
+        """
+            The frame within the current cycle of the animation, or -1 once it has finished.
+        """
+        if self._started is None:
+            return 0
+
+        n = time.ticks_diff(time.ticks_ms(), self._started) // self._frame_ms
+        if n >= self._count:
+            # Count from the start of this cycle, so the time since _started never gets near where ticks_diff wraps
+            cycles = n // self._count
+            self._started = time.ticks_add(self._started, cycles * self._count * self._frame_ms)
+            self._cycles += cycles
+            n -= cycles * self._count
+
+        if self._end > 0 and self._cycles * self._count + n >= self._end:
+            return -1
+        return n
+
+    def render(self, buf: bytearray, n: int) -> None:
+        """
+            Draws frame n into buf (GRB, 3 bytes per LED).
+        """
+        frames = self._frames
+        i = (n % self._count) * 4
+        g = frames[i]
+        r = frames[i + 1]
+        b = frames[i + 2]
+        for j in range(0, len(buf), 3):
+            buf[j] = g
+            buf[j + 1] = r
+            buf[j + 2] = b
+
+        dot = frames[i + 3]
+        if dot != _NO_DOT:
+            j = dot * 3
+            buf[j] = self._dot_g
+            buf[j + 1] = self._dot_r
+            buf[j + 2] = self._dot_b
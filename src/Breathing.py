@@ -0,0 +1,37 @@
+from array import array
+import math
+
+# Easing curves for a breathe cycle, each maps the position in the cycle (0 to 1) to a brightness (0 to 1)
+def _sine(phase: float) -> float:
+    return (1 - math.cos(2 * math.pi * phase)) / 2
+
+def _linear(phase: float) -> float:
+    return 1 - abs(1 - 2 * phase)
+
+def _quadratic(phase: float) -> float:
+    x = _linear(phase)
+    return 2 * x * x if x < 0.5 else 1 - 2 * (1 - x) * (1 - x)
+
+EASINGS = {
+    "sine": _sine,
+    "linear": _linear,
+    "quadratic": _quadratic,
+}
+
+# Brightness is perceived roughly as duty ** (1 / 2.2), so fade through duty ** 2.2 to look even
+_GAMMA = 2.2
+
+def build_breathe_table(red: int, green: int, blue: int, period_ms: int, tick_ms: int, easing: str = "sine") -> array:
+    """
+        Returns one whole breathe cycle, from off up to the given PWM duties and back again, as (red, green, blue)
+        duties for each tick.
+    """
+    ease = EASINGS[easing]
+    steps = max(2, period_ms // tick_ms)
+    table = array('H', bytes(steps * 6))
+    for step in range(steps):
+        level = ease(step / steps) ** _GAMMA
+        table[step * 3] = int(red * level + 0.5)
+        table[step * 3 + 1] = int(green * level + 0.5)
+        table[step * 3 + 2] = int(blue * level + 0.5)
+    return table
@@ -1,38 +1,112 @@
 from machine import Pin
 import time
-import _thread
+from Scheduler import Scheduler, Task, PRIORITY_HIGH
+import Log
+
+# Most requests that can be waiting while the chime is going, and the most cuckoos one request can ask for
+_MAX_QUEUED = 8
+_MAX_COUNT = 12
+
+# Steps of a cuckoo: coming out (chime solenoid on), going back (chime off, reset on), back (reset off)
+_OUT = 0
+_BACK = 1
+_DONE = 2
 
 class Chime:
     """
     Represents the chime function of the clock, where the Cuckoo exits sings and returns to its base.
+    Each cuckoo is a sequence of timed steps run by the scheduler. Each step is timed from when the one before it
+    was due, rather than when it ran, so a late step doesn't make the rest of the sequence late.
     """
 
-    def __init__(self, chime_pin: int, reset_pin: int) -> None:
+    def __init__(self, chime_pin: int, reset_pin: int, scheduler: Scheduler, pulse_ms: int = 1700, reset_ms: int = 500,
+                 gap_ms: int = 0, pause_ms: int = 1000) -> None:
         self._chime = Pin(chime_pin, Pin.OUT)
         self._reset = Pin(reset_pin, Pin.OUT)
-        self._chime_lock = _thread.allocate_lock()
+        self._scheduler = scheduler
+
+        # How long the cuckoo is out for, how long the reset solenoid takes to bring it back, the wait between the
+        # cuckoos of one request and the wait before starting the next request
+        self.pulse_ms = pulse_ms
+        self.reset_ms = reset_ms
+        self.gap_ms = gap_ms
+        self.pause_ms = pause_ms
+
+        # Cuckoos left in the current request, the counts of the requests waiting after it, and the next step
+        self._remaining = 0
+        self._queue = []
+        self._step = _OUT
+        self._due = 0
+        self._task = None
+
+        # Requests turned away because the queue was full, and the latest (ms) any step has run
+        self.dropped = 0
+        self.late_max = 0
+
+        # Called with "chime" whenever the chime turns on or off
+        self.on_change = None
 
         self._chime.off()
         self._reset.off()
-    
-    def chime(self) -> None:
 
-        # The chime requires some sleep for timing, so run that on a separate thread, but only if we're not already chiming
-        if self._chime_lock.acquire(False):
-            _thread.start_new_thread(self._chime_internal, ())
+    @property
+    def is_chiming(self) -> bool:
+        return self._remaining > 0
 
-    def _chime_internal(self) -> None:
-        try:
+    def chime(self, count: int = 1) -> None:
+        """
+            Chimes count times. If the chime is already going, the request waits its turn rather than being dropped.
+        """
+        count = min(_MAX_COUNT, count)
+        if count <= 0:
+            return
+
+        if self.is_chiming:
+            if len(self._queue) >= _MAX_QUEUED:
+                self.dropped += 1
+                Log.warning("Chime queue full, dropped a chime of %s", count)
+                return
+            self._queue.append(count)
+            return
+
+        self._remaining = count
+        self._step = _OUT
+        self._due = time.ticks_ms()
+        self._run_step(None)
+
+    def _next(self, delay: int, step: int) -> None:
+        self._step = step
+        self._due = time.ticks_add(self._due, delay)
+        wait = max(0, time.ticks_diff(self._due, time.ticks_ms()))
+        self._task = self._scheduler.once(wait, self._run_step, "Chime", PRIORITY_HIGH, 50)
+
+    def _run_step(self, t: Task) -> None:
+        self._task = None
+        late = time.ticks_diff(time.ticks_ms(), self._due)
+        if late > self.late_max:
+            self.late_max = late
+
+        if self._step == _OUT:
             self._chime.on()
-            
-            time.sleep(1.7)
+            self._changed()
+            self._next(self.pulse_ms, _BACK)
+        elif self._step == _BACK:
             self._reset.on()
             self._chime.off()
-            
-            time.sleep(0.5)
+            self._changed()
+            self._next(self.reset_ms, _DONE)
+        else:
             self._reset.off()
-        finally:
-            self._chime_lock.release()
+            self._remaining -= 1
+            if self._remaining > 0:
+                self._next(self.gap_ms, _OUT)
+            elif len(self._queue) > 0:
+                self._remaining = self._queue.pop(0)
+                self._next(self.pause_ms, _OUT)
+
+    def _changed(self) -> None:
+        if self.on_change != None:
+            self.on_change("chime")
 
     def get_state(self):
-        return "ON" if self._chime.value() == 1 else "OFF"
\ No newline at end of file
+        return "ON" if self._chime.value() == 1 else "OFF"
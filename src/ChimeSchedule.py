@@ -0,0 +1,221 @@
+import heapq
+from machine import RTC
+from Scheduler import Scheduler, Task, PRIORITY_NORMAL
+import Log
+
+# Longest the schedule sleeps for before checking the RTC again, so it can't sleep past a time change it wasn't told about
+_MAX_SLEEP_S = 3600
+
+# Wake a little after an event is due rather than right on it, so the time read on waking is never just short of it
+_MARGIN_MS = 20
+
+# 2000-01-01 as unix seconds
+_EPOCH_2000 = 946684800
+
+# An event that was due longer ago than this (e.g. the time jumped forward past it) is skipped rather than fired late.
+# A rebuild keeps events due this recently that haven't been fired yet, so setting the time just after one doesn't lose it
+_LATE_S = 60
+
+# RTC years before this mean the time hasn't been set yet
+_MIN_YEAR = 2023
+
+# Days from 2000-01-01 to the 1st of each month in a non-leap year
+_MONTH_DAYS = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
+_ACTIONS = ("chime", "swing", "dial")
+
+def _rtc_seconds(dt: tuple) -> int:
+    # Seconds since 2000-01-01 00:00 for an RTC datetime tuple (year, month, day, weekday, hour, minute, second, subseconds)
+    year = dt[0] - 2000
+    days = year * 365 + (year + 3) // 4 + _MONTH_DAYS[dt[1] - 1] + dt[2] - 1
+    if dt[1] > 2 and year % 4 == 0:
+        days += 1
+    return ((days * 24 + dt[4]) * 60 + dt[5]) * 60 + dt[6]
+
+def _parse_rule(rule: dict) -> tuple:
+    # (hours, minute, weekdays, action, rule) with hours and weekdays as tuples, or raises ValueError
+    hour, minute = rule["at"].split(":")
+    hours = tuple(range(24)) if hour == "*" else (int(hour),)
+    minute = int(minute)
+    days = tuple(rule.get("days", range(7)))
+    action = rule.get("do", "chime")
+    if action not in _ACTIONS:
+        raise ValueError(action)
+    count = rule.get("count", 1)
+    if count != "hour" and not isinstance(count, int):
+        raise ValueError(count)
+    for h in hours:
+        if h < 0 or h > 23:
+            raise ValueError(rule["at"])
+    if minute < 0 or minute > 59:
+        raise ValueError(rule["at"])
+    for d in days:
+        if d < 0 or d > 6:
+            raise ValueError(days)
+    return hours, minute, days, action, rule
+
+class ChimeSchedule:
+    """
+        Chimes, swings the pendulum and plays dial effects at set times of day, on the clock itself.
+        The time each rule next fires goes in a heap, and the schedule sleeps until the earliest of them.
+
+        The schedule is a dict, e.g.
+            {"utc_offset": 60, "quiet": [22, 7], "rules": [{"at": "*:00", "do": "chime", "count": "hour"}]}
+        utc_offset is minutes ahead of UTC, quiet the local hours from and to which the chime is silent, and
+        each rule's "at" is the local "hour:minute" it fires at, with "*" for every hour. Rules may also have
+        "days" (weekdays it fires on, Monday is 0), and, by what they "do":
+            chime  "count" times, or "hour" for as many times as the hour on a 12 hour clock
+            swing  the pendulum for "seconds"
+            dial   plays "effect" on the dial ring, if the dial isn't already showing something
+    """
+    def __init__(self, clock, scheduler: Scheduler) -> None:
+        self._clock = clock
+        self._scheduler = scheduler
+        self._config = {"rules": []}
+        self._rules = ()
+        self._offset = 0
+        self._quiet = None
+
+        # (local seconds since 2000 the rule is next due, index into _rules)
+        self._queue = []
+        self._task = None
+        self._timeValid = False
+        self._timeMs = None
+
+        # The latest due time (local seconds) that has been fired or skipped. Nothing at or before it is fired again,
+        # whatever the time or schedule is changed to
+        self._doneUpTo = None
+
+        # Times the schedule woke up, and rules it fired
+        self.wakes = 0
+        self.fired = 0
+
+    @property
+    def config(self) -> dict:
+        return self._config
+
+    def set_config(self, config: dict) -> None:
+        """
+            Replaces the schedule. Raises ValueError (or KeyError / TypeError) without changing anything if it isn't valid.
+        """
+        rules = tuple(_parse_rule(rule) for rule in config.get("rules", ()))
+        offset = int(config.get("utc_offset", 0))
+        quiet = config.get("quiet")
+        if quiet != None:
+            quiet = (int(quiet[0]), int(quiet[1]))
+
+        self._config = config
+        self._rules = rules
+        self._offset = offset * 60
+        self._quiet = quiet
+        self._rebuild()
+
+    def time_changed(self, now_ms=None) -> None:
+        """
+            Call when the RTC has been set, everything is rescheduled from the new time. now_ms, if given, is a
+            function returning the unix time in ms, which is used rather than the RTC's whole seconds.
+        """
+        self._timeValid = True
+        if now_ms != None:
+            self._timeMs = now_ms
+        self._rebuild()
+
+    def next_due(self) -> int:
+        """
+            Seconds until the next rule fires, or -1 if none will.
+        """
+        if len(self._queue) == 0:
+            return -1
+        return max(0, self._queue[0][0] - self._now())
+
+    def _now(self) -> int:
+        # Local time, in seconds since 2000-01-01
+        return self._now_ms() // 1000
+
+    def _now_ms(self) -> int:
+        if self._timeMs != None:
+            return self._timeMs() - (_EPOCH_2000 - self._offset) * 1000
+        return (_rtc_seconds(RTC().datetime()) + self._offset) * 1000
+
+    def _next(self, index: int, after: int) -> int:
+        # The first time after "after" (local seconds) that rule index is due
+        hours, minute, days, _, _ = self._rules[index]
+        day = after // 86400
+        for d in range(day, day + 8):
+            # 2000-01-01 was a Saturday
+            if (d + 5) % 7 not in days:
+                continue
+            for hour in hours:
+                due = d * 86400 + hour * 3600 + minute * 60
+                if due > after:
+                    return due
+        return -1
+
+    def _rebuild(self) -> None:
+        self._queue = []
+        if self._timeValid and RTC().datetime()[0] >= _MIN_YEAR:
+            now = self._now()
+            if self._doneUpTo == None:
+                # Nothing from before the time was first known
+                self._doneUpTo = now
+
+            # Rules due in the last _LATE_S that haven't been fired yet are put back, and fired as soon as it wakes
+            after = max(now - _LATE_S, self._doneUpTo)
+            for i in range(len(self._rules)):
+                due = self._next(i, after)
+                if due >= 0:
+                    heapq.heappush(self._queue, (due, i))
+        self._sleep()
+
+    def _sleep(self) -> None:
+        if self._task != None:
+            self._task.cancel()
+            self._task = None
+
+        if len(self._queue) > 0:
+            delay = min(_MAX_SLEEP_S * 1000, max(0, self._queue[0][0] * 1000 - self._now_ms()))
+            self._task = self._scheduler.once(delay + _MARGIN_MS, self._wake, "Chime schedule", PRIORITY_NORMAL)
+
+    def _wake(self, t: Task) -> None:
+        self._task = None
+        self.wakes += 1
+        now = self._now()
+        queue = self._queue
+        while len(queue) > 0 and queue[0][0] <= now:
+            due, i = heapq.heappop(queue)
+            if due > self._doneUpTo:
+                self._doneUpTo = due
+            if now - due <= _LATE_S:
+                self._fire(i, due)
+            else:
+                Log.warning("Skipped schedule rule %s, it was due %s s ago", i, now - due)
+            due = self._next(i, now)
+            if due >= 0:
+                heapq.heappush(queue, (due, i))
+        self._sleep()
+
+    def _is_quiet(self, hour: int) -> bool:
+        if self._quiet == None:
+            return False
+        start, end = self._quiet
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def _fire(self, index: int, due: int) -> None:
+        _, _, _, action, rule = self._rules[index]
+        hour = due // 3600 % 24
+        self.fired += 1
+        Log.info("Schedule: %s at %s:%s", action, hour, due // 60 % 60)
+
+        if action == "chime":
+            if self._is_quiet(hour):
+                return
+            count = rule.get("count", 1)
+            if count == "hour":
+                count = hour % 12 or 12
+            self._clock.chime(count)
+        elif action == "swing":
+            self._clock.swing_pendulum(True, int(rule.get("seconds", 30)))
+        elif action == "dial":
+            self._clock.show_dial_effect(rule.get("effect", "AlertPattern"))
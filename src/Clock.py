@@ -0,0 +1,141 @@
+
+import RingPatterns
+from Pendulum import Pendulum
+from DialRing import DialRing, Colour
+from LightMeter import LightMeter
+from Chime import Chime
+from Scheduler import Scheduler
+from ClockSettings import ClockSettings
+import json
+
+# The entities whose state is published, each is a name get_entity_state() takes
+ENTITIES = ("pendulum_light", "pendulum_swing", "chime", "dial", "timer", "schedule", "light_level")
+
+class Clock:
+    """
+    Represents the whole smart clock and all its I/O
+    """
+        
+    def __init__(self, scheduler: Scheduler) -> None:
+        self._pendulum = Pendulum(6, 9, 10, 17, scheduler)
+        self._lightMeter = LightMeter(28, scheduler, ClockSettings.light_report_threshold)
+        self._dialRing = DialRing(27, self._lightMeter, scheduler, ClockSettings.dial_ring_pio)
+        self._chime = Chime(14, 15, scheduler, ClockSettings.chime_pulse_ms, ClockSettings.chime_reset_ms,
+                            ClockSettings.chime_gap_ms, ClockSettings.chime_pause_ms)
+        self._timerSeconds = 0
+
+        # Runs the chime, pendulum and dial at set times. It isn't needed until the time has been set, so it is
+        # created then, or when a schedule is published, to keep it out of the boot
+        self._scheduler = scheduler
+        self._schedule = None
+
+        # Called with the name of an entity whenever its state changes
+        self._on_change = None
+        
+        # Reset the dial ring, because its state can persist across short power cycles
+        self._dialRing.clear()
+
+    def reset(self) -> None:
+        self._pendulum.set_light_off()
+        self._pendulum.stop_swing()
+        self._dialRing.clear()
+
+    def clear_ring_pattern(self) -> None:
+        self._dialRing.clear()
+        
+    def show_waiting(self) -> None:
+        self._dialRing.showPattern(RingPatterns.AnimationPattern(RingPatterns.BOOTING))
+
+    def show_boot_error(self) -> None:
+        self._dialRing.showPattern(RingPatterns.AnimationPattern(RingPatterns.ERROR))
+
+    def set_pendulum_light(self, red, green, blue, breathe, duration_secs) -> None:
+        self._pendulum.set_light(red, green, blue, breathe, duration_secs)
+    
+    def set_dial_light(self, red, green, blue, pattern) -> None:
+        self._dialRing.set_dial_ring(Colour.of(red, green, blue), pattern)
+
+    def swing_pendulum(self, swing, time) -> None:
+        if swing:
+            self._pendulum.start_swing(time)
+        else:
+            self._pendulum.stop_swing()
+
+    def set_timer(self, seconds) -> None:
+        if (seconds == 0):
+            self._dialRing.clear()
+        else:    
+            self._dialRing.showPattern(RingPatterns.CountdownPattern(seconds, self._timer_finished, self._timer_stopped))
+
+        self._timerSeconds = seconds
+        self._changed("timer")
+
+    def _timer_finished(self) -> None:
+        self._timerSeconds = 0
+        self._changed("timer")
+        if ClockSettings.timer_chime:
+            self._chime.chime()
+
+    def _timer_stopped(self) -> None:
+        # Something else took over the dial (a reconnect's waiting pattern, a new colour), so the timer is off
+        self._timerSeconds = 0
+        self._changed("timer")
+
+    def chime(self, count: int = 1) -> None:
+        self._chime.chime(count)
+
+    def show_dial_effect(self, effect: str) -> None:
+        # Only if the dial is off, so this doesn't take over from a timer or a light someone has put on
+        factory = RingPatterns.EFFECTS.get(effect)
+        if factory != None and self._dialRing.is_off:
+            self._dialRing.showPattern(factory())
+
+    def set_schedule(self, config: dict) -> None:
+        """
+            Replaces the chime schedule, see ChimeSchedule. Raises ValueError if it isn't valid.
+        """
+        self._get_schedule().set_config(config)
+        self._changed("schedule")
+
+    def time_changed(self, now_ms=None) -> None:
+        # The RTC has been set, so the schedule can work out when things are due
+        self._get_schedule().time_changed(now_ms)
+
+    def _get_schedule(self):
+        if self._schedule == None:
+            from ChimeSchedule import ChimeSchedule
+            self._schedule = ChimeSchedule(self, self._scheduler)
+            self._schedule.set_config(ClockSettings.schedule)
+        return self._schedule
+
+    def set_state_listener(self, listener) -> None:
+        """
+            listener is called with the name of an entity (e.g. "dial") whenever its state changes.
+        """
+        self._pendulum.on_change = listener
+        self._dialRing.on_change = listener
+        self._chime.on_change = listener
+        self._lightMeter.on_change = listener
+        self._on_change = listener
+
+    def _changed(self, entity: str) -> None:
+        if self._on_change != None:
+            self._on_change(entity)
+
+    def get_entity_state(self, entity: str) -> str:
+        if entity == "pendulum_light":
+            return json.dumps(self._pendulum.get_light_state())
+        if entity == "pendulum_swing":
+            return self._pendulum.get_swing_state()
+        if entity == "chime":
+            return self._chime.get_state()
+        if entity == "dial":
+            return json.dumps(self._dialRing.get_light_state())
+        if entity == "timer":
+            return str(self._timerSeconds)
+        if entity == "schedule":
+            config = ClockSettings.schedule if self._schedule == None else self._schedule.config
+            return json.dumps(config)
+        if entity == "light_level":
+            return str(self._lightMeter.get_reported())
+        raise ValueError(entity)
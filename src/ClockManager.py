@@ -1,12 +1,32 @@
 from ClockSettings import ClockSettings
 from Clock import Clock
-from MqttManager import MqttManager
+from Scheduler import Scheduler, Task, PRIORITY_LOW, asyncio
 
 import network
+import random
 import time
-from machine import RTC, Timer
-import socket
-import struct
+import Log
+import Metrics
+
+# Connectivity states
+IDLE = 0
+CONNECTING = 1
+CONNECTED = 2
+BACKOFF = 3
+
+# How often the connection is checked while connecting (or waiting to), and once connected
+_CONNECTING_TICK_MS = 250
+_CONNECTED_TICK_MS = 1000
+
+# How long joining the access point may take before it counts as a failure
+_WIFI_TIMEOUT_MS = 10000
+
+# Delay before the first retry, doubling after each failure up to the max
+_BACKOFF_BASE_MS = 1000
+_BACKOFF_MAX_MS = 15000
+
+# The clock is only told the time has changed when it has moved this far (ms) from the time it was last given
+_TIME_CHANGED_MS = 10
 
 class ClockManager:
     """
@@ -15,132 +35,215 @@ class ClockManager:
 
     def __init__(self) -> None:
         self._wlan = network.WLAN(network.STA_IF)
-        self._heath_check_busy = False
-        self._trying_reconnection = False
+        self._scheduler = Scheduler()
 
-    def boot(self) -> None:
-        self._clock = Clock()
-        self._clock.reset()
-
-        self._mqtt_manager = MqttManager(ClockSettings.mqtt_address, ClockSettings.mqtt_username, ClockSettings.mqtt_password, self._clock)
-
-        while True:
-            try:
-                print("Attempting connect to wifi")
-                self._clock.show_waiting()
-                self._connect_wifi(ClockSettings.wifi_name, ClockSettings.wifi_psk)
+        self.state = IDLE
+        self._connectivityTask = None
+        self._connectDeadline = 0
+        self._retryAt = 0
+        self._attempts = 0
+        self._everConnected = False
+        self._mqtt_manager = None
+        self._timeSync = None
 
-                print("Setting RTC")
-                self._set_time()
+        # Whether the time sync has been started since the Wi-Fi came up, the MQTT connect follows on a later tick
+        self._syncStarted = False
 
-                print("Connecting MQTT")
-                self._mqtt_manager.connect()
-                self._mqtt_manager.publish_autoconf()
+        # The unix ms and ticks_ms the clock was last told the time at
+        self._timeBase = None
 
-                self._clock.clear_ring_pattern()
-                break
-            except:
-                print("Failed")
-                self._clock.show_boot_error()
+        # (phase, ticks_ms) as the clock boots. ticks_ms counts from power on, so these are times since boot
+        self.boot_phases = []
 
-                # Wait 10 seconds and try boot up again
-                time.sleep(10)
+    def run(self) -> None:
+        """
+            Boots the clock and runs it forever.
+        """
+        asyncio.run(self.main())
 
-        # Continually check the clock's connection state, and reset if it disconnects
-        self._health_check_timer = Timer(mode=Timer.PERIODIC, period=1000, callback=self._health_check)
-
-    def _health_check(self, t: Timer) -> None:
-        if self._heath_check_busy:
-            print("Heath check is busy, Skipping.")
-            return
-        
-        try:
-            #now = RTC().datetime()
-            #print(f'[{now[4]}:{now[5]}:{now[6]}] Starting health check')
-
-            # Check if we're still connected to the WiFi
-            if self._wlan.status() != 3:
-                print ("Wifi connection lost. Attempting reconnect...")
-                try:
-                    if not self._trying_reconnection:
-                        self._clock.show_waiting()
-                        self._trying_reconnection = True
-
-                    try:
-                        self._mqtt_manager.stop()
-                    except Exception as e:
-                        # Non-fatal, it will get garbage collected eventually anyway
-                        print(f"Filed to stop MQTT client {e}")
-
-                    self._wlan = network.WLAN(network.STA_IF)
-                    self._connect_wifi(ClockSettings.wifi_name, ClockSettings.wifi_psk)
-
-                    print(f"Wifi connection restored")
-                    time.sleep(6)
-                    self._trying_reconnection = False
-                    
-                except Exception as e:
-                    print (f"Failed to re-connect to wifi {e}")
-                    return
-
-            # Check if we're still connected to the MQTT server
-            if self._mqtt_manager.is_connected is False:
-                print ("MQTT connection lost. Attempting reconnect...")
-
-                if not self._trying_reconnection:
-                        self._clock.show_waiting()
-                        self._trying_reconnection = True
-
-                try:
-                    self._mqtt_manager.connect()
-                    self._mqtt_manager.publish_autoconf()
-
-                    self._clock.clear_ring_pattern()
-                    self._trying_reconnection = False
-                    print(f"MQTT connection restored")
-                except Exception as e:
-                    print (f"Failed to re-connect to MQTT {e}")
-        finally:
-            self._heath_check_busy = False
-                
-    def _connect_wifi(self, name: str, psk: str) -> None:
-        self._wlan.active(True)
-        self._wlan.connect(name, psk)
+    async def main(self) -> None:
+        # Write logged records out from a low priority task, rather than blocking on the console where they are logged
+        Log.level = ClockSettings.log_level
+        Log.start(self._scheduler, ClockSettings.log_flush_ms)
 
-        max_wait = 10
-        while max_wait > 0:
-            if self._wlan.status() < 0 or self._wlan.status() >= 3:
-                break
-            max_wait -= 1
+        if ClockSettings.metrics_enabled:
+            Metrics.start(self._scheduler, ClockSettings.metrics_sample_ms, ClockSettings.metrics_sample_every, ClockSettings.metrics_gc_collect)
 
-            time.sleep(1)
+        self.boot()
+        await self._scheduler.run()
 
-        if self._wlan.status() != 3:
-            raise RuntimeError('wifi connection failed')
+    def boot(self) -> None:
+        if ClockSettings.dual_core:
+            # The hardware runs on the second core, this one only does the networking
+            from RenderCore import RemoteClock
+            self._clock = RemoteClock(self._scheduler)
         else:
-            print('Wifi Connected')
-
-        status = self._wlan.ifconfig()
-        print('IP = ' + status[0])
-
-    def _set_time(self) -> None:
-        NTP_DELTA = 2208988800
-        host = "pool.ntp.org"
+            self._clock = Clock(self._scheduler)
+        self._clock.reset()
+        self._phase("hardware")
+
+        self._clock.show_waiting()
+        self._phase("boot pattern")
+
+        # Connecting and reconnecting is done a step at a time by this task, so nothing waits for the Wi-Fi to join.
+        # The MQTT connect and subscribe do still block, for up to MqttManager's _NETWORK_TIMEOUT_S each.
+        # Start joining the access point straight away, the MQTT manager is created while that goes on
+        self._connectivityTask = self._scheduler.periodic(_CONNECTING_TICK_MS, self._tick, "Connectivity", PRIORITY_LOW)
+        self._start_connecting()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == CONNECTED and self._mqtt_manager != None and self._mqtt_manager.is_connected
+
+    def _phase(self, name: str) -> None:
+        # Records the first time the boot gets to each phase
+        for phase, _ in self.boot_phases:
+            if phase == name:
+                return
+        now = time.ticks_ms()
+        self.boot_phases.append((name, now))
+        Log.info("Boot: %s at %s ms", name, now)
+
+    def _create_mqtt_manager(self) -> None:
+        # Imported here rather than at the top, so the hardware is up and showing the boot pattern before
+        # umqtt, Discovery and json are loaded
+        from MqttManager import MqttManager
+        self._mqtt_manager = MqttManager(ClockSettings.mqtt_address, ClockSettings.mqtt_username, ClockSettings.mqtt_password, self._clock, self._scheduler)
+        self._phase("modules")
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+
+        # Once connected, only the connection needs watching
+        period = _CONNECTED_TICK_MS if state == CONNECTED else _CONNECTING_TICK_MS
+        if self._connectivityTask != None and self._connectivityTask.period != period:
+            self._connectivityTask.set_period(period)
+
+    def _tick(self, t: Task) -> None:
+        state = self.state
+        if state == IDLE:
+            self._start_connecting()
+        elif state == CONNECTING:
+            self._check_connecting()
+        elif state == CONNECTED:
+            self._check_connected()
+        elif state == BACKOFF:
+            if time.ticks_diff(time.ticks_ms(), self._retryAt) >= 0:
+                self._set_state(IDLE)
+                self._start_connecting()
+
+    def _start_connecting(self) -> None:
+        self._set_state(CONNECTING)
+        self._connectDeadline = time.ticks_add(time.ticks_ms(), _WIFI_TIMEOUT_MS)
+        self._syncStarted = False
+
+        # After an MQTT failure the Wi-Fi may well still be up, in which case go straight on to MQTT
+        if self._wlan.status() == network.STAT_GOT_IP:
+            self._connected()
+            return
 
-        NTP_QUERY = bytearray(48)
-        NTP_QUERY[0] = 0x1B
-        addr = socket.getaddrinfo(host, 123)[0][-1]
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        
+        Log.info("Attempting connect to wifi")
+        self._wlan.active(True)
+        self._wlan.connect(ClockSettings.wifi_name, ClockSettings.wifi_psk)
+
+    def _check_connecting(self) -> None:
+        # Joining takes a few seconds, which is time enough to import and set up everything MQTT needs
+        if self._mqtt_manager == None:
+            self._create_mqtt_manager()
+
+        status = self._wlan.status()
+        if status == network.STAT_GOT_IP:
+            self._connected()
+        elif status < 0 or time.ticks_diff(time.ticks_ms(), self._connectDeadline) >= 0:
+            Log.warning("Wifi connection failed %s", status)
+            self._backoff()
+
+    def _connected(self) -> None:
+        if not self._syncStarted:
+            Log.info("Wifi Connected, IP = %s", self._wlan.ifconfig()[0])
+            self._phase("wifi")
+            if self._mqtt_manager == None:
+                self._create_mqtt_manager()
+
+            # The time is synced in the background, carrying on from now whatever the connection does. The first
+            # request goes out straight away, and until the time is known the MQTT connect (which blocks) is left
+            # to the next tick, so the reply can be read before it
+            self._start_time_sync()
+            self._syncStarted = True
+            if not self._timeSync.synced:
+                return
+
+        Log.info("Connecting MQTT")
         try:
-            s.settimeout(1)
-            res = s.sendto(NTP_QUERY, addr)
-            msg = s.recv(48)
-        finally:
-            s.close()
+            self._mqtt_manager.connect()
+            self._mqtt_manager.publish_autoconf()
+        except Exception as e:
+            Log.error("Failed to connect to MQTT %s", e)
+            self._mqtt_manager.stop()
+            self._backoff()
+            return
 
-        val = struct.unpack("!I", msg[40:44])[0]
-        t = val - NTP_DELTA    
-        tm = time.gmtime(t)
+        # A publish that fails stops the MQTT manager rather than raising, so check the connection survived
+        if not self._mqtt_manager.is_connected:
+            Log.error("MQTT connection lost while connecting")
+            self._backoff()
+            return
 
-        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
\ No newline at end of file
+        Log.info("Connected")
+        self._attempts = 0
+        self._everConnected = True
+        self._clock.clear_ring_pattern()
+        self._set_state(CONNECTED)
+        self._phase("mqtt")
+
+    def _check_connected(self) -> None:
+        if self._wlan.status() != network.STAT_GOT_IP:
+            Log.warning("Wifi connection lost. Attempting reconnect...")
+            self._lost()
+        elif not self._mqtt_manager.is_connected:
+            Log.warning("MQTT connection lost. Attempting reconnect...")
+            self._lost()
+
+    def _lost(self) -> None:
+        self._mqtt_manager.stop()
+        self._clock.show_waiting()
+
+        # Try again straight away, backing off only if that fails
+        self._set_state(IDLE)
+        self._start_connecting()
+
+    def _backoff(self) -> None:
+        # Exponential backoff, with half of each delay random so that clocks that lost the network together
+        # don't all come back at once
+        delay = min(_BACKOFF_MAX_MS, _BACKOFF_BASE_MS << min(self._attempts, 16))
+        delay = delay // 2 + random.randint(0, delay // 2)
+        self._attempts += 1
+        self._retryAt = time.ticks_add(time.ticks_ms(), delay)
+        Log.info("Retrying connection in %s ms", delay)
+
+        # Until the clock has connected once, show that it couldn't
+        if not self._everConnected:
+            self._clock.show_boot_error()
+        self._set_state(BACKOFF)
+
+    def _start_time_sync(self) -> None:
+        if self._timeSync == None:
+            from TimeSync import TimeSync
+            self._timeSync = TimeSync(self._scheduler, ClockSettings.ntp_host, ClockSettings.ntp_port, ClockSettings.ntp_samples, self._time_synced)
+            self._timeSync.start()
+        elif not self._timeSync.synced:
+            # It will be waiting to retry after failing while the network was down
+            self._timeSync.sync_now()
+
+    def _time_synced(self) -> None:
+        self._phase("time")
+
+        # Called each time the RTC is set, which is mostly just to keep it on time. Only tell the clock when the
+        # time has actually moved, as that reschedules everything and, with two cores, is a command to the other
+        now = self._timeSync.now_ms()
+        ticks = time.ticks_ms()
+        base = self._timeBase
+        if base != None and abs(now - base[0] - time.ticks_diff(ticks, base[1])) < _TIME_CHANGED_MS:
+            return
+        self._timeBase = (now, ticks)
+        self._clock.time_changed(self._timeSync.now_ms)
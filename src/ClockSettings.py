@@ -4,4 +4,54 @@ class ClockSettings:
 
     mqtt_address = ""
     mqtt_username = ""
-    mqtt_password = ""
\ No newline at end of file
+    mqtt_password = ""
+
+    # The NTP server. A name is looked up when the clock first syncs, which blocks until the resolver answers, so give
+    # an IP address to never wait on DNS
+    ntp_host = "pool.ntp.org"
+    ntp_port = 123
+
+    # Requests sent to the NTP server each time the clock syncs, the one with the quickest reply is used
+    ntp_samples = 4
+
+    # Drive the dial ring from a PIO state machine and DMA rather than the neopixel module. Needs MicroPython 1.21
+    # or later, on older firmware the neopixel module is used anyway
+    dial_ring_pio = False
+
+    # Run the dial ring, pendulum and chime on the Pico's second core, leaving the first to the network (see RenderCore)
+    dual_core = True
+
+    # How far (0 to 1) the light level has to move before the new level is published to Home Assistant
+    light_report_threshold = 0.05
+
+    # Chime when a timer set from Home Assistant runs out
+    timer_chime = False
+
+    # Chime timings (ms): how long the chime solenoid holds the cuckoo out, how long the reset solenoid takes to
+    # bring it back, the wait between cuckoos when it chimes several times, and the wait between separate chimes
+    chime_pulse_ms = 1700
+    chime_reset_ms = 500
+    chime_gap_ms = 0
+    chime_pause_ms = 1000
+
+    # What the clock does at set times of day, until a schedule is published to cuckoo_clock/schedule/set (see
+    # ChimeSchedule and the README). Empty by default, so the clock only does what Home Assistant tells it to
+    schedule = {"rules": []}
+
+    # Log records below this level are dropped (Log.DEBUG 10, INFO 20, WARNING 30, ERROR 40)
+    log_level = 20
+
+    # How often (ms) logged records are written out, and whether they are also published to cuckoo_clock/log
+    log_flush_ms = 1000
+    log_mqtt = False
+
+    # Publish runtime metrics (frame times, timer jitter, MQTT round trip, heap) as diagnostic sensors every
+    # metrics_publish_ms. The heap is sampled every metrics_sample_ms, and 1 in metrics_sample_every frames and task runs are timed
+    metrics_enabled = True
+    metrics_publish_ms = 60000
+    metrics_sample_ms = 5000
+    metrics_sample_every = 1
+
+    # Collect garbage whenever the heap is sampled, which times the GC pause and keeps the automatic ones short.
+    # Off by default, as it changes when the GC runs: turn it on to measure the pauses
+    metrics_gc_collect = False
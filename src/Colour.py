@@ -1,8 +1,69 @@
 class Colour:
     """
-        Represents an RGB colour that the clock can show.
+        Represents an RGB colour that the clock can show. Colours are immutable values, so they can be shared:
+        use Colour.of() rather than the constructor to get an interned instance instead of a new one.
     """
+    # MicroPython ignores this, but there are only ever a handful of interned instances there anyway
+    __slots__ = ("red", "green", "blue", "value")
+
     def __init__(self, r, g, b) -> None:
         self.red = r
         self.green = g
-        self.blue = b
\ No newline at end of file
+        self.blue = b
+
+        # Packed 0xRRGGBB form, cheap to compare and to use as a key
+        self.value = (r << 16) | (g << 8) | b
+
+    @staticmethod
+    def of(r: int, g: int, b: int) -> "Colour":
+        value = (r << 16) | (g << 8) | b
+        colour = _interned.get(value)
+        if colour is None:
+            colour = Colour(r, g, b)
+            if len(_interned) < _MAX_INTERNED:
+                _interned[value] = colour
+        return colour
+
+    @staticmethod
+    def from_value(value: int) -> "Colour":
+        return Colour.of((value >> 16) & 0xff, (value >> 8) & 0xff, value & 0xff)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Colour) and other.value == self.value
+
+    def __hash__(self) -> int:
+        return self.value
+
+    def is_black(self) -> bool:
+        return self.value == 0
+
+    def to_grb(self) -> bytes:
+        """
+            The colour as the 3 bytes a NeoPixel expects, in GRB order.
+        """
+        return bytes((self.green, self.red, self.blue))
+
+    def write_grb(self, buf: bytearray, index: int) -> None:
+        """
+            Sets LED index of a GRB frame buffer to this colour.
+        """
+        i = index * 3
+        buf[i] = self.green
+        buf[i + 1] = self.red
+        buf[i + 2] = self.blue
+
+    def fill_grb(self, buf: bytearray) -> None:
+        """
+            Sets every LED of a GRB frame buffer to this colour.
+        """
+        g = self.green
+        r = self.red
+        b = self.blue
+        for i in range(0, len(buf), 3):
+            buf[i] = g
+            buf[i + 1] = r
+            buf[i + 2] = b
+
+# Colours handed out by Colour.of(). Capped, so a stream of one-off colours can't grow it forever
+_interned = {}
+_MAX_INTERNED = 32
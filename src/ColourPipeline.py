@@ -0,0 +1,53 @@
+from array import array
+
+RED = 0
+GREEN = 1
+BLUE = 2
+
+class ColourProfile:
+    """
+        How one light source turns a colour (0-255 per channel, as Home Assistant sends it) into output levels.
+        Each channel is gamma corrected, then scaled by its calibration gain (how bright that LED is compared to the others)
+        and white balance gain, then by the brightness.
+        The float maths is done once, into a 16 bit linear table per channel, and output tables for any brightness are
+        built from those with integer maths, so converting a channel is a single lookup.
+    """
+    def __init__(self, calibration: tuple, white_balance: tuple = (1.0, 1.0, 1.0), gamma: float = 2.2) -> None:
+        self._linear = []
+        for channel in range(3):
+            gain = calibration[channel] * white_balance[channel] * 65535
+            table = array('H', bytes(512))
+            for value in range(1, 256):
+                table[value] = int((value / 255) ** gamma * gain + 0.5)
+            self._linear.append(table)
+
+    def byte_table(self, channel: int, brightness: float = 1.0, floor: int = 1, table: bytearray = None, offset: int = 0) -> bytearray:
+        """
+            Returns (or fills in table) a 256 entry table mapping a channel value to an 8 bit output, e.g. for a NeoPixel.
+            offset is taken off every lit output, and lit channels never go below floor, so they don't go out completely.
+        """
+        if table is None:
+            table = bytearray(256)
+        linear = self._linear[channel]
+        scale = int(brightness * 255 + 0.5)
+        table[0] = 0
+        for value in range(1, 256):
+            level = ((linear[value] * scale + 32768) >> 16) - offset
+            table[value] = floor if level < floor else level
+        return table
+
+    def duty_table(self, channel: int, brightness: float = 1.0) -> array:
+        """
+            Returns a 256 entry table mapping a channel value to a 16 bit PWM duty.
+        """
+        linear = self._linear[channel]
+        scale = int(brightness * 256 + 0.5)
+        table = array('H', bytes(512))
+        for value in range(1, 256):
+            table[value] = (linear[value] * scale) >> 8
+        return table
+
+# The pendulum's red LED is a lot brighter than its green and blue ones
+PENDULUM = ColourProfile((0.6, 1.0, 1.0))
+
+DIAL = ColourProfile((1.0, 1.0, 1.0))
@@ -0,0 +1,144 @@
+import _thread
+from machine import Timer
+
+class CommandRing:
+    """
+        A fixed size queue of commands from one core to the other, for exactly one producer and one consumer.
+        Only the producer moves the head and only the consumer moves the tail, and each move is a single store,
+        so neither side needs a lock and neither ever waits for the other.
+    """
+    def __init__(self, size: int) -> None:
+        # One slot is always left empty, so a full ring can be told apart from an empty one
+        self._slots = [None] * (size + 1)
+        self._head = 0
+        self._tail = 0
+
+        # Commands turned away because the ring was full
+        self.dropped = 0
+
+    def push(self, command) -> bool:
+        """
+            Adds a command, returning False if the ring is full. Producer only.
+        """
+        head = self._head
+        following = head + 1
+        if following == len(self._slots):
+            following = 0
+        if following == self._tail:
+            self.dropped += 1
+            return False
+
+        # The slot is filled before the head moves past it, so the consumer never sees an empty slot
+        self._slots[head] = command
+        self._head = following
+        return True
+
+    def pop(self):
+        """
+            Takes the oldest command, or returns None if there are none. Consumer only.
+        """
+        tail = self._tail
+        if tail == self._head:
+            return None
+
+        command = self._slots[tail]
+        self._slots[tail] = None
+        tail += 1
+        if tail == len(self._slots):
+            tail = 0
+        self._tail = tail
+        return command
+
+class Snapshot:
+    """
+        The latest values of a fixed set of fields, written by one core and read by the other.
+        There are two copies. The writer only ever changes the back one, then flips it to the front, so a reader
+        always sees a whole set of values from one update. A reader checks the sequence number either side of a
+        read and tries again if it changed, in case the writer flipped twice (and so wrote over the copy being
+        read) in the meantime.
+    """
+    def __init__(self, fields: tuple) -> None:
+        self.fields = fields
+        self._values = ([None] * len(fields), [None] * len(fields))
+
+        # Bumped for a field each time it is written, so a reader can tell which fields changed
+        self._versions = ([0] * len(fields), [0] * len(fields))
+        self._front = 0
+
+        # Bumped at every flip
+        self.sequence = 0
+
+    def begin(self) -> None:
+        """
+            Starts an update, from the current values. Writer only.
+        """
+        front = self._front
+        back = 1 - front
+        self._values[back][:] = self._values[front]
+        self._versions[back][:] = self._versions[front]
+
+    def set(self, index: int, value) -> None:
+        """
+            Sets a field in the update begun by begin(). Writer only.
+        """
+        back = 1 - self._front
+        self._values[back][index] = value
+        self._versions[back][index] += 1
+
+    def publish(self) -> None:
+        """
+            Makes the update visible to the reader. Writer only.
+        """
+        self._front = 1 - self._front
+        self.sequence += 1
+
+    def read(self, index: int):
+        while True:
+            sequence = self.sequence
+            value = self._values[self._front][index]
+            if sequence == self.sequence:
+                return value
+
+    def read_versions(self, versions: list) -> int:
+        """
+            Copies the version of every field into versions, returning the sequence number they are from.
+        """
+        while True:
+            sequence = self.sequence
+            versions[:] = self._versions[self._front]
+            if sequence == self.sequence:
+                return sequence
+
+class Doorbell:
+    """
+        Wakes a core waiting in wait() as soon as ring() is called, from the other core or an interrupt.
+        The waiting core blocks on a lock, which costs it nothing and wakes it the moment the lock is released.
+        MicroPython's lock.acquire() takes no timeout, so a one-shot hard timer rings the bell at the timeout instead.
+    """
+    def __init__(self) -> None:
+        self._lock = _thread.allocate_lock()
+        self._lock.acquire()
+        self._timer = Timer()
+
+        # Bound once, so the timer interrupt doesn't allocate
+        self._ring = self._on_timer
+
+    def ring(self) -> None:
+        try:
+            self._lock.release()
+        except RuntimeError:
+            # Already rung, and not waited on since
+            pass
+
+    def _on_timer(self, t) -> None:
+        self.ring()
+
+    def wait(self, timeout_ms: int) -> None:
+        """
+            Waits until the bell is rung or timeout_ms has passed. Returns straight away if it was rung since the last wait.
+        """
+        if timeout_ms <= 0:
+            return
+        self._timer.init(mode=Timer.ONE_SHOT, period=timeout_ms, callback=self._ring, hard=True)
+        self._lock.acquire()
+        self._timer.deinit()
@@ -1,88 +1,141 @@
 
-from machine import Pin, Timer
+from machine import Pin
 import neopixel
-import math
 from Colour import Colour
 import RingPatterns
 from LightMeter import LightMeter
+from Dimmer import Dimmer
+from ColourPipeline import DIAL, RED, GREEN, BLUE
+from Scheduler import Scheduler, Task, PRIORITY_HIGH
+import Log
+import Metrics
+import time
 
 class DialRing:
     """
         Represents the ring og RGB lights surrounding the clock dial
     """
 
-    def __init__(self, dataPin: int, light_meter: LightMeter) -> None:
+    def __init__(self, dataPin: int, light_meter: LightMeter, scheduler: Scheduler, use_pio: bool = False) -> None:
         self._light_meter = light_meter
-
-        self.np = neopixel.NeoPixel(Pin(dataPin), 20)
+        self._scheduler = scheduler
+
+        if use_pio:
+            # rp2.DMA only came in with MicroPython 1.21, on older firmware the ring is driven by neopixel instead
+            import rp2
+            if not hasattr(rp2, "DMA"):
+                Log.warning("dial_ring_pio needs MicroPython 1.21 or later, using neopixel")
+                use_pio = False
+
+        if use_pio:
+            # Frames are sent by DMA, so writing one doesn't hold up everything else while it goes out
+            from PioNeoPixel import PioNeoPixel
+            self.np = PioNeoPixel(Pin(dataPin), 20)
+        else:
+            self.np = neopixel.NeoPixel(Pin(dataPin), 20)
+
+        # Patterns render into this buffer (GRB, like the NeoPixel's own buffer) and it is then
+        # copied into the NeoPixel, so a frame doesn't need to create any objects
+        self._frame = bytearray(60)
+        self._dimmer = Dimmer(light_meter)
+
+        # Colour correction at full brightness, for when the light meter is off
+        self._fullTables = (DIAL.byte_table(GREEN), DIAL.byte_table(RED), DIAL.byte_table(BLUE))
         self._pattern = None 
-        self._refreshTimer = None
+        self._refreshTask = None
+        self._refreshPeriod = 0
         self._colourOverride = None
 
+        # Called with "dial" whenever the pattern or colour changes
+        self.on_change = None
+
+        # The pattern and dimming versions that are currently on the ring, so unchanged frames can be skipped
+        self._shownVersion = None
+        self._shownDimVersion = None
+        self._framesRendered = 0
+        self._framesSkipped = 0
+
         # Light meter isn't working quite right at the moment, so disable it
         self._use_light_meter = True
         
-    def _swap_pattern_callback(self, t: Timer) -> None:
+    def _swap_pattern_callback(self, t: Task) -> None:
         if self._pattern != None:
+            # Skip the frame entirely if neither the pattern nor the ambient light has changed since it was last shown
+            version = self._pattern.version
+            tables = self._dimmer.update() if self._use_light_meter else self._fullTables
+            if version == self._shownVersion and self._dimmer.version == self._shownDimVersion:
+                self._framesSkipped += 1
+                return
+
+            self._shownVersion = version
+            self._shownDimVersion = self._dimmer.version
+            self._framesRendered += 1
+            sampled = Metrics.FRAME_US.sample()
+            if sampled:
+                start = time.ticks_us()
+
             # Get the data for this frame
-            array = self._pattern.show()
+            frame = self._frame
             
-            # If the pattern returns no data, stop it and clean up
-            if array is None and self._refreshTimer is not None:
-                print("Pattern retruned None. Removing pattern")
-                self._refreshTimer.deinit()
-                self._refreshTimer = None
+            # If the pattern has finished, stop it and clean up
+            if not self._pattern.render(frame) and self._refreshTask is not None:
+                Log.debug("Pattern finished. Removing pattern")
+                self._refreshTask.cancel()
+                self._refreshTask = None
                 self._pattern = None
                 self.clear()
                 return
             
             # Copy over the pattern data to the NeoPixel ring
-            for i in range(20):
-                colour = self._colourOverride if self._colourOverride != None else array[i]
-                
-                corrected = colour
-                if self._use_light_meter:
-                    # Dim the brightness according to the ambient light
-                    corrected = self._calculateColourForLightLevel(array[i], self._light_meter.GetOffset())
-                
-                self.np[i] = (corrected.red, corrected.green, corrected.blue)
+            if self._use_light_meter:
+                # Dim the brightness according to the ambient light
+                self._write_for_light_level(frame, tables)
+            else:
+                if self._colourOverride != None:
+                    self._colourOverride.fill_grb(frame)
+                self._write_for_light_level(frame, tables)
 
             # Show it!
             self.np.write()
-            
-        elif self._refreshTimer != None:
-                # If there is no longer an active pattern, stop the refresh timerß
-                self._refreshTimer.deinit()
-                self._refreshTimer = None
-
-    def _calculateColourForLightLevel(self, input: Colour, reading: float) -> Colour: 
-        brightnessOffset = reading * 60
-
-        red = 0 if input.red is 0 else max(10, input.red - brightnessOffset)
-        green = 0 if input.green is 0 else max(10, input.green - brightnessOffset)
-        blue = 0 if input.blue is 0 else max(10, input.blue - brightnessOffset)
 
-        corrected = Colour(
-            int(red),
-            int(green),
-            int(blue),
-        )
-
-        return corrected
+            if sampled:
+                Metrics.FRAME_US.record(time.ticks_diff(time.ticks_us(), start))
+            
+        elif self._refreshTask != None:
+                # If there is no longer an active pattern, stop the refresh task
+                self._refreshTask.cancel()
+                self._refreshTask = None
+
+    def _write_for_light_level(self, frame: bytearray, tables: tuple) -> None:
+        # Correct each channel of the GRB frame into the NeoPixel's buffer
+        out = self.np.buf
+        green, red, blue = tables
+        for i in range(0, 60, 3):
+            out[i] = green[frame[i]]
+            out[i + 1] = red[frame[i + 1]]
+            out[i + 2] = blue[frame[i + 2]]
 
     def showPattern(self, pattern) -> None:
         if self._pattern != None:
             # Stop the current pattern if one is already running
             self._pattern.stop()
 
-        if self._refreshTimer is None:
-            # Refresh the ring at 30 FPS
-            period = int(1000 / 30)
-            self._refreshTimer = Timer(mode=Timer.PERIODIC, period=period, callback=self._swap_pattern_callback)
+        # Animated patterns refresh the ring at 30 FPS, static ones ask for a slower refresh
+        period = pattern.refresh_period
+        if self._refreshTask is None:
+            self._refreshTask = self._scheduler.periodic(period, self._swap_pattern_callback, "DialRing", PRIORITY_HIGH)
+        elif period != self._refreshPeriod:
+            self._refreshTask.set_period(period)
+        self._refreshPeriod = period
     
+        self._shownVersion = None
         self._pattern = pattern
-        self._pattern.start()
-        
+        self._pattern.start(self._scheduler)
+        self._changed()
+
+        # The task's first run is a whole period away (half a second for a static pattern), so draw the first frame now
+        self._swap_pattern_callback(self._refreshTask)
+
     def clearNoShow(self) -> None:
         # Clear the current array, but don't wrote it to the ring
         self.np.fill((0,0,0))
@@ -90,35 +143,57 @@ class DialRing:
 
         self._pattern = None 
         
-        if self._refreshTimer != None: 
-            self._refreshTimer.deinit()
-            self._refreshTimer = None
+        if self._refreshTask != None: 
+            self._refreshTask.cancel()
+            self._refreshTask = None
+
+        self._changed()
         
     def clear(self) -> None:
-        if self._refreshTimer != None: 
-            self._refreshTimer.deinit()
-            self._refreshTimer = None
+        if self._refreshTask != None: 
+            self._refreshTask.cancel()
+            self._refreshTask = None
+
+        # Stop the pattern too, otherwise its own task would keep running
+        if self._pattern != None:
+            self._pattern.stop()
+            self._pattern = None
     
         # Clear the current ring value
         self.np.fill((0,0,0))
         self.np.write()
         self._colourOverride = None
+        self._changed()
 
 
     def set_dial_ring(self, colour: Colour, pattern: RingPatterns.BasePattern) -> None:
-        if colour.red == 0 and colour.green == 0 and colour.blue == 0:
+        if colour.is_black():
             self.clear()
             return
 
-        self._colourOverride = colour
         if (self._pattern != None):
             self.clear()
+        self._colourOverride = colour
         self.showPattern(RingPatterns.SolidPattern(colour) if pattern == None else pattern)
 
+    @property
+    def is_off(self) -> bool:
+        return self._pattern == None
+
+    def _changed(self) -> None:
+        if self.on_change != None:
+            self.on_change("dial")
+
     def get_state(self) -> dict:
+        state = self.get_light_state()
+        state["frames_rendered"] = self._framesRendered
+        state["frames_skipped"] = self._framesSkipped
+        return state
+
+    def get_light_state(self) -> dict:
         return {
             "state": "OFF" if self._pattern == None else "ON",
-            "effect": "" if self._pattern == None and False else type(self._pattern).__name__,
+            "effect": "" if self._pattern == None else self._pattern.name,
             "color": {
                 "r": 255 if self._colourOverride == None else self._colourOverride.red,
                 "g": 255 if self._colourOverride == None else self._colourOverride.green,
@@ -0,0 +1,49 @@
+from LightMeter import LightMeter
+from ColourPipeline import ColourProfile, DIAL, RED, GREEN, BLUE
+
+class Dimmer:
+    """
+        Dims colours according to the ambient light level, by taking up to max_offset off each lit channel's output but
+        never going below floor, as the dial ring always has.
+        The light level is quantised into a number of buckets, and the colour profile's lookup tables are only rebuilt
+        when the bucket changes, so correcting and dimming a channel is a single table lookup.
+    """
+    def __init__(self, light_meter: LightMeter, profile: ColourProfile = DIAL, buckets: int = 16, max_offset: int = 60,
+                 floor: int = 10) -> None:
+        self._light_meter = light_meter
+        self._profile = profile
+        self._buckets = buckets
+        self._max_offset = max_offset
+        self._floor = floor
+
+        self._last_reading = None
+        self._bucket = -1
+
+        # Bumped whenever the tables change
+        self.version = 0
+
+        # One table per channel, in the NeoPixel's GRB order
+        self.tables = (bytearray(256), bytearray(256), bytearray(256))
+        self._set_bucket(0)
+
+    def _set_bucket(self, bucket: int) -> None:
+        self._bucket = bucket
+        self.version += 1
+        offset = bucket * self._max_offset // (self._buckets - 1)
+        for table, channel in zip(self.tables, (GREEN, RED, BLUE)):
+            self._profile.byte_table(channel, floor=self._floor, table=table, offset=offset)
+
+    def update(self) -> tuple:
+        """
+            Samples the light level and returns the (green, red, blue) tables for it. Call this once per frame.
+        """
+        reading = self._light_meter.GetOffset()
+
+        # The light meter hands back the same cached reading between samples, so skip the float maths until it changes
+        if reading is not self._last_reading:
+            self._last_reading = reading
+            bucket = int(reading * (self._buckets - 1) + 0.5)
+            if bucket != self._bucket:
+                self._set_bucket(bucket)
+
+        return self.tables
@@ -0,0 +1,131 @@
+import json
+import RingPatterns
+
+# Home Assistant MQTT discovery for the clock's entities. Everything is built once, when this module is
+# first imported, and kept as bytes, so (re)connecting doesn't have to build or serialize anything.
+
+_DEVICE = {
+    "identifiers": [ "cuckoo_clock" ],
+    "name": "Cuckoo Clock",
+    "manufacturer": "andycb",
+    "model": "Cuckoo Clock",
+    "sw_version": "2023.08.26",
+}
+
+# (entity, component, object id, name of the MqttManager method that handles its commands (or None), extra
+# discovery fields). Adding an entity here is enough to subscribe to its command topic and dispatch to the handler
+_ENTITIES = (
+    ("pendulum_swing", "switch", "cuckoo_clock_pendulum_swing", "_handle_pendulum_swing_message", {
+        "name": "Pendulum Swing",
+    }),
+    ("chime", "switch", "cuckoo_clock_chime", "_handle_chime_message", {
+        "name": "Chime",
+    }),
+    ("timer", "number", "cuckoo_clock_timer", "_handle_timer_message", {
+        "name": "Timer",
+        "unit_of_measurement": "Seconds",
+        # The state goes back to 0 when the timer runs out
+        "min": 0,
+    }),
+    ("pendulum_light", "light", "cuckoo_clock_pendulum_light", "_handle_pendulum_light_message", {
+        "name": "Pendulum Light",
+        # Existing installs already know the light by this id, so don't change it
+        "unique_id": "homeassistant/light/cuckoo_clock_pendulum_light",
+        "effect": "true",
+        "supported_color_modes": "rgb",
+        "effect_list": "breathe",
+        "schema": "json",
+        "color_mode": "true",
+    }),
+    ("dial", "light", "cuckoo_clock_dial", "_handle_dial_message", {
+        "name": "Dial Colour",
+        "effect": "true",
+        "supported_color_modes": "rgb",
+        "effect_list": sorted(RingPatterns.EFFECTS),
+        "schema": "json",
+        "color_mode": "true",
+    }),
+    ("light_level", "sensor", "cuckoo_clock_brightness", None, {
+        "name": "Light Level",
+    }),
+)
+
+# Diagnostic sensors, all read from the one JSON document MqttManager publishes to METRICS_TOPIC:
+# (key in Metrics.snapshot(), object id, name, unit)
+METRICS_TOPIC = b"cuckoo_clock/metrics"
+_METRICS = (
+    ("frame_us_p99", "cuckoo_clock_frame_time", "Frame Time p99", "us"),
+    ("jitter_ms_p99", "cuckoo_clock_timer_jitter", "Timer Jitter p99", "ms"),
+    ("mqtt_rtt_ms_p50", "cuckoo_clock_mqtt_rtt", "MQTT Round Trip", "ms"),
+    ("mem_free", "cuckoo_clock_mem_free", "Free Memory", "B"),
+    ("gc_auto", "cuckoo_clock_gc_auto", "Automatic GCs Seen", None),
+    ("gc_forced", "cuckoo_clock_gc_forced", "Forced GCs", None),
+    ("gc_forced_us_max", "cuckoo_clock_gc_forced_pause", "Forced GC Pause Max", "us"),
+)
+
+# The clock publishes to this and times how long the message takes to come back
+PING_TOPIC = b"cuckoo_clock/ping"
+
+# Retained topic recording which version of the discovery configs the broker holds, so they
+# only need publishing again when they change
+VERSION_TOPIC = b"cuckoo_clock/discovery"
+
+STATE_TOPICS = {}
+COMMAND_TOPICS = {}
+
+# Command topic -> name of the MqttManager method that handles it
+HANDLERS = {}
+
+# (topic, payload) for each entity's retained discovery config
+CONFIGS = []
+
+def _build() -> None:
+    for entity, component, object_id, handler, extra in _ENTITIES:
+        prefix = f"homeassistant/{component}/{object_id}"
+        STATE_TOPICS[entity] = f"{prefix}/state".encode()
+        if handler != None:
+            COMMAND_TOPICS[entity] = f"{prefix}/set".encode()
+            HANDLERS[COMMAND_TOPICS[entity]] = handler
+
+        payload = {
+            "name": extra["name"],
+            "command_topic": f"{prefix}/set",
+            "state_topic": f"{prefix}/state",
+            "unique_id": object_id,
+        }
+        payload.update(extra)
+        payload["device"] = _DEVICE
+        CONFIGS.append((f"{prefix}/config".encode(), json.dumps(payload).encode()))
+
+    for key, object_id, name, unit in _METRICS:
+        payload = {
+            "name": name,
+            "state_topic": METRICS_TOPIC.decode(),
+            "value_template": "{{ value_json.%s }}" % key,
+            "unique_id": object_id,
+            "entity_category": "diagnostic",
+            "device": _DEVICE,
+        }
+        if unit != None:
+            payload["unit_of_measurement"] = unit
+        CONFIGS.append((f"homeassistant/sensor/{object_id}/config".encode(), json.dumps(payload).encode()))
+
+def _checksum(chunks) -> bytes:
+    # FNV-1a, so any change to a config gives a new version
+    h = 0x811c9dc5
+    for chunk in chunks:
+        for b in chunk:
+            h = ((h ^ b) * 0x01000193) & 0xffffffff
+    return ("%08x" % h).encode()
+
+_build()
+VERSION = _checksum(payload for _, payload in CONFIGS)
+
+# The chime schedule (see ChimeSchedule) isn't a Home Assistant entity, so it has no discovery config, just a
+# retained command topic and the state published back
+STATE_TOPICS["schedule"] = b"cuckoo_clock/schedule"
+COMMAND_TOPICS["schedule"] = b"cuckoo_clock/schedule/set"
+HANDLERS[COMMAND_TOPICS["schedule"]] = "_handle_schedule_message"
+
+# Everything the clock subscribes to, sent as a single SUBSCRIBE
+SUBSCRIPTIONS = tuple(COMMAND_TOPICS.values()) + (VERSION_TOPIC, PING_TOPIC)
@@ -1,38 +1,119 @@
 from machine import Pin, ADC
-import time
+from Scheduler import Scheduler, Task, PRIORITY_LOW
+
+# How often (ms) the sensor is sampled, and how many ADC readings are averaged into each sample
+_SAMPLE_MS = 250
+_OVERSAMPLE = 8
+
+# Each sample moves the average 1/2^_EMA_SHIFT of the way to it, i.e. it follows a change over about 2 s.
+# The average is kept in 1/2^_SCALE_SHIFT of an ADC unit so the small steps aren't rounded away
+_EMA_SHIFT = 3
+_SCALE_SHIFT = 4
+
+# The level only changes when the average has moved this far (a fraction of the calibrated range, 1/2^n) from
+# the reading that set it, so noise around a boundary doesn't make the dial flicker
+_HYSTERESIS_SHIFT = 6
+
+# The calibrated range grows at once to take in a new extreme, and shrinks back towards the current reading
+# by 1/2^_FORGET_SHIFT every _CALIBRATE_SAMPLES samples (a time constant of about 3 days) so an odd reading is forgotten.
+# It never shrinks below _MIN_SPAN ADC units
+_CALIBRATE_SAMPLES = 240
+_FORGET_SHIFT = 12
+_MIN_SPAN = 100
 
 class LightMeter:
     """
         Represents the ambient light sensor
+        The sensor is sampled in the background by a scheduler task, so reading the level never touches the ADC.
+        Each sample is the mean of several readings, smoothed by an exponential moving average, and scaled between
+        the darkest and brightest the room has been lately.
     """
-    _min: int = 950  # The value to be consisted the the brightest the room will be
-    _max: int = 1100 # The value to be consisted the the darkest the room will be
+    _min: int = 950  # The value to be consisted the the brightest the room will be, until a brighter one is seen
+    _max: int = 1100 # The value to be consisted the the darkest the room will be, until a darker one is seen
 
-    def __init__(self, lightPin):
+    def __init__(self, lightPin, scheduler: Scheduler, report_threshold: float = 0.05):
         self._adc = ADC(Pin(lightPin))
-        self._lastReadTicks = None
-        self._cachedValue = 0
-        pass
+
+        # The level is only reported (see on_change) when it has moved this far from the last reported level
+        self.report_threshold = report_threshold
+
+        # Called with "light_level" whenever the reported level changes
+        self.on_change = None
+
+        # Calibrated range, and the moving average, in scaled ADC units
+        self._low = self._min << _SCALE_SHIFT
+        self._high = self._max << _SCALE_SHIFT
+        self._ema = self._read() << _SCALE_SHIFT
+        self._calibrate(self._ema)
+
+        # The average the current level was worked out from
+        self._levelEma = self._ema
+        self._value = self._level(self._ema)
+        self._reported = self._value
+        self._sinceForget = 0
+
+        # Bumped whenever the level changes
+        self.version = 0
+        self.samples = 0
+
+        self._task = scheduler.periodic(_SAMPLE_MS, self._sample, "Light meter", PRIORITY_LOW)
 
     def GetOffset(self) -> float:
         """
             Returns a value between 0 and 1, where 0 is the ful brightness and 1 is darkness
+            The same object is returned until the level changes.
+        """
+        return self._value
+
+    def get_reported(self) -> float:
+        """
+            The level last reported through on_change, to 2 decimal places.
         """
-        now = time.ticks_ms()
+        return round(self._reported, 2)
+
+    def _read(self) -> int:
+        adc = self._adc
+        total = 0
+        for _ in range(_OVERSAMPLE):
+            total += adc.read_u16()
+        return total // _OVERSAMPLE
+
+    def _calibrate(self, ema: int) -> None:
+        if ema < self._low:
+            self._low = ema
+        if ema > self._high:
+            self._high = ema
+
+    def _forget(self, ema: int) -> None:
+        # Shrink the range towards the current reading, keeping it at least _MIN_SPAN wide
+        low = self._low + ((ema - self._low) >> _FORGET_SHIFT)
+        high = self._high - ((self._high - ema) >> _FORGET_SHIFT)
+        if high - low >= _MIN_SPAN << _SCALE_SHIFT:
+            self._low = low
+            self._high = high
+
+    def _level(self, ema: int) -> float:
+        return min(1.0, max(0.0, (ema - self._low) / (self._high - self._low)))
 
-        # The ADC is kind of slow, so cache all readings for 1 second
-        if self._lastReadTicks is not None:
-            if time.ticks_diff(now, self._lastReadTicks) < 2000:
-                return self._cachedValue
-            
-        self._lastReadTicks = now
+    def _sample(self, t: Task) -> None:
+        self.samples += 1
+        ema = self._ema
+        ema += ((self._read() << _SCALE_SHIFT) - ema) >> _EMA_SHIFT
+        self._ema = ema
+        self._calibrate(ema)
 
-        rawValue = self._adc.read_u16()
-        value = rawValue - self._min
-        value = max(0, value)
-        value = min(self._max, value)
+        self._sinceForget += 1
+        if self._sinceForget >= _CALIBRATE_SAMPLES:
+            self._sinceForget = 0
+            self._forget(ema)
 
-        percent = value / (self._max - self._min)
+        if abs(ema - self._levelEma) < (self._high - self._low) >> _HYSTERESIS_SHIFT:
+            return
+        self._levelEma = ema
+        self._value = self._level(ema)
+        self.version += 1
 
-        self._cachedValue = percent
-        return percent
\ No newline at end of file
+        if abs(self._value - self._reported) >= self.report_threshold:
+            self._reported = self._value
+            if self.on_change != None:
+                self.on_change("light_level")
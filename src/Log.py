@@ -0,0 +1,159 @@
+from micropython import const
+import _thread
+import time
+
+# Log levels
+DEBUG = const(10)
+INFO = const(20)
+WARNING = const(30)
+ERROR = const(40)
+
+_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+# Levels below this are compiled out: the functions for them are replaced with ones that do nothing, so
+# a release build pays only for the call. Set it when building the firmware
+BUILD_LEVEL = const(DEBUG)
+
+# Records below this level are dropped as soon as they are logged. Can be changed at runtime
+level = INFO
+
+# Records are kept in a fixed ring until the next flush, and the oldest are overwritten if it fills up
+_SIZE = const(32)
+
+# One entry per slot in the ring. Each record keeps its format string and up to 3 arguments as they were
+# passed, so logging allocates nothing: the message is only formatted when it is flushed
+_levels = bytearray(_SIZE)
+_times = [0] * _SIZE
+_formats = [None] * _SIZE
+_arg_a = [None] * _SIZE
+_arg_b = [None] * _SIZE
+_arg_c = [None] * _SIZE
+_arg_counts = bytearray(_SIZE)
+
+_head = 0
+_count = 0
+_dropped = 0
+
+# Both cores log, so the ring is only changed with this held
+_lock = _thread.allocate_lock()
+
+def _serial(text: str) -> None:
+    print(text)
+
+# Passed every flushed batch of records, as text with one record per line
+_sinks = [_serial]
+
+# Marks an argument that wasn't given, so None can still be logged
+_MISSING = object()
+
+def _record(record_level: int, fmt: str, a, b, c) -> None:
+    global _head, _count, _dropped
+    if record_level < level:
+        return
+
+    with _lock:
+        i = _head
+        _levels[i] = record_level
+        _times[i] = time.ticks_ms()
+        _formats[i] = fmt
+        _arg_a[i] = a
+        _arg_b[i] = b
+        _arg_c[i] = c
+        _arg_counts[i] = 0 if a is _MISSING else 1 if b is _MISSING else 2 if c is _MISSING else 3
+
+        _head = (i + 1) % _SIZE
+        if _count == _SIZE:
+            _dropped += 1
+        else:
+            _count += 1
+
+def _debug(fmt: str, a=_MISSING, b=_MISSING, c=_MISSING) -> None:
+    _record(DEBUG, fmt, a, b, c)
+
+def _info(fmt: str, a=_MISSING, b=_MISSING, c=_MISSING) -> None:
+    _record(INFO, fmt, a, b, c)
+
+def _warning(fmt: str, a=_MISSING, b=_MISSING, c=_MISSING) -> None:
+    _record(WARNING, fmt, a, b, c)
+
+def _error(fmt: str, a=_MISSING, b=_MISSING, c=_MISSING) -> None:
+    _record(ERROR, fmt, a, b, c)
+
+def _off(fmt: str, a=None, b=None, c=None) -> None:
+    pass
+
+# Log a message at a level. fmt is a %-style format string taking up to 3 arguments, e.g.
+# Log.info("Set light %s", colour). Don't format the message before passing it in
+debug = _debug if BUILD_LEVEL <= DEBUG else _off
+info = _info if BUILD_LEVEL <= INFO else _off
+warning = _warning if BUILD_LEVEL <= WARNING else _off
+error = _error if BUILD_LEVEL <= ERROR else _off
+
+def add_sink(sink) -> None:
+    """
+        sink is called with each flushed batch of records, e.g. to publish them over MQTT.
+    """
+    _sinks.append(sink)
+
+def remove_sink(sink) -> None:
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+def _format(record: tuple) -> str:
+    # record is (ticks_ms, level, format, argument count, a, b, c), as taken out of the ring by flush()
+    ticks, record_level, fmt, n, a, b, c = record
+    try:
+        if n == 0:
+            message = fmt
+        elif n == 1:
+            message = fmt % (a,)
+        elif n == 2:
+            message = fmt % (a, b)
+        else:
+            message = fmt % (a, b, c)
+    except Exception:
+        message = f"{fmt} (bad log arguments)"
+    return f"[{ticks}] {_NAMES[record_level]} {message}"
+
+def flush() -> None:
+    """
+        Formats everything logged since the last flush and passes it to the sinks.
+    """
+    global _count, _dropped
+    if _count == 0:
+        return
+
+    # Only the records are copied out with the lock held, they are formatted once it is released, so the other core
+    # never waits on the formatting
+    records = []
+    with _lock:
+        dropped = _dropped
+        start = (_head - _count) % _SIZE
+        for n in range(_count):
+            i = (start + n) % _SIZE
+            records.append((_times[i], _levels[i], _formats[i], _arg_counts[i], _arg_a[i], _arg_b[i], _arg_c[i]))
+
+            # Let go of the arguments, so the ring doesn't keep them alive
+            _arg_a[i] = None
+            _arg_b[i] = None
+            _arg_c[i] = None
+
+        _count = 0
+        _dropped = 0
+
+    lines = [_format(record) for record in records]
+    if dropped > 0:
+        lines.insert(0, f"{dropped} log records dropped")
+    text = "\n".join(lines)
+    for sink in _sinks:
+        try:
+            sink(text)
+        except Exception:
+            pass
+
+def start(scheduler, period_ms: int) -> None:
+    """
+        Flushes the log from a low priority task every period_ms.
+    """
+    from Scheduler import PRIORITY_LOW
+    scheduler.periodic(period_ms, lambda t: flush(), "Log flush", PRIORITY_LOW)
@@ -0,0 +1,169 @@
+from array import array
+import _thread
+import gc
+import time
+
+# Both cores record metrics, so a histogram (or any other count shared between the cores) is only changed or read
+# with this held. It is only ever held for a few statements
+lock = _thread.allocate_lock()
+
+class Histogram:
+    """
+        Counts values into fixed buckets, so recording one costs a few comparisons and allocates nothing.
+        Percentiles are reported as the upper bound of the bucket they fall in.
+    """
+    def __init__(self, bounds: tuple, sample_every: int = 1) -> None:
+        # Upper bound of each bucket, the last bucket takes everything above them
+        self.bounds = bounds
+        self.counts = array('I', bytes(4 * (len(bounds) + 1)))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+        # Only record 1 in every sample_every values, to keep the cost down on hot paths
+        self.sample_every = sample_every
+        self._skip = 0
+
+    def sample(self) -> bool:
+        """
+            Whether the next value should be measured and recorded.
+        """
+        # Both cores' schedulers sample JITTER_MS, so the countdown is only moved on with the lock held
+        with lock:
+            if self._skip > 0:
+                self._skip -= 1
+                return False
+            self._skip = self.sample_every - 1
+            return True
+
+    def record(self, value: int) -> None:
+        bounds = self.bounds
+        i = 0
+        n = len(bounds)
+        while i < n and value > bounds[i]:
+            i += 1
+        with lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, pc: int) -> int:
+        """
+            The bucket bound that pc percent of the recorded values are at or below, or max for the last bucket.
+        """
+        if self.count == 0:
+            return 0
+
+        target = (self.count * pc + 99) // 100
+        seen = 0
+        for i in range(len(self.bounds)):
+            seen += self.counts[i]
+            if seen >= target:
+                return min(self.bounds[i], self.max)
+        return self.max
+
+    def reset(self) -> None:
+        with lock:
+            for i in range(len(self.counts)):
+                self.counts[i] = 0
+            self.count = 0
+            self.total = 0
+            self.max = 0
+
+# How long the dial ring takes to render and write out a frame (us)
+FRAME_US = Histogram((250, 500, 1000, 2000, 4000, 8000, 16000, 33000))
+
+# How late (ms) scheduled tasks run after they were due
+JITTER_MS = Histogram((0, 1, 2, 5, 10, 20, 50, 100, 250))
+
+# Time (ms) for a message the clock publishes to come back to it from the broker
+MQTT_RTT_MS = Histogram((5, 10, 20, 50, 100, 200, 500, 1000, 2000))
+
+# How long the collections forced by sample_memory() take (us). Automatic ones can't be timed
+GC_PAUSE_US = Histogram((500, 1000, 2000, 5000, 10000, 20000, 50000))
+
+HISTOGRAMS = {
+    "frame_us": FRAME_US,
+    "jitter_ms": JITTER_MS,
+    "mqtt_rtt_ms": MQTT_RTT_MS,
+    "gc_forced_us": GC_PAUSE_US,
+}
+
+# Heap as last sampled, and since the last snapshot how many times the heap shrank between samples (so the GC
+# ran by itself at least once) and how many collections sample_memory() forced
+mem_free = 0
+mem_alloc = 0
+gc_auto = 0
+gc_forced = 0
+
+# Run (and time) a garbage collection every time the heap is sampled. Off by default, as it changes how often
+# and when the GC runs
+collect = False
+
+def set_sample_every(sample_every: int) -> None:
+    # Only the per-frame and per-task measurements are sampled, the others are already infrequent
+    FRAME_US.sample_every = sample_every
+    JITTER_MS.sample_every = sample_every
+
+def sample_memory(t=None) -> None:
+    """
+        Records the heap, and if collect is set runs a timed garbage collection. Run it as a periodic task.
+        The heap only shrinks between samples if the GC ran by itself, which counts as one automatic collection
+        (there may have been more).
+    """
+    global mem_free, mem_alloc, gc_auto, gc_forced
+    if gc.mem_alloc() < mem_alloc:
+        gc_auto += 1
+
+    if collect:
+        start = time.ticks_us()
+        gc.collect()
+        GC_PAUSE_US.record(time.ticks_diff(time.ticks_us(), start))
+        gc_forced += 1
+
+    mem_free = gc.mem_free()
+    mem_alloc = gc.mem_alloc()
+
+def snapshot() -> dict:
+    """
+        Everything recorded since the last reset.
+    """
+    result = {
+        "mem_free": mem_free,
+        "mem_alloc": mem_alloc,
+        "gc_auto": gc_auto,
+        "gc_forced": gc_forced,
+    }
+    for name, histogram in HISTOGRAMS.items():
+        # Each histogram is read whole, so a value the other core records meanwhile can't leave its stats disagreeing
+        with lock:
+            count = histogram.count
+            total = histogram.total
+            p50 = histogram.percentile(50)
+            p99 = histogram.percentile(99)
+            maximum = histogram.max
+        result[name + "_count"] = count
+        result[name + "_avg"] = total // count if count > 0 else 0
+        result[name + "_p50"] = p50
+        result[name + "_p99"] = p99
+        result[name + "_max"] = maximum
+    return result
+
+def reset() -> None:
+    global gc_auto, gc_forced
+    for histogram in HISTOGRAMS.values():
+        histogram.reset()
+    gc_auto = 0
+    gc_forced = 0
+
+def start(scheduler, sample_ms: int, sample_every: int, collect_garbage: bool = False) -> None:
+    """
+        Samples the heap every sample_ms, and records 1 in every sample_every frames and task runs.
+    """
+    global collect
+    from Scheduler import PRIORITY_LOW
+    collect = collect_garbage
+    set_sample_every(sample_every)
+    scheduler.periodic(sample_ms, sample_memory, "Metrics", PRIORITY_LOW)
@@ -1,32 +1,156 @@
-from umqtt.simple import MQTTClient
-from Clock import Clock
-from machine import Timer
+from umqtt.simple import MQTTClient, MQTTException
+from Clock import Clock, ENTITIES
+from Scheduler import Scheduler, Task, PRIORITY_LOW, wait_readable
+import Discovery
 import json
+import time
 import RingPatterns
+import Log
+import Metrics
+from ClockSettings import ClockSettings
+
+# How long (ms) after an entity changes its state is published
+_PUBLISH_DELAY_MS = 50
+
+# How long (ms) to wait for the broker to send the retained discovery version before taking it that there isn't
+# one, and publishing the configs
+_DISCOVERY_WAIT_MS = 500
+
+# Longest (s) connecting and subscribing may wait for the broker to answer. They block whatever runs them, so a
+# broker that takes the connection but never replies mustn't hold things up for longer than this
+_NETWORK_TIMEOUT_S = 3
+
+# Where log records are published, if ClockSettings.log_mqtt is set
+_LOG_TOPIC = b"cuckoo_clock/log"
+
+def _subscribe_packet(topics) -> tuple:
+    # A SUBSCRIBE packet for all the topics at QoS 0, and where its packet id goes
+    body = bytearray(b"\0\0")
+    for topic in topics:
+        body.append(len(topic) >> 8)
+        body.append(len(topic) & 0xff)
+        body += topic
+        body.append(0)
+
+    header = bytearray(b"\x82")
+    remaining = len(body)
+    while True:
+        byte = remaining & 0x7f
+        remaining >>= 7
+        header.append(byte | 0x80 if remaining > 0 else byte)
+        if remaining == 0:
+            break
+
+    return header + body, len(header)
+
+_SUBSCRIBE_PACKET, _SUBSCRIBE_PID_OFFSET = _subscribe_packet(Discovery.SUBSCRIPTIONS)
+
+# Whether MQTTClient.connect() takes a timeout, until a connect finds that it doesn't
+_connect_takes_timeout = True
+
+def _connect(client: MQTTClient) -> None:
+    global _connect_takes_timeout
+    if _connect_takes_timeout:
+        try:
+            client.connect(timeout=_NETWORK_TIMEOUT_S)
+            return
+        except TypeError as e:
+            # Only a connect() that doesn't take the argument is retried, not a TypeError raised as it connects
+            if "keyword" not in str(e):
+                raise
+            _connect_takes_timeout = False
+            Log.warning("umqtt.simple before 1.4.0 takes no timeout, connecting to MQTT may block until the network stack gives up")
+
+    client.connect()
 
 class MqttManager: 
-    _last_dial_state: str = ""
-    _last_pendulum_light_state: str = ""
-    _last_pendulum_swing_state: str = ""
-    _last_chime_state: str = ""
-    _last_timer_state: str = ""
-    _last_light_sensor_state: str = ""
     _mqtt_client: MQTTClient = None
     is_connected: bool = False
 
-    def __init__(self, address: str, username: str, password: str, clock: Clock) -> None:
+    def __init__(self, address: str, username: str, password: str, clock: Clock, scheduler: Scheduler) -> None:
         self._address = address
         self._username = username
         self._password = password
         self._clock = clock
-
-    def _check_messages(self, t: Timer) -> None:
-        try:
-            # Poll the MQTT to process messages sent to us
-            self._mqtt_client.check_msg()
-        except:
-            print("MQTT connection lost")
-            self.stop()
+        self._scheduler = scheduler
+        self._receiveTask = None
+        self._dispatching = False
+
+        # Entities whose state has changed since it was last published, and what was last published for each
+        self._dirty = set()
+        self._published_state = {}
+        self._publishTask = None
+        self._discoveryTask = None
+        self._discovery_current = False
+        clock.set_state_listener(self._mark_dirty)
+
+        # Exact topic (as received, bytes) -> handler, so a message is dispatched with one lookup
+        self._handlers = {topic: getattr(self, name) for topic, name in Discovery.HANDLERS.items()}
+        self._handlers[Discovery.VERSION_TOPIC] = self._handle_discovery_version
+        self._handlers[Discovery.PING_TOPIC] = self._handle_ping
+        self._metricsTask = None
+
+        if ClockSettings.log_mqtt:
+            Log.add_sink(self._publish_log)
+
+        # Time (us) from a command arriving on the socket to it having been acted on
+        self._message_received_us = 0
+        self.command_latency_us_last = 0
+        self.command_latency_us_max = 0
+        self.command_latency_us_total = 0
+        self.commands = 0
+
+        # With the hardware on the other core (RemoteClock) a command is only queued here, so it is timed over
+        # there once it has been run, from the arrival time sent with it
+        self._remote_timing = hasattr(clock, "received_us")
+        if self._remote_timing:
+            clock.on_command_run = self._record_command_latency
+
+    async def _receive_messages(self, client: MQTTClient) -> None:
+        # Sleep until the broker sends us something, rather than polling for it
+        while self._mqtt_client is client:
+            await wait_readable(client.sock)
+            if self._mqtt_client is not client:
+                return
+
+            self._message_received_us = time.ticks_us()
+            self._dispatching = True
+            try:
+                client.check_msg()
+            except (OSError, MQTTException) as e:
+                Log.warning("MQTT connection lost %s", e)
+                self.stop()
+            except Exception as e:
+                # A handler bug: the message has been read in full, so the connection can carry on
+                Log.error("Message handling failed %s", e)
+            finally:
+                self._dispatching = False
+
+    def _record_command_latency(self, received_us: int = None) -> None:
+        if received_us == None:
+            received_us = self._message_received_us
+        latency = time.ticks_diff(time.ticks_us(), received_us)
+
+        # Commands run on the other core are timed there, the rest here
+        with Metrics.lock:
+            self.commands += 1
+            self.command_latency_us_last = latency
+            self.command_latency_us_total += latency
+            if latency > self.command_latency_us_max:
+                self.command_latency_us_max = latency
+
+    def get_metrics(self) -> dict:
+        with Metrics.lock:
+            commands = self.commands
+            last = self.command_latency_us_last
+            total = self.command_latency_us_total
+            maximum = self.command_latency_us_max
+        return {
+            "commands": commands,
+            "command_latency_us_last": last,
+            "command_latency_us_avg": total // commands if commands > 0 else 0,
+            "command_latency_us_max": maximum,
+        }
         
     def connect(self) -> None:
         self._mqtt_client = MQTTClient(
@@ -38,207 +162,210 @@ class MqttManager:
             ssl=False)
         
         self._mqtt_client.set_callback(self._handle_new_message)
-        self._mqtt_client.connect()
+        _connect(self._mqtt_client)
+
+        self._discovery_current = False
+        self._subscribe_all(self._mqtt_client)
 
         self.is_connected = True
 
-        # Timer to check for new message send to the clock
-        self._messageTimer = Timer(mode=Timer.PERIODIC, period=500, callback=self._check_messages)
+        # Handle messages sent to the clock as soon as they arrive
+        self._receiveTask = self._scheduler.spawn(self._receive_messages(self._mqtt_client))
 
-        # Timer to publish the state of the clock
-        self._updateStateTimer = Timer(mode=Timer.PERIODIC, period=2000, callback=self._update_state)
+        if ClockSettings.metrics_enabled and self._metricsTask == None:
+            self._metricsTask = self._scheduler.periodic(ClockSettings.metrics_publish_ms, self._publish_metrics, "MQTT metrics", PRIORITY_LOW)
 
     def stop(self) -> None:
+        # The receive loop notices the client has gone by itself, and can't be cancelled while it is the one stopping us
+        if self._receiveTask != None and not self._dispatching:
+            self._receiveTask.cancel()
+        self._receiveTask = None
+
         try:
             if self._mqtt_client is not None and self._mqtt_client.sock is not None:
                 self._mqtt_client.sock.close()
         except Exception as e:
-            print(f"Failed to close socket {e}")
+            Log.warning("Failed to close socket %s", e)
 
         self._mqtt_client = None
         self.is_connected = False
 
-        if self._messageTimer != None:
-            self._messageTimer.deinit()
-            self._messageTimer = None
-
-        if self._updateStateTimer != None:
-            self._updateStateTimer.deinit()
-            self._updateStateTimer = None
+        if self._publishTask != None:
+            self._publishTask.cancel()
+            self._publishTask = None
+
+        if self._discoveryTask != None:
+            self._discoveryTask.cancel()
+            self._discoveryTask = None
+
+        if self._metricsTask != None:
+            self._metricsTask.cancel()
+            self._metricsTask = None
+
+    def _subscribe_all(self, client: MQTTClient) -> None:
+        # umqtt.simple's subscribe() sends a packet and waits for the reply for every topic, so
+        # send one SUBSCRIBE for all of them instead
+        client.pid = (client.pid + 1) & 0xffff
+        pid = client.pid
+        _SUBSCRIBE_PACKET[_SUBSCRIBE_PID_OFFSET] = pid >> 8
+        _SUBSCRIBE_PACKET[_SUBSCRIBE_PID_OFFSET + 1] = pid & 0xff
+        client.sock.settimeout(_NETWORK_TIMEOUT_S)
+        client.sock.write(_SUBSCRIBE_PACKET)
+
+        while True:
+            # Retained messages can arrive before the SUBACK, wait_msg() passes them to the callback and returns the
+            # type of any other packet, with the rest of it still to be read. It leaves the socket blocking with no
+            # timeout after each read, so the timeout is set again every time
+            client.sock.settimeout(_NETWORK_TIMEOUT_S)
+            op = client.wait_msg()
+            if op == None:
+                continue
+
+            client.sock.settimeout(_NETWORK_TIMEOUT_S)
+            resp = client.sock.read(client._recv_len())
+            if op != 0x90 or resp[0] != pid >> 8 or resp[1] != pid & 0xff:
+                # Not the SUBACK for this SUBSCRIBE, it has been read in full so the next packet starts in step
+                continue
+
+            # Packet id, then a return code for each topic
+            for code in resp[2:]:
+                if code == 0x80:
+                    raise MQTTException(code)
+            return
 
     def publish_autoconf(self) -> None:
-        device = {}
-        device["identifiers"] = [ "cuckoo_clock" ]
-        device["name"] = "Cuckoo Clock"
-        device["manufacturer"] = "andycb"
-        device["model"] = "Cuckoo Clock"
-        device["sw_version"] = "2023.08.26"
-
-        # Pendulum swing
-        self.pendulum_swing_id = "cuckoo_clock_pendulum_swing"
-        self.pendulum_swing_topic_prefix = f"homeassistant/switch/{self.pendulum_swing_id}"
-
-        pendulum_swing_payload = {}
-        pendulum_swing_payload['name'] = 'Pendulum Swing'
-        pendulum_swing_payload['command_topic'] = f'{self.pendulum_swing_topic_prefix}/set'
-        pendulum_swing_payload['state_topic'] = f'{self.pendulum_swing_topic_prefix}/state'
-        pendulum_swing_payload['unique_id'] = self.pendulum_swing_id
-        pendulum_swing_payload["device"] = device
-        pendulum_swing_topic = f"{self.pendulum_swing_topic_prefix}/config"
-
-        self._mqtt_client.publish(pendulum_swing_topic, json.dumps(pendulum_swing_payload))
-        self._mqtt_client.subscribe(f'{self.pendulum_swing_topic_prefix}/set')
-
-        # Chime
-        self.chime_id = "cuckoo_clock_chime"
-        self.chime_topic_prefix = f"homeassistant/switch/{self.chime_id}"
-
-        chime_payload = {}
-        chime_payload['name'] = 'Chime'
-        chime_payload['command_topic'] = f'{self.chime_topic_prefix}/set'
-        chime_payload['state_topic'] = 'f{chime_topic_prefix}/state'
-        chime_payload['unique_id'] = self.chime_id
-        chime_payload["device"] = device
-
-        chime_topic = f"{self.chime_topic_prefix}/config"
-        self._mqtt_client.publish(chime_topic, json.dumps(chime_payload))
-        self._mqtt_client.subscribe(f"{self.chime_topic_prefix}/set")
-
-        # Timer
-        self.timer_id = "cuckoo_clock_timer"
-        self.timer_topic_prefix = f"homeassistant/number/{self.timer_id}"
-
-        timer_payload = {}
-        timer_payload['name'] = 'Timer'
-        timer_payload['command_topic'] = f'{self.timer_topic_prefix}/set'
-        timer_payload['state_topic'] = f'{self.timer_topic_prefix}/state'
-        timer_payload['unique_id'] = self.timer_id
-        timer_payload['unit_of_measurement'] = 'Seconds'
-        timer_payload["device"] = device
-        timer_topic = f"{self.timer_topic_prefix}/config"
-        self._mqtt_client.publish(timer_topic, json.dumps(timer_payload))
-        self._mqtt_client.subscribe(f"{self.timer_topic_prefix}/set")
-
-        # Pendulum Light
-        self.pendulum_light_id = "cuckoo_clock_pendulum_light"
-        self.pendulum_light_topic_prefix = f"homeassistant/light/{self.pendulum_light_id}"
-
-        pendulum_light_payload = {}
-        pendulum_light_payload['name'] = 'Pendulum Light'
-        pendulum_light_payload['command_topic'] = f'{self.pendulum_light_topic_prefix}/set'
-        pendulum_light_payload['state_topic'] = f'{self.pendulum_light_topic_prefix}/state'
-        pendulum_light_payload['unique_id'] = self.pendulum_light_topic_prefix
-        pendulum_light_payload['effect'] = 'true'
-        pendulum_light_payload['supported_color_modes'] = 'rgb'
-        pendulum_light_payload['effect_list'] = 'breathe'
-        pendulum_light_payload['schema'] = 'json'
-        pendulum_light_payload['color_mode'] = 'true'
-        pendulum_light_payload["device"] = device
-        pendulum_loght_topic = f"{self.pendulum_light_topic_prefix}/config"
-
-        self._mqtt_client.publish(pendulum_loght_topic, json.dumps(pendulum_light_payload))        
-        self._mqtt_client.subscribe(f"{self.pendulum_light_topic_prefix}/set")
-
-        # Dial
-        self.dial_id = "cuckoo_clock_dial"
-        self.dial_topic_prefix = f"homeassistant/light/{self.dial_id}"
-
-        dial_light_payload = {}
-        dial_light_payload['name'] = 'Dial Colour'
-        dial_light_payload['command_topic'] = f'{self.dial_topic_prefix}/set'
-        dial_light_payload['state_topic'] = f'{self.dial_topic_prefix}/state'
-        dial_light_payload['unique_id'] = self.dial_id
-        dial_light_payload['effect'] = 'true'
-        dial_light_payload['supported_color_modes'] = 'rgb'
-        dial_light_payload['effect_list'] = ['AlertPattern', 'ErrorPattern', 'CurrentTimePattern']
-        dial_light_payload['schema'] = 'json'
-        dial_light_payload['color_mode'] = 'true'
-        dial_light_payload["device"] = device
-        dial_light_topic = f"{self.dial_topic_prefix}/config"
-
-        self._mqtt_client.publish(dial_light_topic, json.dumps(dial_light_payload))        
-        self._mqtt_client.subscribe(f"{self.dial_topic_prefix}/set")
-
-        # Light Sensor
-        self.light_sensor_id = "cuckoo_clock_brightness"
-        self.light_sensor_topic_prefix = f"homeassistant/sensor/{self.light_sensor_id}"
-
-        light_sensor_payload = {}
-        light_sensor_payload['name'] = 'Light Level'
-        light_sensor_payload['command_topic'] = f'{self.light_sensor_topic_prefix}/set'
-        light_sensor_payload['state_topic'] = f'{self.light_sensor_topic_prefix}/state'
-        light_sensor_payload['unique_id'] = self.light_sensor_id
-        light_sensor_payload["device"] = device
-        light_sensor_topic = f"{self.light_sensor_topic_prefix}/config"
-
-        self._mqtt_client.publish(light_sensor_topic, json.dumps(light_sensor_payload))   
-    
-    def _update_state(self, t: Timer) -> None:
+        # The broker almost always still has our configs, so publish the state straight away rather than waiting to
+        # find out
+        self._publish_all_state()
+        if self._discovery_current:
+            return
+
+        # The broker sends the retained version just after the SUBACK, and the configs are only published if it
+        # turns out to be different (see _handle_discovery_version) or doesn't come at all. A ping sent now comes
+        # back after it, so if the ping comes back first there is no version (see _handle_ping). In case the
+        # ping is lost, give up waiting after _DISCOVERY_WAIT_MS anyway
+        self._discoveryTask = self._scheduler.once(_DISCOVERY_WAIT_MS, self._publish_discovery, "MQTT discovery", PRIORITY_LOW)
+        self._safe_publish(Discovery.PING_TOPIC, str(time.ticks_ms()))
+
+    def _publish_discovery(self, t: Task) -> None:
+        if self._discoveryTask != None:
+            self._discoveryTask.cancel()
+            self._discoveryTask = None
+        if not self.is_connected or self._discovery_current:
+            return
+
+        Log.info("Publishing discovery configs")
+        try:
+            for topic, payload in Discovery.CONFIGS:
+                self._mqtt_client.publish(topic, payload, True)
+            self._mqtt_client.publish(Discovery.VERSION_TOPIC, Discovery.VERSION, True)
+        except Exception as e:
+            Log.error("Failed to publish discovery configs %s", e)
+            self.stop()
+            return
+        self._discovery_current = True
+
+        # Home Assistant only listens for state once it has the config, so send it all again
+        self._publish_all_state()
+
+    def _publish_all_state(self) -> None:
+        # The broker may have lost what we last told it, so publish the whole state again
+        self._published_state = {}
+        for entity in ENTITIES:
+            self._mark_dirty(entity)
+
+    def _mark_dirty(self, entity: str) -> None:
+        self._dirty.add(entity)
+
+        # Publish a little while after the first change, so a burst of changes goes out together
+        if self._publishTask == None:
+            self._publishTask = self._scheduler.once(_PUBLISH_DELAY_MS, self._publish_dirty, "MQTT state", PRIORITY_LOW)
+
+    def _publish_dirty(self, t: Task) -> None:
+        self._publishTask = None
+
+        # Keep the changes until we can send them, everything is republished once we're connected
         if self.is_connected == False:
             return
-        
-        state = self._clock.get_state()
-
-        pendulum_light_state = state["pendulum_light"]
-        if pendulum_light_state != self._last_pendulum_light_state:
-            print("Updating pendulum light")
-            if self._safe_publish(f'{self.pendulum_light_topic_prefix}/state', pendulum_light_state):
-                self._last_pendulum_light_state = pendulum_light_state
-
-        pendulum_swing_state = state["pendulum_swing"]
-        if pendulum_swing_state != self._last_pendulum_swing_state:
-            print("Updating pendulum swing")
-            if self._safe_publish(f'{self.pendulum_swing_topic_prefix}/state', pendulum_swing_state):
-                self._last_pendulum_swing_state = pendulum_swing_state
-
-        dial_state = state["dial"]
-        if dial_state != self._last_dial_state:
-            print(f"Updating dial {dial_state}")
-            if self._safe_publish(f'{self.dial_topic_prefix}/state', dial_state):
-                self._last_dial_state = dial_state
-
-        #light_level_state = state["light_level"]
-        #if light_level_state != self._last_light_sensor_state:
-            #print(f"Updating light level {light_level_state}")
-            #if self._safe_publish(f'{self.light_sensor_topic_prefix}/state', light_level_state):
-            #    self._last_light_sensor_state = light_level_state
-
-        chime_state = state["chime"]
-        if chime_state != self._last_chime_state:
-            print("Updating chime")
-            if self._safe_publish(f'{self.chime_topic_prefix}/state', chime_state):
-                self._last_chime_state = chime_state
+
+        while len(self._dirty) > 0:
+            entity = self._dirty.pop()
+            state = self._clock.get_entity_state(entity)
+            if state == self._published_state.get(entity):
+                continue
+
+            Log.debug("Updating %s", entity)
+            if not self._safe_publish(Discovery.STATE_TOPICS[entity], state):
+                self._dirty.add(entity)
+                return
+            self._published_state[entity] = state
 
     def _handle_new_message(self, topic, message) -> None:
-        topic = bytes.decode(topic)
-        message = bytes.decode(message)
+        handler = self._handlers.get(topic)
+        if handler == None:
+            Log.warning("No handler for topic %s", topic)
+            return
 
-        print(f"Topic '{topic}' recived message: {message}")
+        # Only commands picked up by the receive loop have an arrival time. Retained messages read while subscribing,
+        # and the clock's own ping and discovery version, aren't commands
+        command = self._dispatching and topic in Discovery.HANDLERS
+        if command and self._remote_timing:
+            self._clock.received_us = self._message_received_us
 
-        if topic.startswith(self.pendulum_light_topic_prefix):
-            self._handle_pendulum_light_message(message)                
-        
-        elif topic.startswith(self.pendulum_swing_topic_prefix):
-            self._handle_pendulum_swing_message(message)
-        
-        elif topic.startswith(self.timer_topic_prefix):
-            self._clock.set_timer(int(message))
-    
-        if topic.startswith(self.chime_topic_prefix):
-            self._handle_chime_message(message)
-        
-        if topic.startswith(self.dial_topic_prefix):
-            self._handle_dial_messafe(message)
+        try:
+            handler(message)
+        except (ValueError, KeyError) as e:
+            # A malformed command is dropped, the connection is fine
+            Log.warning("Bad message on %s: %s", topic, e)
+            if command and self._remote_timing:
+                self._clock.received_us = None
+            return
+
+        if command:
+            if self._remote_timing:
+                if self._clock.received_us == None:
+                    # Sent on to the other core, which times it
+                    return
+                self._clock.received_us = None
+            self._record_command_latency()
+
+    def _publish_metrics(self, t: Task) -> None:
+        if not self.is_connected:
+            return
+
+        # Each publish covers the time since the last one
+        if self._safe_publish(Discovery.METRICS_TOPIC, json.dumps(Metrics.snapshot())):
+            Metrics.reset()
 
-    def _handle_pendulum_light_message(self, message: str) -> None:
+        # Time a message going to the broker and back, it's recorded when it arrives
+        self._safe_publish(Discovery.PING_TOPIC, str(time.ticks_ms()))
+
+    def _handle_ping(self, message: bytes) -> None:
+        Metrics.MQTT_RTT_MS.record(time.ticks_diff(time.ticks_ms(), int(message)))
+
+        # Still waiting for the discovery version after a ping sent after subscribing: the broker has none
+        if self._discoveryTask != None:
+            self._publish_discovery(None)
+
+    def _handle_discovery_version(self, message: bytes) -> None:
+        self._discovery_current = message == Discovery.VERSION
+        if self._discoveryTask == None:
+            return
+
+        if self._discovery_current:
+            # The broker has our configs, so there is nothing more to do
+            Log.info("Discovery configs are current")
+            self._discoveryTask.cancel()
+            self._discoveryTask = None
+        else:
+            self._publish_discovery(None)
+
+    def _handle_pendulum_light_message(self, message: bytes) -> None:
         state = json.loads(message)
         if state["state"] == "OFF":
             self._clock.set_pendulum_light(0, 0, 0, False, 0)
         else:
-            breate  = False
-            if "effect" in state:
-                if state["effect"] == "breathe":
-                    breate = True
+            breate = "effect" in state and state["effect"] == "breathe"
            
             if "color" in state:
                 # If a colour was gven, use it
@@ -247,47 +374,53 @@ class MqttManager:
                 # Else, use a medium brightness white colour
                 self._clock.set_pendulum_light(150, 150, 150, breate, 0)
 
+    def _handle_pendulum_swing_message(self, message: bytes) -> None:
+        self._clock.swing_pendulum(message != b"OFF", 0)
 
-    def _handle_pendulum_swing_message(self, message: str) -> None:
-        if message == "OFF":
-            self._clock.swing_pendulum(False, 0)
-        else:
-            self._clock.swing_pendulum(True, 0)
+    def _handle_timer_message(self, message: bytes) -> None:
+        self._clock.set_timer(int(message))
 
-    def _handle_chime_message(self, message: str) -> None:
-        if message == "ON":
+    def _handle_chime_message(self, message: bytes) -> None:
+        if message == b"ON":
             self._clock.chime()
-        return
     
-    def _handle_dial_messafe(self, message: str) -> None: 
+    def _handle_dial_message(self, message: bytes) -> None: 
         state = json.loads(message)
         if state["state"] == "OFF":
             self._clock.set_dial_light(0,0,0, None )
         else:
             pattern = None
             if "effect" in state:
-                s = state["effect"]
-                if s == "ErrorPattern":
-                    pattern = RingPatterns.ErrorPattern()
-                if s == "AlertPattern":
-                    pattern = RingPatterns.AlertPattern()
-                if s == "CurrentTimePattern":
-                    pattern = RingPatterns.CurrentTimePattern()
+                factory = RingPatterns.EFFECTS.get(state["effect"])
+                if factory != None:
+                    pattern = factory()
 
             if "color" in state:
                 self._clock.set_dial_light(state["color"]["r"], state["color"]["g"], state["color"]["b"], pattern)
             else:
                 self._clock.set_dial_light(150, 150, 150, pattern)
 
+    def _handle_schedule_message(self, message: bytes) -> None:
+        # A bad schedule is logged and the current one kept
+        try:
+            self._clock.set_schedule(json.loads(message))
+        except Exception as e:
+            Log.warning("Invalid schedule %s", e)
+
+    def _publish_log(self, text: str) -> None:
+        # Logs written while disconnected only go to the serial console
+        if self.is_connected:
+            self._safe_publish(_LOG_TOPIC, text)
+
     def _safe_publish(self, topic: str, data: str) -> bool:
         if not self.is_connected:
-            print(f"Cannot publish MQTT data while disconnected")
+            Log.warning("Cannot publish MQTT data while disconnected")
             return False
         
         try:
             self._mqtt_client.publish(topic, data)
             return True
         except Exception as e:
-            print(f"Got error publishing MQTT data")
+            Log.error("Got error publishing MQTT data %s", e)
             self.stop()
             return False
\ No newline at end of file
@@ -1,11 +1,24 @@
-from machine import Pin, Timer, PWM
+from machine import Pin, PWM
+from Scheduler import Scheduler, Task, PRIORITY_NORMAL
+from ColourPipeline import PENDULUM, RED, GREEN, BLUE
+from Breathing import build_breathe_table
+import Log
+
+# How often (ms) the breathing light changes brightness
+_BREATHE_TICK_MS = 33
+
+# Map 0-255 channel values to PWM duty for each LED
+_RED_DUTY = PENDULUM.duty_table(RED)
+_GREEN_DUTY = PENDULUM.duty_table(GREEN)
+_BLUE_DUTY = PENDULUM.duty_table(BLUE)
 
 class Pendulum:
     """
         Represents the clock's pendulum 
     """
 
-    def __init__(self, redPin: int, greenPin: int, BluePin: int, swingPin: int) -> None:
+    def __init__(self, redPin: int, greenPin: int, BluePin: int, swingPin: int, scheduler: Scheduler) -> None:
+        self._scheduler = scheduler
         self.green = PWM(Pin(greenPin))
         self.blue = PWM(Pin(BluePin))
         self.red = PWM(Pin(redPin))
@@ -13,10 +26,21 @@ class Pendulum:
         
         self._lightTimer = None
         self._swingTimer = None
+        self._breatheTimer = None
 
-        self._targetLight = (0,0,0)
         self._lightStopTime = 0
-        self._breath_up = True
+
+        # How long (ms) one breath takes, and the shape of it (see Breathing.EASINGS)
+        self.breathe_period = 6000
+        self.breathe_easing = "sine"
+
+        # The current breathe cycle and what it was built for, so setting the same light again doesn't rebuild it
+        self._breatheTable = None
+        self._breatheKey = None
+        self._breatheIndex = 0
+
+        # Called with "pendulum_light" or "pendulum_swing" whenever that part of the state changes
+        self.on_change = None
 
         self.red.freq(1000)
         self.green.freq(1000)
@@ -32,6 +56,10 @@ class Pendulum:
             }
         }
 
+    def _changed(self, entity: str) -> None:
+        if self.on_change != None:
+            self.on_change(entity)
+
     def _reset_state(self):
         self._currentState["state"] = "OFF"
         self._currentState["effect"] = ""
@@ -51,66 +79,82 @@ class Pendulum:
     def start_swing(self, duration_secs: int) -> None:
         self.swing.value(1)
 
+        if self._swingTimer != None:
+            self._swingTimer.cancel()
+            self._swingTimer = None
+
         if duration_secs > 0:
-            # Set a timer to stop the pendulum swinging again
-            self._swingTimer = Timer(mode=Timer.ONE_SHOT, period=1000, callback=self._swing_timer_callback)
+            # Set a timer to stop the pendulum swinging again
+            self._swingTimer = self._scheduler.once(duration_secs * 1000, self._swing_timer_callback, "Pendulum swing")
+
+        self._changed("pendulum_swing")
 
     def stop_swing(self) -> None:
         self.swing.value(0)
         if self._swingTimer != None:
-            self._swingTimer.deinit()
+            self._swingTimer.cancel()
+            self._swingTimer = None
 
-    def _swing_timer_callback(self, t: Timer) -> None:
+        self._changed("pendulum_swing")
+
+    def _swing_timer_callback(self, t: Task) -> None:
         self.stop_swing()
 
-    def _light_timer_callback(self, t: Timer) -> None:
+    def _stop_breathing(self) -> None:
+        if self._breatheTimer != None:
+            self._breatheTimer.cancel()
+            self._breatheTimer = None
+
+    def _light_timer_callback(self, t: Task) -> None:
         # Time to turn off the light, reset everything
-        self._targetLight = (0, 0, 0)
+        self._lightTimer = None
+        self._stop_breathing()
 
         self.red.duty_u16(0)
         self.green.duty_u16(0)
         self.blue.duty_u16(0)
 
         self._reset_state()
-
-        if self._breatheTimer != None:
-            self._breatheTimer.deinit()
+        self._changed("pendulum_light")
 
     def set_light_off(self) -> None:
         if (self._lightTimer != None):
-            self._lightTimer.deinit()
+            self._lightTimer.cancel()
+            self._lightTimer = None
         
-        self._targetLight = (0, 0, 0)
+        self._stop_breathing()
 
         self.red.duty_u16(0)
         self.green.duty_u16(0)
         self.blue.duty_u16(0)
 
         self._reset_state()
-        
+        self._changed("pendulum_light")
 
     def set_light(self, red: int, green: int, blue: int, breathe: bool, duration_secs: int) -> None:
-        if(green > 0 and blue > 0):
-            # The red LED is about a theird brighter the teh blue ans green ones, so
-            # if we're blending colours together, scale down the red value to match the others
-            redScaled = red * 0.6
-        else:
-            redScaled = red
-
-        red_duty = (int)((redScaled / 255) * 65025) if redScaled > 0 else 0
-        green_duty = (int)((green / 255) * 65025) if green > 0 else 0
-        blue_duty = (int)((blue / 255) * 65025) if blue > 0 else 0
+        red_duty = _RED_DUTY[red]
+        green_duty = _GREEN_DUTY[green]
+        blue_duty = _BLUE_DUTY[blue]
 
-        print(f"Set Light ({redScaled},{green},{blue}) / ({red_duty}, {green_duty}, {blue_duty})")
+        Log.debug("Set Light (%s,%s,%s)", red, green, blue)
 
-        self._targetLight = (red_duty, green_duty, blue_duty)
+        # Only ever have one breathe and one light off timer running
+        self._stop_breathing()
+        if (self._lightTimer != None):
+            self._lightTimer.cancel()
+            self._lightTimer = None
 
         if breathe == True:
             # If set the breathe, set a timer to fade the light up ad down rhythmically
-            self.red.duty_u16(0)
-            self.green.duty_u16(0)
-            self.blue.duty_u16(0)
-            self._breatheTimer = Timer(mode=Timer.PERIODIC, period=33, callback=self._breath_cycle)
+            key = (red_duty, green_duty, blue_duty, self.breathe_period, self.breathe_easing)
+            if key != self._breatheKey:
+                self._breatheTable = build_breathe_table(red_duty, green_duty, blue_duty, self.breathe_period, _BREATHE_TICK_MS, self.breathe_easing)
+                self._breatheKey = key
+
+            # Start the breath from off
+            self._breatheIndex = 0
+            self._breath_cycle(None)
+            self._breatheTimer = self._scheduler.periodic(_BREATHE_TICK_MS, self._breath_cycle, "Pendulum breathe", PRIORITY_NORMAL)
             
         else:
             self.red.duty_u16(red_duty)
@@ -119,49 +163,22 @@ class Pendulum:
         
         if (duration_secs > 0):
             # Create a timer to turn the light back off again
-            self._lightTimer = Timer(mode=Timer.ONE_SHOT, period=duration_secs * 1000, callback=self._light_timer_callback)
+            self._lightTimer = self._scheduler.once(duration_secs * 1000, self._light_timer_callback, "Pendulum light")
 
         self._currentState["state"] = "ON"
         self._currentState["effect"] = "brethe" if breathe else ""
         self._currentState["color"]["r"] = red
         self._currentState["color"]["g"] = green
         self._currentState["color"]["b"] = blue
-
-    def _breath_cycle(self, t: Timer) -> None:
-        current_red = self.red.duty_u16()
-        current_green = self.green.duty_u16()
-        current_blue = self.blue.duty_u16()
-
-        target_red = self._targetLight[0]
-        target_green = self._targetLight[1]
-        target_blue = self._targetLight[2]
-
-        step = (int)(65025 / 100)
-
-        new_red = current_red
-        new_blue = current_blue
-        new_green = current_green
-        if self._breath_up:
-            if (current_red < target_red):
-               new_red = min(int(current_red + step * 0.6), 65025)
-            if (current_blue < target_blue):
-                new_blue = min(current_blue + step, 65025)
-            if (current_green < target_green):
-               new_green = min(current_green + step, 65025)
-
-            if new_red >= target_red and new_green >= target_green and new_blue >= target_blue:
-                self._breath_up = False
-        else:
-            if (current_red > 0):
-               new_red = max(int(current_red - step * 0.6), 0)
-            if (current_blue > 0):
-                new_blue = max(current_blue - step, 0)
-            if (current_green > 0):
-               new_green = max(current_green - step, 0)
-
-            if new_red <= 0 and new_green <= 0 and new_blue <= 0:
-                self._breath_up = True
-
-        self.red.duty_u16(new_red)
-        self.green.duty_u16(new_green)
-        self.blue.duty_u16(new_blue)
\ No newline at end of file
+        self._changed("pendulum_light")
+
+    def _breath_cycle(self, t: Task) -> None:
+        # Everything was worked out up front, so a tick is just the next row of the table
+        table = self._breatheTable
+        i = self._breatheIndex
+        self.red.duty_u16(table[i])
+        self.green.duty_u16(table[i + 1])
+        self.blue.duty_u16(table[i + 2])
+
+        i += 3
+        self._breatheIndex = 0 if i >= len(table) else i
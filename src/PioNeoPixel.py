@@ -0,0 +1,106 @@
+from machine import Pin
+import rp2
+import time
+
+# WS2812 bits are sent at 800 kHz, and each takes T1 + T2 + T3 cycles of _ws2812
+_BIT_FREQ = 800_000
+_CYCLES_PER_BIT = 10
+
+# Time to shift one byte out, and how long the line has to be held low after a frame for the LEDs to latch it
+# (at least 280 us on current WS2812 parts)
+_BYTE_US = 8 * 1_000_000 // _BIT_FREQ
+_LATCH_US = 300
+
+# Base address of each PIO block, and the offset of state machine 0's TX FIFO within it
+_PIO_BASE = (0x50200000, 0x50300000)
+_TXF0 = 0x010
+
+# DREQ for state machine 0's TX FIFO on each PIO block
+_PIO_TX_DREQ = (0, 8)
+
+# Pull a byte at a time (DMA writes each byte replicated across the FIFO word) and shift it out MSB first.
+# A 1 is high for T1 + T2 cycles and a 0 for T1. asm_pio runs this with only the PIO names as globals,
+# so the timings have to be locals
+@rp2.asm_pio(sideset_init=rp2.PIO.OUT_LOW, out_shiftdir=rp2.PIO.SHIFT_LEFT, autopull=True, pull_thresh=8)
+def _ws2812():
+    T1 = 2
+    T2 = 5
+    T3 = 3
+    wrap_target()
+    label("bitloop")
+    out(x, 1)               .side(0)    [T3 - 1]
+    jmp(not_x, "do_zero")   .side(1)    [T1 - 1]
+    jmp("bitloop")          .side(1)    [T2 - 1]
+    label("do_zero")
+    nop()                   .side(0)    [T2 - 1]
+    wrap()
+
+class PioNeoPixel:
+    """
+        Drives a strip of WS2812 LEDs from a PIO state machine fed by DMA, so write() returns straight away instead of
+        bit-banging the whole frame. Has the same buf / write() / fill() interface as neopixel.NeoPixel.
+    """
+
+    def __init__(self, pin: Pin, n: int, sm_id: int = 0) -> None:
+        self.n = n
+
+        # buf is drawn into while the DMA sends the other buffer, write() swaps them over
+        self.buf = bytearray(n * 3)
+        self._sending = bytearray(n * 3)
+
+        self._sm = rp2.StateMachine(sm_id, _ws2812, freq=_BIT_FREQ * _CYCLES_PER_BIT, sideset_base=pin)
+        self._sm.active(1)
+
+        pio = sm_id // 4
+        self._fifo = _PIO_BASE[pio] + _TXF0 + 4 * (sm_id % 4)
+        self._dma = rp2.DMA()
+        self._ctrl = self._dma.pack_ctrl(size=0, inc_write=False, treq_sel=_PIO_TX_DREQ[pio] + sm_id % 4)
+
+        # ticks_us when the last frame will have gone out and been latched, so the next one can start
+        self._latchedAt = time.ticks_us()
+
+    def __len__(self) -> int:
+        return self.n
+
+    def fill(self, value) -> None:
+        r, g, b = value
+        buf = self.buf
+        for i in range(0, len(buf), 3):
+            buf[i] = g
+            buf[i + 1] = r
+            buf[i + 2] = b
+
+    def busy(self) -> bool:
+        return self._dma.active() or self._sm.tx_fifo() > 0 or time.ticks_diff(self._latchedAt, time.ticks_us()) > 0
+
+    def _wait_latched(self) -> None:
+        # The DMA is done once the last byte is in the FIFO, which then still has to be shifted out
+        while self._dma.active():
+            pass
+        if self._sm.tx_fifo() > 0:
+            while self._sm.tx_fifo() > 0:
+                pass
+            self._latchedAt = time.ticks_add(time.ticks_us(), _BYTE_US + _LATCH_US)
+
+        # A frame sent before the line has been low for the latch time runs on from the last one, and is lost
+        remaining = time.ticks_diff(self._latchedAt, time.ticks_us())
+        if remaining > 0:
+            time.sleep_us(remaining)
+
+    def write(self) -> None:
+        # The last frame has normally gone long before the next one is ready (60 bytes take under 1 ms), but
+        # e.g. a clear() followed straight away by a pattern's first frame has to wait for it to latch
+        self._wait_latched()
+
+        self.buf, self._sending = self._sending, self.buf
+        count = len(self._sending)
+        self._dma.config(read=self._sending, write=self._fifo, count=count, ctrl=self._ctrl, trigger=True)
+        self._latchedAt = time.ticks_add(time.ticks_us(), count * _BYTE_US + _LATCH_US)
+
+        # Keep buf holding the frame that is showing, like neopixel.NeoPixel, for callers that only change part of it
+        self.buf[:] = self._sending
+
+    def deinit(self) -> None:
+        self._wait_latched()
+        self._dma.close()
+        self._sm.active(0)
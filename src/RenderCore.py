@@ -0,0 +1,220 @@
+import _thread
+import time
+from Clock import Clock, ENTITIES
+from CoreLink import CommandRing, Snapshot, Doorbell
+from Scheduler import Scheduler, thread_safe_flag
+import Log
+
+# Commands that can be waiting for the render core
+_RING_SIZE = 32
+
+# The longest the render core sleeps for when it has no tasks. A command wakes it straight away
+_IDLE_MS = 1000
+
+# Stack for the render core's thread
+_STACK_BYTES = 8192
+
+class RenderCore:
+    """
+        Runs the clock's hardware (dial frames, the pendulum, the chime) on the Pico's second core, with its own
+        scheduler, so nothing the network does on the first core can hold up a frame.
+        The first core sends it commands through a CommandRing, ringing a Doorbell to wake it, and reads its state
+        from a Snapshot, which sets a ThreadSafeFlag when it changes. Nothing else is shared between them, apart
+        from the log and the metrics, which each have a lock of their own.
+    """
+    def __init__(self) -> None:
+        self.scheduler = Scheduler()
+        self.clock = Clock(self.scheduler)
+        self.commands = CommandRing(_RING_SIZE)
+        self.snapshot = Snapshot(ENTITIES)
+        self.running = False
+
+        # Rung by the first core after it pushes a command, so this core sleeps until then or its next task is due
+        self.doorbell = Doorbell()
+
+        # Set whenever a new snapshot is published, waking the first core to pass the changes on
+        self.state_changed = thread_safe_flag()
+
+        # Called on this core with the ticks_us a command arrived at, once it has been run
+        self.on_command_run = None
+
+        # Entities whose state has changed since the snapshot was last published
+        self._dirty = [True] * len(ENTITIES)
+        self._anyDirty = True
+        self.clock.set_state_listener(self._changed)
+        self._publish()
+
+    def start(self) -> None:
+        self.running = True
+        _thread.stack_size(_STACK_BYTES)
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self) -> None:
+        self.running = False
+
+    def _run(self) -> None:
+        while self.running:
+            self.doorbell.wait(self.step())
+
+    def step(self) -> int:
+        """
+            Runs the commands that are waiting, then the tasks that are due, then publishes any state that changed.
+            Returns how long (ms) the core can sleep for, unless the doorbell rings.
+        """
+        commands = self.commands
+        command = commands.pop()
+        while command != None:
+            self._dispatch(command)
+            command = commands.pop()
+
+        delay = self.scheduler.run_pending()
+
+        if self._anyDirty:
+            self._publish()
+
+        if delay == None:
+            return _IDLE_MS
+        return max(0, min(_IDLE_MS, delay))
+
+    def _dispatch(self, command: tuple) -> None:
+        name, args, received_us = command
+        try:
+            if name == "time_changed" and len(args) > 0:
+                self._time_changed(*args)
+            else:
+                getattr(self.clock, name)(*args)
+        except Exception as e:
+            Log.error("Render command %s failed: %s", name, e)
+
+        # A command from Home Assistant is timed from when it arrived on the other core to now, when it has been run
+        if received_us != None and self.on_command_run != None:
+            self.on_command_run(received_us)
+
+    def _time_changed(self, base_ms: int, base_ticks: int) -> None:
+        # The time comes over as the unix ms at a ticks_ms, and is carried on from there with ticks_ms, which both
+        # cores share. It is sent again every time the RTC is set, so the crystal's drift never builds up
+        self.clock.time_changed(lambda: base_ms + time.ticks_diff(time.ticks_ms(), base_ticks))
+
+    def _changed(self, entity: str) -> None:
+        # Called in the middle of whatever changed the state, so just note it, it is published after the tasks have run
+        self._dirty[ENTITIES.index(entity)] = True
+        self._anyDirty = True
+
+    def _publish(self) -> None:
+        self._anyDirty = False
+        snapshot = self.snapshot
+        snapshot.begin()
+        dirty = self._dirty
+        for i in range(len(ENTITIES)):
+            if dirty[i]:
+                dirty[i] = False
+                snapshot.set(i, self.clock.get_entity_state(ENTITIES[i]))
+        snapshot.publish()
+        self.state_changed.set()
+
+class RemoteClock:
+    """
+        Stands in for Clock on the network core, with the same methods: each call is sent to the RenderCore as a
+        command, and state is read from its snapshot.
+    """
+    def __init__(self, scheduler: Scheduler) -> None:
+        self._core = RenderCore()
+        self._listener = None
+
+        # The ticks_us the command being handled arrived at, sent with the first call it makes (see MqttManager)
+        self.received_us = None
+
+        # The snapshot sequence and the version of each entity last seen
+        self._sequence = -1
+        self._seen = [0] * len(ENTITIES)
+        self._versions = [0] * len(ENTITIES)
+
+        self._core.start()
+        scheduler.spawn(self._watch())
+
+    @property
+    def on_command_run(self):
+        return self._core.on_command_run
+
+    @on_command_run.setter
+    def on_command_run(self, callback) -> None:
+        self._core.on_command_run = callback
+
+    def _send(self, name: str, *args) -> None:
+        received = self.received_us
+        self.received_us = None
+        if not self._core.commands.push((name, args, received)):
+            Log.warning("Render command queue full, dropped %s", name)
+        self._core.doorbell.ring()
+
+    def reset(self) -> None:
+        self._send("reset")
+
+    def clear_ring_pattern(self) -> None:
+        self._send("clear_ring_pattern")
+
+    def show_waiting(self) -> None:
+        self._send("show_waiting")
+
+    def show_boot_error(self) -> None:
+        self._send("show_boot_error")
+
+    def set_pendulum_light(self, red, green, blue, breathe, duration_secs) -> None:
+        self._send("set_pendulum_light", red, green, blue, breathe, duration_secs)
+
+    def set_dial_light(self, red, green, blue, pattern) -> None:
+        self._send("set_dial_light", red, green, blue, pattern)
+
+    def swing_pendulum(self, swing, time) -> None:
+        self._send("swing_pendulum", swing, time)
+
+    def set_timer(self, seconds) -> None:
+        self._send("set_timer", seconds)
+
+    def chime(self, count: int = 1) -> None:
+        self._send("chime", count)
+
+    def show_dial_effect(self, effect: str) -> None:
+        self._send("show_dial_effect", effect)
+
+    def set_schedule(self, config: dict) -> None:
+        """
+            Replaces the chime schedule. It is checked on the render core, which logs it if it isn't valid.
+        """
+        self._send("set_schedule", config)
+
+    def time_changed(self, now_ms=None) -> None:
+        if now_ms == None:
+            self._send("time_changed")
+        else:
+            ticks = time.ticks_ms()
+            self._send("time_changed", now_ms(), ticks)
+
+    def set_state_listener(self, listener) -> None:
+        """
+            listener is called with the name of an entity (e.g. "dial") whenever its state changes, on this core.
+        """
+        self._listener = listener
+
+    def get_entity_state(self, entity: str) -> str:
+        return self._core.snapshot.read(ENTITIES.index(entity))
+
+    async def _watch(self) -> None:
+        # Passes state changes on as soon as the render core publishes them
+        while True:
+            await self._core.state_changed.wait()
+            self._changed()
+
+    def _changed(self) -> None:
+        snapshot = self._core.snapshot
+        if snapshot.sequence == self._sequence:
+            return
+
+        versions = self._versions
+        self._sequence = snapshot.read_versions(versions)
+        seen = self._seen
+        for i in range(len(ENTITIES)):
+            if versions[i] != seen[i]:
+                seen[i] = versions[i]
+                if self._listener != None:
+                    self._listener(ENTITIES[i])
@@ -1,231 +1,271 @@
 import time
 
-from machine import Timer, RTC
-import math
+from machine import RTC
+from Scheduler import Scheduler
 from Colour import Colour
+from Animation import Animation, Player
+import Log
+
+_BLACK = Colour.of(0, 0, 0)
 
 class BasePattern():
     """
         BAse class for patterns that can be shown on the dial ring
     """
-    def start(self) -> None:
+    # Bumped whenever the pattern's output changes, the dial ring won't redraw a pattern whose version hasn't moved on
+    version = 0
+
+    # How often (ms) the dial ring needs to check for a new frame. Animated patterns run at 30 FPS,
+    # patterns that rarely change can ask for a slower refresh
+    refresh_period = 33
+
+    @property
+    def name(self) -> str:
+        # Reported to Home Assistant as the dial's effect
+        return type(self).__name__
+
+    def start(self, scheduler: Scheduler) -> None:
         pass
 
     def stop(self) -> None:
         pass
 
-    def show(self) -> list:
-        return []
+    def render(self, buf: bytearray) -> bool:
+        """
+            Writes the current frame into buf (GRB, 3 bytes per LED). Returns False once the pattern has finished.
+            This is called from the dial ring's refresh timer, so it must not allocate.
+        """
+        _BLACK.fill_grb(buf)
+        return True
 
 class SolidPattern(BasePattern):
     """
         A solid light of a given colour with no animation
     """
+    refresh_period = 500
+
     def __init__(self, colour):
          self._colour = colour
 
-    def start(self) -> None:
+    def start(self, scheduler: Scheduler) -> None:
         pass
     
     def stop(self) -> None:
         pass
 
-    def show(self) -> list:
-        return [self._colour] * 20
+    def render(self, buf: bytearray) -> bool:
+        self._colour.fill_grb(buf)
+        return True
 
-class ErrorPattern(BasePattern):
-    """
-        A counter-clockwise rotating ring os red lights, shown with the clock has an error.
-    """
-    def __init__(self):
-        self._current = 19
-        self._array = [Colour(0,0,0)] * 20
-        
-    def start(self):
-        self._timer = Timer(mode=Timer.PERIODIC, period=200, callback=self._callback)
-
-    def stop(self):
-        if self._timer != None:
-            self._timer.deinit()
-            self._timer = None
+def _linear(value: int) -> int:
+    # The value that comes out of the dial ring's gamma correction as value, for colours picked when the ring
+    # showed values as they were
+    return int(255 * (value / 255) ** (1 / 2.2) + 0.5)
 
-    def show(self):
-        return self._array
-    
-    def _callback(self, t):
-        self._array = [Colour(50, 0,0)] * 20
+# Brightness steps each LED of the countdown fades through
+_COUNTDOWN_LEVELS = 32
 
-        if self._current < 0:
-            self._current = 19
+# The countdown's full brightness, the same light as Colour(100, 100, 100) gave before the dial ring's gamma correction
+_COUNTDOWN_BRIGHTNESS = _linear(100)
 
-        self._array[self._current] = Colour(0,0,0)
-        self._current -= 1
-
-class BootingPattern(BasePattern):
-    """"
-        A single rotating green light, shown as the clock is connecting.
-    """
-    def __init__(self):
-        self._current = 19
-        self._array = [Colour(0,0,0)] * 20
-        
-    def start(self):
-        self._timer = Timer(mode=Timer.PERIODIC, period=50, callback=self._callback)
-
-    def stop(self):
-        if self._timer != None:
-            self._timer.deinit()
-            self._timer = None
-
-        self._array = None
-
-    def show(self):
-        if self._timer is None:
-            return None
-        else:
-            return self._array
-    
-    def _callback(self, t):
-        if self._timer is None:
-            self._array = None
-            return
-        
-        self._array = [Colour(0, 0,0)] * 20
-
-        if self._current > 19:
-            self._current =0
-
-        self._array[self._current] = Colour(0,50,0)
-        self._current += 1
+# Value to give an LED for each fade step. The dial ring gamma corrects what it is given, so these are the
+# inverse: the light the boundary LED gives out then falls linearly with the time left
+_COUNTDOWN_FADE = bytes(int(_COUNTDOWN_BRIGHTNESS * (i / _COUNTDOWN_LEVELS) ** (1 / 2.2) + 0.5) for i in range(_COUNTDOWN_LEVELS))
 
 class CountdownPattern(BasePattern):
     """
         A countdown timer that uses the ring to show the percentage of the timer duration remaining.
+        The LED on the boundary between lit and unlit fades out smoothly, and only it is redrawn as the time runs down.
     """
-    def __init__(self, timer_seconds):
+    def __init__(self, timer_seconds: int, on_finished=None, on_stopped=None, leds: int = 20):
         self._timer_seconds = timer_seconds
         self._end_time = time.ticks_add(time.ticks_ms(), timer_seconds * 1000)
 
-        print(f"Timer set. Seconds = {timer_seconds}, Start time = {time.ticks_ms()}, End Time = {self._end_time}")
-        
-    def start(self):
-        pass
+        # Called once, with no arguments, when the countdown reaches zero
+        self.on_finished = on_finished
 
-    def stop(self):
-        pass
-
-    def show(self):
-        diff = time.ticks_diff(self._end_time, time.ticks_ms())
-        print(f"Timer callback. Diff = {diff}, Now = {time.ticks_ms()}, End Time = {self._end_time}")
+        # Called once, with no arguments, if the countdown is stopped (replaced or cleared from the dial) before then
+        self.on_stopped = on_stopped
 
-        if diff < 0:
-            print("Stopped.")
-            self.stop()
-            return None
-        else:
-            timer_ms = self._timer_seconds * 1000
-            pc = diff / timer_ms
-            pc = pc
-            normalized = 20 * pc
-            self._setValue(normalized, Colour(100,100,100))
+        # Time left (ms) at which each LED starts to go out, so a frame needs no multiplying or floats to find the
+        # boundary LED. LED i is fully lit while there are at least thresholds[i + 1] ms left
+        duration_ms = timer_seconds * 1000
+        self._thresholds = [i * duration_ms // leds for i in range(leds + 1)]
+        self._leds = leds
 
-        return self._array
+        # The boundary LED and its fade step as last worked out, and what is already in the frame buffer
+        self._led = leds - 1
+        self._level = _COUNTDOWN_LEVELS - 1
+        self._drawnLed = -1
+        self._finished = False
 
+    def start(self, scheduler: Scheduler) -> None:
+        pass
 
-    def _setValue(self, value, colour):
-        self._array = [Colour(0,0,0)] * 20
-        if value == 0:
-            
+    def stop(self) -> None:
+        if self._finished:
             return
-        
-        whole = (int)(math.floor(value))
+        self._finished = True
+        if self.on_stopped != None:
+            self.on_stopped()
+
+    def _update(self) -> int:
+        # Moves the boundary on to the current time, returning its position in fade steps, or -1 once finished
+        if self._finished:
+            return -1
+
+        left = time.ticks_diff(self._end_time, time.ticks_ms())
+        if left < 0:
+            return -1
+
+        thresholds = self._thresholds
+        led = self._led
+        while led > 0 and left < thresholds[led]:
+            led -= 1
+        self._led = led
+
+        start = thresholds[led]
+        self._level = (left - start) * _COUNTDOWN_LEVELS // (thresholds[led + 1] - start)
+        if self._level >= _COUNTDOWN_LEVELS:
+            self._level = _COUNTDOWN_LEVELS - 1
+        return led * _COUNTDOWN_LEVELS + self._level
+
+    @property
+    def version(self) -> int:
+        # Only changes when the boundary LED moves on a fade step
+        return self._update()
+
+    def render(self, buf: bytearray) -> bool:
+        if self._update() < 0:
+            if not self._finished:
+                self._finished = True
+                if self.on_finished != None:
+                    self.on_finished()
+            return False
+
+        led = self._led
+        if self._drawnLed < 0:
+            # First frame: light everything below the boundary
+            _BLACK.fill_grb(buf)
+            for i in range(led * 3):
+                buf[i] = _COUNTDOWN_BRIGHTNESS
+        else:
+            # The LEDs the boundary has passed since the last frame go out
+            for i in range((led + 1) * 3, (self._drawnLed + 1) * 3):
+                buf[i] = 0
+        self._drawnLed = led
+
+        level = _COUNTDOWN_FADE[self._level]
+        i = led * 3
+        buf[i] = level
+        buf[i + 1] = level
+        buf[i + 2] = level
+        return True
+
+class AnimationPattern(BasePattern):
+    """
+        Plays an Animation. The animation is worked out from the time it started, so it needs no timer of its own.
+    """
+    def __init__(self, animation: Animation) -> None:
+        self._animation = animation
+        self._player = Player(animation)
+        self._stopped = False
+        self.refresh_period = animation.frame_ms
 
-        for i in range (whole):
-            self._array[i] = colour
+    @property
+    def name(self) -> str:
+        return self._animation.name
 
-        remainder = value - whole
-        if remainder > 0:
-            brightness = (int)(100 * remainder)
-            self._array[whole] = Colour(brightness,brightness,brightness)
+    @property
+    def version(self) -> int:
+        # A new frame is a new version, -1 once finished
+        return -1 if self._stopped else self._player.frame()
 
+    def start(self, scheduler: Scheduler) -> None:
+        self._player.start()
 
-class AlertPattern(BasePattern):
-    """
-        A rapidly blue light on a green ring.
-    """
-    def __init__(self):
-        self._current = 19
-        self._array = [Colour(0,0,0)] * 20
-        self._loops = 0
-        
-    def start(self):
-        self._timer = Timer(mode=Timer.PERIODIC, period=25, callback=self._callback)
+    def stop(self) -> None:
+        self._stopped = True
 
-    def stop(self):
-        if self._timer != None:
-            self._timer.deinit()
-            self._timer = None
-            self._loop = 0
+    def render(self, buf: bytearray) -> bool:
+        n = -1 if self._stopped else self._player.frame()
+        if n < 0:
+            return False
 
-        self._array = None
+        self._player.render(buf, n)
+        return True
 
-    def show(self):
-        return self._array
-    
-    def _callback(self, t):
-        self._array = [Colour(0, 255,0)] * 20
+# A counter-clockwise rotating ring of red lights, shown when the clock has an error
+ERROR = Animation("ErrorPattern", ((0, (_linear(50), 0, 0)),), dot=(0, 0, 0), step_ms=200, direction=-1, start=19)
+
+# A single rotating green light, shown as the clock is connecting
+BOOTING = Animation("BootingPattern", ((0, (0, 0, 0)),), dot=(0, _linear(50), 0), step_ms=50)
 
-        if self._current < 0:
-            self._current = 19
-            if self._loops == 6:
-                self.stop()
-            else:
-                self._loops += 1
+# A rapidly rotating blue light on a green ring
+ALERT = Animation("AlertPattern", ((0, (0, 255, 0)),), dot=(0, 0, 255), step_ms=25, direction=-1, start=19, loops=7)
 
-        self._array[self._current] = Colour(0,0,255)
-        self._current -= 1
+# The whole ring slowly fading up to blue and back
+PULSE = Animation("Pulse", ((0, (0, 0, 0)), (1500, (0, 0, 120)), (3000, (0, 0, 0))))
 
 class CurrentTimePattern(BasePattern):
     """
-        Displays the current time. (very badly) 
+        Displays the current time. (very badly)
+        The hands are worked out from the RTC as the dial ring asks for them, so the pattern needs no timer of its own.
     """
+    refresh_period = 250
+
+    _HOUR = Colour.of(0, _linear(10), 0)
+    _MINUTE = Colour.of(0, 0, _linear(10))
+
     def __init__(self):
-        self._current = 19
-        self._array = [Colour(0,0,0)] * 20
-        self._loops = 0
-        
-    def start(self):
-        self._timer = Timer(mode=Timer.PERIODIC, period=1000, callback=self._callback)
+        self._hourLed = -1
+        self._minLed = -1
+        self._finished = False
+
+    def start(self, scheduler):
+        pass
 
     def stop(self):
-        if self._timer != None:
-            self._timer.deinit()
-            self._timer = None
-            self._loop = 0
-        
-        self._array = None
-
-    def show(self):
-        return self._array
-    
-    def _callback(self, t):
-        now = RTC().datetime()
-        self._array = [Colour(0,0,0)] * 20
+        self._finished = True
 
+    def _update(self) -> int:
+        # Moves the hands on to the RTC's time, returning their position, or -1 once finished
+        if self._finished:
+            return -1
+
+        now = RTC().datetime()
         h = now[4]
         m = now[5]
-        s = now[6]
-
-        print(f"Current time is {h}:{m}:{s} UTC+0")
 
         if h >= 12:
             h -= 12
 
-        hourLed = (int)((h / 12) * 20)
-        minLed = (int)((m / 60) * 20)
-        secLed = (int)((s / 60) * 20)
-        
-        self._array[minLed] = Colour(0,0,10)
-        self._array[hourLed] = Colour(0,10,0)
-        #self._array[secLed] = Colour(3,0,0)
-    
\ No newline at end of file
+        hourLed = h * 20 // 12
+        minLed = m * 20 // 60
+
+        if minLed != self._minLed or hourLed != self._hourLed:
+            Log.debug("Current time is %s:%s:%s UTC+0", now[4], m, now[6])
+            self._minLed = minLed
+            self._hourLed = hourLed
+        return hourLed * 20 + minLed
+
+    @property
+    def version(self) -> int:
+        # Only changes when one of the hands moves on an LED
+        return self._update()
+
+    def render(self, buf):
+        if self._update() < 0:
+            return False
+
+        _BLACK.fill_grb(buf)
+        self._MINUTE.write_grb(buf, self._minLed)
+        self._HOUR.write_grb(buf, self._hourLed)
+        return True
+
+# Patterns Home Assistant can pick as an effect for the dial, by name. Adding an Animation here is all a new effect needs
+EFFECTS = {
+    "CurrentTimePattern": CurrentTimePattern,
+}
+for _animation in (ALERT, ERROR, PULSE):
+    EFFECTS[_animation.name] = lambda animation=_animation: AnimationPattern(animation)
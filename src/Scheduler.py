@@ -0,0 +1,313 @@
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+import select
+import time
+import Log
+import Metrics
+
+# Whether asyncio has the IO queue wait_readable() uses on MicroPython
+_HAS_IO_QUEUE = hasattr(getattr(asyncio, "core", None), "_io_queue")
+
+# Task priorities, when several tasks are due at once the highest priority runs first
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 5
+PRIORITY_HIGH = 10
+
+# Don't sleep for longer than this without checking for work added by a coroutine. Shorter sleeps
+# just use sleep_ms, which is cheaper than waiting on the wake event
+_IDLE_SLICE_MS = 50
+
+def sleep_ms(ms: int):
+    """
+        asyncio.sleep_ms on MicroPython, or the equivalent on CPython.
+    """
+    if hasattr(asyncio, "sleep_ms"):
+        return asyncio.sleep_ms(ms)
+    return asyncio.sleep(ms / 1000)
+
+async def _wait_ms(event, ms: int) -> None:
+    try:
+        if hasattr(asyncio, "wait_for_ms"):
+            await asyncio.wait_for_ms(event.wait(), ms)
+        else:
+            await asyncio.wait_for(event.wait(), ms / 1000)
+    except asyncio.TimeoutError:
+        pass
+
+class _ThreadSafeFlag:
+    """
+        asyncio.ThreadSafeFlag for CPython, which doesn't have one.
+    """
+    def __init__(self) -> None:
+        self._event = asyncio.Event()
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def set(self) -> None:
+        if self._loop == None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self) -> None:
+        await self._event.wait()
+        self._event.clear()
+
+def thread_safe_flag():
+    """
+        An asyncio.ThreadSafeFlag, which can be set from the other core (or an interrupt) to wake a coroutine waiting on it.
+    """
+    if hasattr(asyncio, "ThreadSafeFlag"):
+        return asyncio.ThreadSafeFlag()
+    return _ThreadSafeFlag()
+
+# How often (ms) a socket is polled on a MicroPython whose asyncio has no IO queue, see wait_readable()
+_READABLE_POLL_MS = 20
+
+def _wait_readable_micropython(sock):
+    # The same thing asyncio.Stream does to wait for data, the loop polls the socket while it is idle.
+    # asyncio.Stream has no way to wait for data without reading it, which umqtt has to do itself
+    yield asyncio.core._io_queue.queue_read(sock)
+
+async def _poll_readable(sock) -> None:
+    poller = select.poll()
+    poller.register(sock, select.POLLIN)
+    while not poller.poll(0):
+        await sleep_ms(_READABLE_POLL_MS)
+
+async def wait_readable(sock) -> None:
+    """
+        Waits until sock has data (or has been closed by the other end), without polling it.
+        On MicroPython this relies on asyncio's IO queue (asyncio.core._io_queue), which is internal but has been the
+        same since uasyncio v3 (MicroPython 1.13). A firmware without it falls back to polling the socket.
+    """
+    if not hasattr(asyncio, "get_running_loop"):
+        if _HAS_IO_QUEUE:
+            await _wait_readable_micropython(sock)
+        else:
+            await _poll_readable(sock)
+        return
+
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fd = sock.fileno()
+
+    def _on_readable():
+        if not ready.done():
+            ready.set_result(None)
+
+    loop.add_reader(fd, _on_readable)
+    try:
+        await ready
+    finally:
+        loop.remove_reader(fd)
+
+async def wait_readable_ms(sock, ms: int) -> bool:
+    """
+        Waits up to ms for sock to have data, returning False if it didn't.
+    """
+    try:
+        if hasattr(asyncio, "wait_for_ms"):
+            await asyncio.wait_for_ms(wait_readable(sock), ms)
+        else:
+            await asyncio.wait_for(wait_readable(sock), ms / 1000)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+class Task:
+    """
+        A piece of periodic (or one-shot) work owned by the scheduler. The callback is called with the task, like a machine.Timer callback.
+    """
+    def __init__(self, scheduler, name: str, callback, period: int, priority: int, deadline: int, due: int) -> None:
+        self._scheduler = scheduler
+        self.name = name
+        self.callback = callback
+        self.period = period
+        self.priority = priority
+        self.deadline = deadline
+        self.due = due
+        self.active = True
+
+        # The run_pending() call the task was last (re)armed during, it isn't run again until a later one
+        self.armed = 0
+
+        # Timing stats, so jitter can be measured
+        self.runs = 0
+        self.late_total = 0
+        self.late_max = 0
+        self.deadline_misses = 0
+        self.run_total_us = 0
+        self.run_max_us = 0
+
+    def cancel(self) -> None:
+        if self.active:
+            self.active = False
+            self._scheduler._remove(self)
+
+    def set_period(self, period: int) -> None:
+        """
+            Changes the period of a periodic task, the next run is rescheduled from now.
+        """
+        if period <= 0:
+            raise ValueError("period must be positive")
+        self.period = period
+        self._scheduler._reschedule(self, time.ticks_add(time.ticks_ms(), period))
+
+    def get_stats(self) -> dict:
+        return {
+            "name": self.name,
+            "period": self.period,
+            "priority": self.priority,
+            "runs": self.runs,
+            "late_avg": self.late_total / self.runs if self.runs > 0 else 0,
+            "late_max": self.late_max,
+            "deadline_misses": self.deadline_misses,
+            "run_avg_us": self.run_total_us // self.runs if self.runs > 0 else 0,
+            "run_max_us": self.run_max_us,
+        }
+
+class Scheduler:
+    """
+        Runs all of the clock's timed work from a single asyncio loop, so nothing runs concurrently with anything else.
+        Tasks declare a period, priority and deadline (ms after they were due that they should have finished by).
+    """
+    def __init__(self) -> None:
+        self._tasks = []
+        self._wake = asyncio.Event()
+        self._sleeping_until = None
+
+        # Counts run_pending() calls
+        self._pass = 0
+
+    def periodic(self, period: int, callback, name: str, priority: int = PRIORITY_NORMAL, deadline: int = 0) -> Task:
+        """
+            Calls callback every period ms until the task is cancelled.
+        """
+        if period <= 0:
+            raise ValueError("period must be positive")
+        return self._add(Task(self, name, callback, period, priority, deadline or period, time.ticks_add(time.ticks_ms(), period)))
+
+    def once(self, delay: int, callback, name: str, priority: int = PRIORITY_NORMAL, deadline: int = 0) -> Task:
+        """
+            Calls callback once, after delay ms.
+        """
+        return self._add(Task(self, name, callback, 0, priority, deadline or 1000, time.ticks_add(time.ticks_ms(), delay)))
+
+    def spawn(self, coro):
+        """
+            Runs a coroutine on the scheduler's loop, for work that needs to wait (e.g. the chime's solenoid timing).
+        """
+        return asyncio.create_task(coro)
+
+    def get_stats(self) -> list:
+        return [task.get_stats() for task in self._tasks]
+
+    def _add(self, task: Task) -> Task:
+        self._insert(task)
+
+        # If the loop is idle until after this task is due, wake it up
+        if self._sleeping_until is not None and time.ticks_diff(task.due, self._sleeping_until) < 0:
+            self._wake.set()
+
+        return task
+
+    def _insert(self, task: Task) -> None:
+        # Keep the list sorted by due time, then priority
+        tasks = self._tasks
+        task.armed = self._pass
+        i = 0
+        while i < len(tasks):
+            other = tasks[i]
+            diff = time.ticks_diff(task.due, other.due)
+            if diff < 0 or (diff == 0 and task.priority > other.priority):
+                break
+            i += 1
+        tasks.insert(i, task)
+
+    def _remove(self, task: Task) -> None:
+        if task in self._tasks:
+            self._tasks.remove(task)
+
+    def _reschedule(self, task: Task, due: int) -> None:
+        self._remove(task)
+        task.due = due
+        if task.active:
+            self._add(task)
+
+    def _run_task(self, task: Task, now: int) -> None:
+        late = time.ticks_diff(now, task.due)
+        self._tasks.remove(task)
+
+        if task.period > 0:
+            task.due = time.ticks_add(task.due, task.period)
+            if time.ticks_diff(task.due, now) <= 0:
+                # We've fallen more than a whole period behind, so drop the missed runs rather than trying to catch up
+                task.due = time.ticks_add(now, task.period)
+            self._insert(task)
+        else:
+            task.active = False
+
+        start = time.ticks_us()
+        try:
+            task.callback(task)
+        except Exception as e:
+            Log.error("Task %s failed: %s", task.name, e)
+        run_us = time.ticks_diff(time.ticks_us(), start)
+
+        if Metrics.JITTER_MS.sample():
+            Metrics.JITTER_MS.record(late)
+
+        task.runs += 1
+        task.late_total += late
+        task.run_total_us += run_us
+        if late > task.late_max:
+            task.late_max = late
+        if run_us > task.run_max_us:
+            task.run_max_us = run_us
+        if late + run_us // 1000 > task.deadline:
+            task.deadline_misses += 1
+
+    def run_pending(self) -> int:
+        """
+            Runs every task that is due, returning how long (ms) until the next one is, or None if there are no tasks.
+        """
+        now = time.ticks_ms()
+        tasks = self._tasks
+        self._pass += 1
+
+        # Tasks are sorted, so run everything from the front that is due. A task armed by one of these (e.g. a once()
+        # with no delay) waits for the next call, so each runs at most once per call and the loop always gets a turn
+        while len(tasks) > 0 and time.ticks_diff(tasks[0].due, now) <= 0:
+            if tasks[0].armed == self._pass:
+                break
+            self._run_task(tasks[0], now)
+
+        if len(tasks) == 0:
+            return None
+        return time.ticks_diff(tasks[0].due, time.ticks_ms())
+
+    async def run(self) -> None:
+        """
+            Runs the tasks forever.
+        """
+        while True:
+            delay = self.run_pending()
+
+            if delay is None:
+                delay = _IDLE_SLICE_MS * 20
+
+            if delay <= 0:
+                # Still give any coroutines a chance to run
+                await sleep_ms(0)
+            elif delay <= _IDLE_SLICE_MS:
+                await sleep_ms(delay)
+            else:
+                self._sleeping_until = time.ticks_add(time.ticks_ms(), delay)
+                self._wake.clear()
+                await _wait_ms(self._wake, delay)
+                self._sleeping_until = None
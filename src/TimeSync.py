@@ -0,0 +1,323 @@
+import socket
+import struct
+import time
+from machine import RTC
+from Scheduler import Scheduler, Task, PRIORITY_LOW, PRIORITY_HIGH, sleep_ms, wait_readable_ms
+import Log
+
+_NTP_DELTA = 2208988800
+
+# How long to wait for each reply, and the gap between the samples of one sync
+_SAMPLE_TIMEOUT_MS = 1000
+_SAMPLE_GAP_MS = 1000
+
+# Offsets larger than this are corrected at once, smaller ones are slewed in at _SLEW_PPM so the time never jumps
+_STEP_MS = 500
+_SLEW_PPM = 500
+
+# The most the crystal is believed to be out by (parts per billion, i.e. 500 ppm)
+_MAX_PPB = 500000
+
+# How close the clock should stay to NTP. The time between syncs doubles while the offsets found are well
+# within this, and halves when they are outside it
+_TARGET_MS = 50
+_MIN_INTERVAL_MS = 5 * 60 * 1000
+_MAX_INTERVAL_MS = 24 * 60 * 60 * 1000
+
+# Wait before trying again after a failed sync, doubling with each failure up to the sync interval
+_RETRY_MS = 30000
+
+# How often the RTC is set from the corrected time, which also applies any slew in progress
+_DISCIPLINE_MS = 10 * 60 * 1000
+
+# How many syncs in a row can get no reply before the NTP server is looked up again, in case it has moved
+_DNS_FAILURES = 4
+
+def _is_ip(host: str) -> bool:
+    # Whether host is a dotted IPv4 address, which needs no lookup
+    parts = host.split(".")
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not part.isdigit() or int(part) > 255:
+            return False
+    return True
+
+def _ntp_ms(msg: bytes, offset: int) -> int:
+    # An NTP timestamp in the packet as unix ms
+    seconds, fraction = struct.unpack_from("!II", msg, offset)
+    return (seconds - _NTP_DELTA) * 1000 + ((fraction * 1000) >> 32)
+
+class TimeSync:
+    """
+        Keeps the RTC on time from NTP, in the background.
+        Each sync takes several samples and uses the one with the shortest round trip, which is the least
+        thrown off by the network. The crystal's drift is estimated from sync to sync and corrected for, so
+        syncs can be spaced further apart the better the estimate gets.
+        The server's name is looked up when the first sync starts, which blocks (for as long as the resolver takes to
+        answer or give up), and then only again after syncs have failed. Give an IP address as the host to never block.
+    """
+    def __init__(self, scheduler: Scheduler, host: str, port: int, samples: int = 4, on_sync=None) -> None:
+        self._scheduler = scheduler
+        self._host = host
+        self._port = port
+        self._samples = samples
+
+        # Called with no arguments every time the RTC has been set, after each sync and every _DISCIPLINE_MS
+        self.on_sync = on_sync
+
+        self.synced = False
+        self.syncs = 0
+        self.failures = 0
+        self.steps = 0
+        self.lookups = 0
+        self.interval_ms = _MIN_INTERVAL_MS
+
+        # Offset and round trip (ms) of the last sync, and the crystal's estimated drift (parts per billion)
+        self.offset_ms = 0
+        self.delay_ms = 0
+        self.drift_ppb = 0
+
+        # The corrected time is worked out from ticks_ms: it was _baseMs (unix ms) at _baseTicks, and runs
+        # drift_ppb faster than ticks_ms. _driftPart carries the fraction of a ms of drift correction (in billionths)
+        # over from one base to the next, and _slewMs is the correction still to be slewed in
+        self._baseTicks = time.ticks_ms()
+        self._baseMs = 0
+        self._driftPart = 0
+        self._slewMs = 0
+        self._lastSyncTicks = 0
+
+        # An IP address is used as it is, a name is looked up by _resolve()
+        self._addr = (host, port) if _is_ip(host) else None
+        self._relookup = False
+        self._sequence = 0
+        self._failuresInRow = 0
+        self._syncing = False
+        self._syncTask = None
+        self._disciplineTask = None
+
+    def start(self) -> None:
+        self._disciplineTask = self._scheduler.periodic(_DISCIPLINE_MS, self._discipline, "RTC discipline", PRIORITY_LOW)
+        self.sync_now()
+
+    def stop(self) -> None:
+        if self._disciplineTask != None:
+            self._disciplineTask.cancel()
+            self._disciplineTask = None
+        if self._syncTask != None:
+            self._syncTask.cancel()
+            self._syncTask = None
+
+    def sync_now(self) -> None:
+        """
+            Starts a sync, unless one is already running.
+        """
+        if self._syncing:
+            return
+        if self._syncTask != None:
+            self._syncTask.cancel()
+            self._syncTask = None
+        self._syncing = True
+
+        # The first request is sent now rather than when the coroutine first runs, so it is already on its way
+        # while whatever the caller does next (e.g. the MQTT connect at boot) blocks
+        s = None
+        addr = None
+        request = None
+        try:
+            addr = self._resolve()
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.setblocking(False)
+            request = self._send_query(s, addr)
+        except Exception as e:
+            Log.warning("Time sync failed %s", e)
+            if s != None:
+                s.close()
+                s = None
+        self._scheduler.spawn(self._sync(s, addr, request))
+
+    def now_ms(self) -> int:
+        """
+            The corrected time, in unix ms.
+        """
+        elapsed = time.ticks_diff(time.ticks_ms(), self._baseTicks)
+        return self._baseMs + elapsed + (elapsed * self.drift_ppb + self._driftPart) // 1000000000 + self._slewed(elapsed)
+
+    def _slewed(self, elapsed: int) -> int:
+        # How much of the outstanding correction has been slewed in, elapsed ms after the base
+        limit = elapsed * _SLEW_PPM // 1000000
+        return max(-limit, min(limit, self._slewMs))
+
+    def _rebase(self) -> None:
+        # Moves the base up to now, so ticks_ms can't wrap past it
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._baseTicks)
+        drift = elapsed * self.drift_ppb + self._driftPart
+        self._driftPart = drift % 1000000000
+        slewed = self._slewed(elapsed)
+        self._baseMs += elapsed + drift // 1000000000 + slewed
+        self._slewMs -= slewed
+        self._baseTicks = now
+
+    def _schedule(self, delay: int) -> None:
+        self._syncTask = self._scheduler.once(delay, lambda t: self.sync_now(), "Time sync", PRIORITY_LOW)
+
+    def _resolve(self):
+        # The server's address is looked up once and kept, as a lookup blocks, possibly for seconds. It is only looked
+        # up again once syncs have been failing, and never if the host is an IP address
+        if self._addr == None or self._relookup:
+            self.lookups += 1
+            self._relookup = False
+            try:
+                self._addr = socket.getaddrinfo(self._host, self._port)[0][-1]
+            except Exception as e:
+                # Keep using the last address (until syncs fail again), rather than blocking on a lookup every retry
+                if self._addr == None:
+                    raise
+                Log.warning("Lookup of %s failed %s, using the last address", self._host, e)
+        return self._addr
+
+    async def _sync(self, s, addr, request) -> None:
+        # s is None if sync_now() couldn't send the first request
+        best = None
+        replies = 0
+        first = not self.synced
+        try:
+            for i in range(self._samples if s != None else 0):
+                if i > 0:
+                    await sleep_ms(_SAMPLE_GAP_MS)
+                    request = self._send_query(s, addr)
+                sample = await self._reply(s, request)
+                if sample == None:
+                    continue
+                replies += 1
+                if not self.synced:
+                    # Get the time about right from the first reply, the rest of the samples refine it
+                    self._apply(sample[0], sample[1])
+                elif best == None or sample[1] < best[1]:
+                    best = sample
+        except Exception as e:
+            Log.warning("Time sync failed %s", e)
+        finally:
+            if s != None:
+                s.close()
+            self._syncing = False
+
+        if replies == 0:
+            self.failures += 1
+            delay = min(self.interval_ms, _RETRY_MS << min(self._failuresInRow, 8))
+            self._failuresInRow += 1
+
+            # The server may have moved, so after a few failures in a row look it up again. Not after every one,
+            # as during an outage each lookup would block until it timed out
+            if self._failuresInRow % _DNS_FAILURES == 0 and not _is_ip(self._host):
+                self._relookup = True
+            Log.warning("No reply from %s, retrying in %s ms", self._host, delay)
+            self._schedule(delay)
+            return
+
+        self._failuresInRow = 0
+        if best != None:
+            # The first reply of the first sync may have been read late (it was sent just before the MQTT connect),
+            # so the best of the rest sets the time outright rather than being slewed in
+            self._apply(best[0], best[1], first)
+        self._schedule(self.interval_ms)
+
+    def _send_query(self, s, addr) -> tuple:
+        # Sends a request, returning (query, unix ms, ticks_us) for _reply
+        while True:
+            # Throw away any late reply to an earlier request
+            try:
+                s.recv(48)
+            except OSError:
+                break
+
+        self._sequence += 1
+        query = bytearray(48)
+        query[0] = 0x23  # LI 0, version 4, mode 3 (client)
+        struct.pack_into("!I", query, 44, self._sequence)
+
+        t1 = self.now_ms()
+        start = time.ticks_us()
+        s.sendto(query, addr)
+        return query, t1, start
+
+    async def _reply(self, s, request: tuple):
+        # Returns (offset, round trip) in ms from the request, or None if no good reply came
+        query, t1, start = request
+        while True:
+            # A reply that is already waiting is taken even after the timeout, the round trip shows it was late
+            try:
+                msg = s.recv(48)
+            except OSError:
+                msg = None
+
+            # A server reply to this request, not a "kiss of death" (stratum 0) telling us to go away
+            if msg != None and len(msg) == 48 and msg[0] & 7 == 4 and msg[1] != 0 and msg[24:32] == query[40:48]:
+                break
+            if msg != None:
+                continue
+
+            remaining = _SAMPLE_TIMEOUT_MS - time.ticks_diff(time.ticks_us(), start) // 1000
+            if remaining <= 0 or not await wait_readable_ms(s, remaining):
+                return None
+
+        rtt = time.ticks_diff(time.ticks_us(), start) // 1000
+        t4 = t1 + rtt
+        t2 = _ntp_ms(msg, 32)
+        t3 = _ntp_ms(msg, 40)
+        return ((t2 - t1) + (t3 - t4)) // 2, rtt - (t3 - t2)
+
+    def _apply(self, offset: int, delay: int, step: bool = False) -> None:
+        self._rebase()
+        now = time.ticks_ms()
+        self.syncs += 1
+        self.offset_ms = offset
+        self.delay_ms = delay
+
+        if not self.synced or step or abs(offset) > _STEP_MS:
+            if self.synced and not step:
+                self.steps += 1
+            self._baseMs += offset
+            self._slewMs = 0
+            Log.info("Time set, offset %s ms, round trip %s ms", offset, delay)
+        else:
+            # What is left of the offset once the correction still being slewed in is allowed for came from the
+            # drift estimate being out, so adjust that by half of it. Over less than a few minutes (e.g. the first
+            # reply of a sync and the best of the rest) the error is all network noise
+            error = offset - self._slewMs
+            since = time.ticks_diff(now, self._lastSyncTicks)
+            if since >= _MIN_INTERVAL_MS // 2:
+                drift = self.drift_ppb + error * 1000000000 // since // 2
+                self.drift_ppb = max(-_MAX_PPB, min(_MAX_PPB, drift))
+
+                # Well on time: sync less often. Outside the target: more often
+                if abs(error) <= _TARGET_MS // 4:
+                    self.interval_ms = min(_MAX_INTERVAL_MS, self.interval_ms * 2)
+                elif abs(error) > _TARGET_MS:
+                    self.interval_ms = max(_MIN_INTERVAL_MS, self.interval_ms // 2)
+
+            self._slewMs = offset
+            Log.info("Time synced, offset %s ms, round trip %s ms, drift %s ppb", offset, delay, self.drift_ppb)
+
+        first = not self.synced
+        self.synced = True
+        self._lastSyncTicks = now
+        if first:
+            # Set the RTC straight away, to within a second, rather than waiting for the next second to start
+            self._set_rtc(None)
+        self._discipline()
+
+    def _discipline(self, t: Task = None) -> None:
+        if not self.synced:
+            return
+        self._rebase()
+
+        # The RTC counts whole seconds from when it is set, so set it as the next second starts
+        self._scheduler.once(1000 - self.now_ms() % 1000, self._set_rtc, "RTC set", PRIORITY_HIGH)
+
+    def _set_rtc(self, t: Task) -> None:
+        tm = time.gmtime((self.now_ms() + 500) // 1000)
+        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+        if self.on_sync != None:
+            self.on_sync()
@@ -1,11 +1,6 @@
 from ClockManager import ClockManager
-import time
 
-# Boot the clock
+# Boot the clock and run it. This never returns, so the debugger can continue to catch console output
 global cm
 cm = ClockManager()
-cm.boot()
-
-# just spin so that the debugger can continue to catch console output
-while True:
-    time.sleep(60)
\ No newline at end of file
+cm.run()
@@ -0,0 +1,12 @@
+"""
+    Runs the tests against the firmware in src/ on the host, with the simulation's fake hardware modules and
+    virtual time (see sim/harness.py). Time only moves when a test moves it, with harness.clock.advance_us().
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sim import harness  # noqa: E402
+
+harness.install(virtual=True)
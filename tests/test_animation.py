@@ -0,0 +1,96 @@
+import pytest
+
+from Animation import Animation, Player, _NO_DOT
+from machine import RTC
+from RingPatterns import CurrentTimePattern
+from Scheduler import Scheduler
+from sim import harness
+
+
+def _frame(animation, n):
+    return tuple(animation.frames[n * 4:n * 4 + 4])
+
+
+def test_dot_steps_round_the_ring():
+    animation = Animation("spin", ((0, (1, 2, 3)),), dot=(9, 9, 9), step_ms=50, direction=-1, start=19)
+    animation.compile()
+
+    # Without a fade the ring only changes when the dot moves, once per step
+    assert animation.frame_ms == 50
+    assert animation.frame_count == 20
+    assert [_frame(animation, n)[3] for n in range(3)] == [19, 18, 17]
+    assert _frame(animation, 0)[:3] == (2, 1, 3)
+
+
+def test_fade_between_keyframes():
+    animation = Animation("fade", ((0, (0, 0, 0)), (100, (100, 0, 0)), (200, (0, 0, 0))), frame_ms=25)
+    animation.compile()
+    assert animation.frame_count == 8
+    assert [_frame(animation, n)[1] for n in range(8)] == [0, 25, 50, 75, 100, 75, 50, 25]
+    assert _frame(animation, 0)[3] == _NO_DOT
+
+
+def test_constant_colour_is_one_frame():
+    animation = Animation("solid", ((0, (5, 6, 7)),))
+    animation.compile()
+    assert animation.frame_count == 1
+    assert _frame(animation, 0) == (6, 5, 7, _NO_DOT)
+
+
+def test_cycle_is_the_longer_of_fade_and_spin():
+    animation = Animation("both", ((0, (0, 0, 0)), (100, (0, 0, 0))), dot=(1, 1, 1), step_ms=10, frame_ms=10, leds=20)
+    assert animation.cycle_ms == 200
+    animation.compile()
+    assert animation.frame_count == 20
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"dot": (1, 1, 1), "step_ms": 0},
+    {"frame_ms": 0},
+])
+def test_animations_that_take_no_time_are_refused(kwargs):
+    keyframes = ((0, (0, 0, 0)), (100, (1, 1, 1))) if "frame_ms" in kwargs else ((0, (0, 0, 0)),)
+    with pytest.raises(ValueError):
+        Animation("broken", keyframes, **kwargs)
+
+
+def test_player_finishes_after_its_loops():
+    animation = Animation("twice", ((0, (0, 0, 0)),), dot=(1, 1, 1), step_ms=10, loops=2, leds=4)
+    player = Player(animation)
+    player.start()
+    frames = []
+    for _ in range(10):
+        frames.append(player.frame())
+        harness.clock.advance_us(10_000)
+    assert frames == [0, 1, 2, 3, 0, 1, 2, 3, -1, -1]
+
+
+def test_player_renders_the_dot_over_the_ring():
+    animation = Animation("dot", ((0, (1, 2, 3)),), dot=(7, 8, 9), step_ms=10, start=1, leds=3)
+    player = Player(animation)
+    buf = bytearray(9)
+    player.render(buf, 0)
+    assert buf == b"\x02\x01\x03\x08\x07\x09\x02\x01\x03"
+
+
+def test_current_time_follows_the_rtc_without_a_task():
+    RTC().datetime((2024, 1, 1, 0, 15, 0, 50, 0))
+    scheduler = Scheduler()
+    pattern = CurrentTimePattern()
+    pattern.start(scheduler)
+    assert scheduler.get_stats() == []
+
+    buf = bytearray(60)
+    first = pattern.version
+    assert pattern.render(buf)
+    assert buf[3 * 5:3 * 5 + 3] == CurrentTimePattern._HOUR.to_grb()
+
+    # The minute hand only moves on every third minute
+    harness.clock.advance_us(60_000_000)
+    assert pattern.version == first
+    harness.clock.advance_us(120_000_000)
+    assert pattern.version != first
+
+    pattern.stop()
+    assert pattern.version == -1
+    assert not pattern.render(buf)
@@ -0,0 +1,157 @@
+import calendar
+
+import pytest
+
+import ChimeSchedule as chime_schedule
+from ChimeSchedule import ChimeSchedule, _EPOCH_2000, _parse_rule, _rtc_seconds
+from machine import RTC
+from Scheduler import Scheduler
+
+# Monday 2023-10-23 00:00 UTC
+_MONDAY = calendar.timegm((2023, 10, 23, 0, 0, 0))
+
+
+class _Clock:
+    def __init__(self):
+        self.calls = []
+
+    def chime(self, count):
+        self.calls.append(("chime", count))
+
+    def swing_pendulum(self, on, seconds):
+        self.calls.append(("swing", seconds))
+
+    def show_dial_effect(self, effect):
+        self.calls.append(("dial", effect))
+
+
+def _schedule(config, unix_s=_MONDAY):
+    RTC().datetime((2023, 10, 23, 0, 0, 0, 0, 0))
+    schedule = ChimeSchedule(_Clock(), Scheduler())
+    schedule.set_config(config)
+    schedule.time_changed(lambda: unix_s * 1000)
+    return schedule
+
+
+@pytest.mark.parametrize("dt", [
+    (2000, 1, 1, 5, 0, 0, 0, 0),
+    (2023, 2, 28, 1, 23, 59, 59, 0),
+    (2024, 2, 29, 3, 12, 0, 0, 0),
+    (2024, 3, 1, 4, 0, 0, 1, 0),
+    (2099, 12, 31, 3, 6, 7, 8, 0),
+])
+def test_rtc_seconds_matches_the_calendar(dt):
+    unix = calendar.timegm((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6]))
+    assert _rtc_seconds(dt) == unix - _EPOCH_2000
+
+
+def test_parse_rule():
+    hours, minute, days, action, _ = _parse_rule({"at": "*:15"})
+    assert (hours, minute, days, action) == (tuple(range(24)), 15, tuple(range(7)), "chime")
+
+    hours, minute, days, action, _ = _parse_rule({"at": "7:30", "do": "swing", "days": [0, 4]})
+    assert (hours, minute, days, action) == ((7,), 30, (0, 4), "swing")
+
+
+@pytest.mark.parametrize("rule", [
+    {"at": "24:00"},
+    {"at": "7:60"},
+    {"at": "seven:00"},
+    {"at": "7:00", "do": "dance"},
+    {"at": "7:00", "count": "twice"},
+    {"at": "7:00", "days": [7]},
+])
+def test_parse_rule_refuses_bad_rules(rule):
+    with pytest.raises(ValueError):
+        _parse_rule(rule)
+
+
+def test_bad_config_changes_nothing():
+    schedule = _schedule({"rules": [{"at": "*:00"}]})
+    with pytest.raises(ValueError):
+        schedule.set_config({"rules": [{"at": "*:00"}, {"at": "25:00"}]})
+    assert schedule.config == {"rules": [{"at": "*:00"}]}
+    assert len(schedule._rules) == 1
+
+
+def test_next_is_on_the_given_weekdays():
+    # Monday is 0, and 2000-01-01 was a Saturday
+    schedule = _schedule({"rules": [{"at": "7:30", "days": [2]}]})
+    monday = _MONDAY - _EPOCH_2000
+    assert schedule._next(0, monday) == monday + 2 * 86400 + 7 * 3600 + 30 * 60
+
+    # Strictly after: a rule due right now is next due a week later
+    wednesday = monday + 2 * 86400 + 7 * 3600 + 30 * 60
+    assert schedule._next(0, wednesday) == wednesday + 7 * 86400
+
+
+def test_next_every_hour():
+    schedule = _schedule({"rules": [{"at": "*:00"}]})
+    monday = _MONDAY - _EPOCH_2000
+    assert schedule._next(0, monday) == monday + 3600
+    assert schedule._next(0, monday + 23 * 3600 + 1) == monday + 86400
+
+
+def test_utc_offset_moves_local_time():
+    schedule = _schedule({"utc_offset": 60, "rules": [{"at": "1:00"}]})
+    assert schedule._now() == _MONDAY - _EPOCH_2000 + 3600
+    assert schedule.next_due() == 86400
+
+
+@pytest.mark.parametrize("quiet, hour, expected", [
+    (None, 3, False),
+    ([22, 7], 21, False),
+    ([22, 7], 22, True),
+    ([22, 7], 0, True),
+    ([22, 7], 6, True),
+    ([22, 7], 7, False),
+    ([1, 5], 0, False),
+    ([1, 5], 1, True),
+    ([1, 5], 5, False),
+])
+def test_quiet_hours(quiet, hour, expected):
+    config = {"rules": []}
+    if quiet != None:
+        config["quiet"] = quiet
+    assert _schedule(config)._is_quiet(hour) == expected
+
+
+def test_fire_chimes_the_hour_outside_quiet_hours():
+    schedule = _schedule({"quiet": [22, 7], "rules": [{"at": "*:00", "count": "hour"}]})
+    day = _MONDAY - _EPOCH_2000
+    for hour in (0, 7, 12, 13, 21, 22):
+        schedule._fire(0, day + hour * 3600)
+    assert schedule._clock.calls == [("chime", 7), ("chime", 12), ("chime", 1), ("chime", 9)]
+    assert schedule.fired == 6
+
+
+def test_fire_other_actions():
+    schedule = _schedule({"rules": [
+        {"at": "7:30", "do": "swing", "seconds": 60},
+        {"at": "18:00", "do": "dial", "effect": "Pulse"},
+    ]})
+    schedule._fire(0, 0)
+    schedule._fire(1, 0)
+    assert schedule._clock.calls == [("swing", 60), ("dial", "Pulse")]
+
+
+def test_wake_fires_what_is_due_and_requeues_it():
+    now = [_MONDAY]
+    RTC().datetime((2023, 10, 23, 0, 0, 0, 0, 0))
+    schedule = ChimeSchedule(_Clock(), Scheduler())
+    schedule.set_config({"rules": [{"at": "*:00", "count": 2}]})
+    schedule.time_changed(lambda: now[0] * 1000)
+
+    now[0] += 3600
+    schedule._wake(None)
+    assert schedule._clock.calls == [("chime", 2)]
+    assert schedule.next_due() == 3600
+
+
+def test_no_rules_before_the_time_is_set():
+    RTC().datetime((2021, 1, 1, 4, 0, 0, 0, 0))
+    schedule = ChimeSchedule(_Clock(), Scheduler())
+    schedule.set_config({"rules": [{"at": "*:00"}]})
+    schedule.time_changed()
+    assert schedule.next_due() == -1
+    assert chime_schedule._MIN_YEAR > 2021
@@ -0,0 +1,38 @@
+import Colour as colour_module
+from Colour import Colour
+
+
+def test_of_hands_out_one_instance_per_colour():
+    assert Colour.of(1, 2, 3) is Colour.of(1, 2, 3)
+    assert Colour.from_value(0x010203) is Colour.of(1, 2, 3)
+
+
+def test_interning_is_capped(monkeypatch):
+    monkeypatch.setattr(colour_module, "_interned", {})
+    for i in range(colour_module._MAX_INTERNED + 10):
+        Colour.of(i, 0, 0)
+    assert len(colour_module._interned) == colour_module._MAX_INTERNED
+
+    # Past the cap, colours are still equal, just not shared
+    extra = Colour.of(colour_module._MAX_INTERNED + 5, 0, 0)
+    assert extra is not Colour.of(colour_module._MAX_INTERNED + 5, 0, 0)
+    assert extra == Colour.of(colour_module._MAX_INTERNED + 5, 0, 0)
+
+
+def test_equal_colours_hash_the_same():
+    assert Colour(4, 5, 6) == Colour(4, 5, 6)
+    assert hash(Colour(4, 5, 6)) == 0x040506
+    assert Colour(4, 5, 6) != Colour(4, 5, 7)
+    assert Colour(0, 0, 0).is_black()
+
+
+def test_grb_buffers():
+    colour = Colour.of(1, 2, 3)
+    assert colour.to_grb() == b"\x02\x01\x03"
+
+    buf = bytearray(9)
+    colour.fill_grb(buf)
+    assert buf == b"\x02\x01\x03" * 3
+
+    Colour.of(9, 8, 7).write_grb(buf, 1)
+    assert buf == b"\x02\x01\x03\x08\x09\x07\x02\x01\x03"
@@ -0,0 +1,110 @@
+from CoreLink import CommandRing, Doorbell, Snapshot
+from sim import harness
+
+
+def test_ring_is_first_in_first_out():
+    ring = CommandRing(4)
+    for command in ("a", "b", "c"):
+        assert ring.push(command)
+    assert [ring.pop(), ring.pop(), ring.pop()] == ["a", "b", "c"]
+    assert ring.pop() is None
+
+
+def test_full_ring_turns_commands_away():
+    ring = CommandRing(2)
+    assert ring.push(1)
+    assert ring.push(2)
+    assert not ring.push(3)
+    assert ring.dropped == 1
+    assert ring.pop() == 1
+    assert ring.push(4)
+    assert [ring.pop(), ring.pop(), ring.pop()] == [2, 4, None]
+
+
+def test_ring_wraps_round():
+    ring = CommandRing(3)
+    popped = []
+    for i in range(20):
+        assert ring.push(i)
+        if i % 2:
+            popped.append(ring.pop())
+            popped.append(ring.pop())
+    assert popped == list(range(20))
+    assert ring.dropped == 0
+
+
+def test_popped_slot_is_cleared():
+    ring = CommandRing(2)
+    ring.push(object())
+    ring.pop()
+    assert ring._slots == [None, None, None]
+
+
+def test_snapshot_update_is_invisible_until_published():
+    snapshot = Snapshot(("a", "b"))
+    snapshot.begin()
+    snapshot.set(0, 1)
+    snapshot.set(1, 2)
+    assert snapshot.read(0) is None
+    snapshot.publish()
+    assert (snapshot.read(0), snapshot.read(1)) == (1, 2)
+    assert snapshot.sequence == 1
+
+
+def test_snapshot_begin_carries_unchanged_fields_over():
+    snapshot = Snapshot(("a", "b"))
+    snapshot.begin()
+    snapshot.set(0, 1)
+    snapshot.set(1, 2)
+    snapshot.publish()
+
+    snapshot.begin()
+    snapshot.set(1, 3)
+    snapshot.publish()
+    assert (snapshot.read(0), snapshot.read(1)) == (1, 3)
+
+
+def test_snapshot_versions_show_which_fields_changed():
+    snapshot = Snapshot(("a", "b", "c"))
+    versions = [0, 0, 0]
+    for value in range(3):
+        snapshot.begin()
+        snapshot.set(1, value)
+        if value == 2:
+            snapshot.set(2, value)
+        snapshot.publish()
+
+    assert snapshot.read_versions(versions) == 3
+    assert versions == [0, 3, 1]
+
+
+def test_snapshot_read_retries_when_the_writer_flips():
+    snapshot = Snapshot(("a",))
+    snapshot.begin()
+    snapshot.set(0, "old")
+    snapshot.publish()
+
+    # A writer on the other core publishing between the reader's two looks at the sequence number
+    class Racing(list):
+        flipped = False
+
+        def __getitem__(self, index):
+            if not Racing.flipped:
+                Racing.flipped = True
+                snapshot.begin()
+                snapshot.set(0, "new")
+                snapshot.publish()
+            return list.__getitem__(self, index)
+
+    snapshot._values = tuple(Racing(values) for values in snapshot._values)
+    assert snapshot.read(0) == "new"
+
+
+def test_doorbell_rung_before_wait_returns_at_once():
+    doorbell = Doorbell()
+    doorbell.ring()
+    doorbell.ring()
+    start = harness.clock.now_ms()
+    doorbell.wait(1000)
+    assert harness.clock.now_ms() == start
+    assert harness.clock._timers == []
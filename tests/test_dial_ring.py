@@ -0,0 +1,23 @@
+import neopixel
+import rp2
+
+from DialRing import DialRing
+from PioNeoPixel import PioNeoPixel
+from Scheduler import Scheduler
+
+
+class _LightMeter:
+    def GetOffset(self):
+        return 0.0
+
+
+def test_pio_drives_the_ring_when_there_is_dma():
+    ring = DialRing(0, _LightMeter(), Scheduler(), use_pio=True)
+    assert isinstance(ring.np, PioNeoPixel)
+
+
+def test_falls_back_to_neopixel_without_dma(monkeypatch):
+    # MicroPython before 1.21 has no rp2.DMA
+    monkeypatch.delattr(rp2, "DMA")
+    ring = DialRing(0, _LightMeter(), Scheduler(), use_pio=True)
+    assert isinstance(ring.np, neopixel.NeoPixel)
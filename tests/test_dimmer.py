@@ -0,0 +1,51 @@
+import pytest
+
+from ColourPipeline import DIAL, GREEN
+from Dimmer import Dimmer
+from RingPatterns import _linear
+
+
+class _LightMeter:
+    def __init__(self, reading):
+        self.reading = reading
+
+    def GetOffset(self):
+        return self.reading
+
+
+def _old_curve(value, reading):
+    # The dial ring before gamma correction: up to 60 off each lit channel, never below 10
+    if value == 0:
+        return 0
+    return max(10, value - reading * 60)
+
+
+@pytest.mark.parametrize("reading", [0.0, 0.4, 1.0])
+def test_dims_like_the_old_offset_and_floor(reading):
+    meter = _LightMeter(reading)
+    green = Dimmer(meter).update()[0]
+    for value in range(256):
+        # Pattern colours are picked through _linear(), so they come out of the gamma correction as they were
+        assert abs(green[_linear(value)] - _old_curve(value, reading)) <= 1
+
+
+def test_tables_only_change_with_the_bucket():
+    meter = _LightMeter(0.0)
+    dimmer = Dimmer(meter)
+    version = dimmer.version
+    meter.reading = 0.01
+    dimmer.update()
+    assert dimmer.version == version
+
+    meter.reading = 1.0
+    dimmer.update()
+    assert dimmer.version == version + 1
+    assert dimmer.tables[0][1] == 10
+    assert dimmer.tables[0][255] == 255 - 60
+
+
+def test_byte_table_offset_and_floor():
+    table = DIAL.byte_table(GREEN, floor=10, offset=60)
+    assert table[0] == 0
+    assert table[255] == 195
+    assert min(table[1:]) == 10
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import Discovery
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_version_is_the_checksum_of_the_configs():
+    assert Discovery.VERSION == Discovery._checksum(payload for _, payload in Discovery.CONFIGS)
+    assert len(Discovery.VERSION) == 8
+    int(Discovery.VERSION, 16)
+
+
+def test_version_changes_with_any_config():
+    payloads = [payload for _, payload in Discovery.CONFIGS]
+    payloads[-1] = payloads[-1].replace(b"}", b" }", 1)
+    assert Discovery._checksum(payloads) != Discovery.VERSION
+
+
+def test_version_is_the_same_in_every_process():
+    # The version is retained on the broker, so a reboot (with different hash seeds) must not change it
+    script = "from sim import harness; harness.install(); import Discovery; print(Discovery.VERSION.decode())"
+    versions = set()
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        versions.add(subprocess.check_output([sys.executable, "-c", script], cwd=_ROOT, env=env, text=True).strip())
+    assert versions == {Discovery.VERSION.decode()}
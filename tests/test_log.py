@@ -0,0 +1,51 @@
+import Log
+
+
+def _flushed(monkeypatch):
+    # Throw away whatever earlier tests logged
+    monkeypatch.setattr(Log, "_sinks", [])
+    Log.flush()
+
+    out = []
+    monkeypatch.setattr(Log, "_sinks", [out.append])
+    monkeypatch.setattr(Log, "level", Log.DEBUG)
+    return out
+
+
+def test_flush_formats_each_record(monkeypatch):
+    out = _flushed(monkeypatch)
+    Log.info("plain")
+    Log.warning("%s and %s", 1, None)
+    Log.error("%d", "not a number")
+    Log.flush()
+
+    lines = out[0].split("\n")
+    assert lines[0].endswith("INFO plain")
+    assert lines[1].endswith("WARNING 1 and None")
+    assert lines[2].endswith("ERROR %d (bad log arguments)")
+    assert Log._count == 0
+
+
+def test_full_ring_drops_the_oldest(monkeypatch):
+    out = _flushed(monkeypatch)
+    for i in range(Log._SIZE + 3):
+        Log.info("record %s", i)
+    Log.flush()
+
+    lines = out[0].split("\n")
+    assert lines[0] == "3 log records dropped"
+    assert lines[1].endswith("record 3")
+    assert len(lines) == Log._SIZE + 1
+
+
+def test_records_are_formatted_without_the_lock(monkeypatch):
+    out = _flushed(monkeypatch)
+
+    class Probe:
+        def __str__(self):
+            return "locked" if Log._lock.locked() else "unlocked"
+
+    Log.info("%s", Probe())
+    Log.flush()
+    assert out[0].endswith("INFO unlocked")
+    assert Log._arg_a == [None] * Log._SIZE
@@ -0,0 +1,26 @@
+import Metrics
+from Metrics import Histogram
+
+
+def test_sample_takes_one_in_every():
+    histogram = Histogram((10,), sample_every=3)
+    assert [histogram.sample() for _ in range(7)] == [True, False, False, True, False, False, True]
+
+
+def test_sample_leaves_the_lock_free():
+    histogram = Histogram((10,))
+    histogram.sample()
+    assert not Metrics.lock.locked()
+
+
+def test_percentiles_are_bucket_bounds():
+    histogram = Histogram((1, 5, 10))
+    for value in (0, 1, 3, 4, 8, 50):
+        histogram.record(value)
+    assert (histogram.count, histogram.total, histogram.max) == (6, 66, 50)
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(80) == 10
+    assert histogram.percentile(100) == 50
+
+    histogram.reset()
+    assert histogram.percentile(50) == 0
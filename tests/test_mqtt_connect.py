@@ -0,0 +1,38 @@
+import pytest
+
+import MqttManager
+
+
+class _OldClient:
+    # umqtt.simple before 1.4.0, whose connect() takes no timeout
+    def __init__(self):
+        self.connects = 0
+
+    def connect(self, clean_session=True):
+        self.connects += 1
+
+
+class _BrokenClient:
+    def connect(self, clean_session=True, timeout=None):
+        raise TypeError("can't convert NoneType to int")
+
+
+@pytest.fixture(autouse=True)
+def _takes_timeout(monkeypatch):
+    monkeypatch.setattr(MqttManager, "_connect_takes_timeout", True)
+
+
+def test_client_without_a_timeout_is_found_out_once():
+    client = _OldClient()
+    MqttManager._connect(client)
+    assert client.connects == 1
+    assert not MqttManager._connect_takes_timeout
+
+    MqttManager._connect(client)
+    assert client.connects == 2
+
+
+def test_type_error_while_connecting_is_raised():
+    with pytest.raises(TypeError):
+        MqttManager._connect(_BrokenClient())
+    assert MqttManager._connect_takes_timeout
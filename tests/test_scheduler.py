@@ -0,0 +1,49 @@
+import pytest
+
+from Scheduler import Scheduler
+from sim import harness
+
+
+@pytest.mark.parametrize("period", [0, -5])
+def test_period_must_be_positive(period):
+    scheduler = Scheduler()
+    with pytest.raises(ValueError):
+        scheduler.periodic(period, lambda t: None, "bad")
+
+    task = scheduler.periodic(100, lambda t: None, "good")
+    with pytest.raises(ValueError):
+        task.set_period(period)
+    assert task.period == 100
+
+
+def test_tasks_run_in_due_then_priority_order():
+    scheduler = Scheduler()
+    ran = []
+    scheduler.once(20, lambda t: ran.append("later"), "later", priority=10)
+    scheduler.once(10, lambda t: ran.append("low"), "low", priority=0)
+    scheduler.once(10, lambda t: ran.append("high"), "high", priority=10)
+    harness.clock.advance_us(20_000)
+    assert scheduler.run_pending() is None
+    assert ran == ["high", "low", "later"]
+
+
+def test_periodic_task_drops_missed_runs():
+    scheduler = Scheduler()
+    task = scheduler.periodic(100, lambda t: None, "tick")
+    harness.clock.advance_us(1_000_000)
+    assert scheduler.run_pending() == 100
+    assert task.runs == 1
+
+
+def test_task_armed_during_a_pass_waits_for_the_next():
+    scheduler = Scheduler()
+    runs = []
+
+    def again(t):
+        runs.append(t)
+        scheduler.once(0, again, "again")
+
+    scheduler.once(0, again, "again")
+    for expected in (1, 2, 3):
+        assert scheduler.run_pending() <= 0
+        assert len(runs) == expected
@@ -0,0 +1,48 @@
+import pytest
+
+import Discovery
+import MqttManager
+from Scheduler import Scheduler
+from sim import broker as broker_module
+from sim.broker import FakeBroker
+from umqtt.simple import MQTTClient
+
+
+class _Clock:
+    def set_state_listener(self, listener):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(broker_module, "_current", None)
+    broker = FakeBroker().install()
+    broker.retained[Discovery.VERSION_TOPIC] = b"0"
+
+    client = MQTTClient(b"test", "broker")
+    client.received = []
+    client.set_callback(lambda topic, msg: client.received.append(topic))
+    client.connect()
+    client.broker = broker
+    return client
+
+
+def _subscribe(client) -> None:
+    MqttManager.MqttManager("broker", None, None, _Clock(), Scheduler())._subscribe_all(client)
+
+
+def test_retained_messages_before_the_suback_are_handled(client):
+    client.broker.retained_first = True
+    _subscribe(client)
+    assert client.received == [Discovery.VERSION_TOPIC]
+
+
+def test_packets_other_than_its_suback_are_skipped(client):
+    # A SUBACK for some other packet id, and an UNSUBACK, both with bodies that mustn't be read as packets
+    client._peer.send(b"\x90\x03\x12\x34\x00" + b"\xb0\x02\x00\x01")
+    _subscribe(client)
+    assert client.broker.subscribe_packets == 1
+
+    # The retained message after the SUBACK is still there to be read
+    client.wait_msg()
+    assert client.received == [Discovery.VERSION_TOPIC]
@@ -0,0 +1,105 @@
+import struct
+
+import TimeSync as time_sync
+from Scheduler import Scheduler
+from sim import harness
+from TimeSync import TimeSync, _NTP_DELTA, _is_ip, _ntp_ms
+
+
+def _advance_ms(ms):
+    harness.clock.advance_us(ms * 1000)
+
+
+def _synced():
+    sync = TimeSync(Scheduler(), "192.0.2.1", 123)
+    sync._apply(1_700_000_000_000, 20)
+    return sync
+
+
+def test_ntp_timestamp_to_unix_ms():
+    msg = bytes(32) + struct.pack("!II", _NTP_DELTA + 10, 1 << 31) + bytes(8)
+    assert _ntp_ms(msg, 32) == 10_500
+
+
+def test_is_ip():
+    assert _is_ip("192.168.1.2")
+    assert not _is_ip("pool.ntp.org")
+    assert not _is_ip("1.2.3")
+    assert not _is_ip("1.2.3.256")
+
+
+def test_ip_host_needs_no_lookup():
+    assert TimeSync(Scheduler(), "192.0.2.1", 123)._resolve() == ("192.0.2.1", 123)
+    assert TimeSync(Scheduler(), "pool.ntp.org", 123)._addr is None
+
+
+def test_first_sync_steps_the_time():
+    before = TimeSync(Scheduler(), "192.0.2.1", 123).now_ms()
+    sync = _synced()
+    assert sync.synced
+    assert sync.now_ms() - before == 1_700_000_000_000
+    assert sync.steps == 0
+
+
+def test_small_offset_is_slewed_in():
+    sync = _synced()
+    sync._apply(100, 20)
+    start = sync.now_ms()
+
+    # _SLEW_PPM is 500, so 50 ms over 100 s
+    _advance_ms(100_000)
+    assert sync.now_ms() - start == 100_000 + 100_000 * time_sync._SLEW_PPM // 1_000_000
+
+    # And no more than the offset however long it runs
+    _advance_ms(300_000)
+    assert sync.now_ms() - start == 400_000 + 100
+
+
+def test_large_offset_is_stepped():
+    sync = _synced()
+    start = sync.now_ms()
+    sync._apply(time_sync._STEP_MS + 1, 20)
+    assert sync.now_ms() - start == time_sync._STEP_MS + 1
+    assert sync.steps == 1
+
+
+def test_drift_is_estimated_from_the_offset_between_syncs():
+    sync = _synced()
+    _advance_ms(time_sync._MIN_INTERVAL_MS)
+
+    # 30 ms in 5 minutes is 100 ppm, half of which is taken up at once
+    sync._apply(30, 0)
+    assert sync.drift_ppb == 30 * 1_000_000_000 // time_sync._MIN_INTERVAL_MS // 2
+    assert sync.interval_ms == time_sync._MIN_INTERVAL_MS
+
+    # The drift estimate is added to the time as it runs
+    sync._apply(0, 0, True)
+    start = sync.now_ms()
+    _advance_ms(1_000_000)
+    assert sync.now_ms() - start == 1_000_000 + 1_000_000 * sync.drift_ppb // 1_000_000_000
+
+
+def test_interval_grows_while_on_time_and_shrinks_when_not():
+    sync = _synced()
+    for _ in range(3):
+        _advance_ms(sync.interval_ms)
+        sync._apply(0, 0)
+    assert sync.interval_ms == 8 * time_sync._MIN_INTERVAL_MS
+
+    _advance_ms(sync.interval_ms)
+    sync._apply(time_sync._TARGET_MS * 2, 0)
+    assert sync.interval_ms == 4 * time_sync._MIN_INTERVAL_MS
+
+
+def test_syncs_close_together_leave_the_drift_alone():
+    sync = _synced()
+    _advance_ms(1000)
+    sync._apply(40, 0)
+    assert sync.drift_ppb == 0
+
+
+def test_drift_estimate_is_bounded():
+    sync = _synced()
+    _advance_ms(time_sync._MIN_INTERVAL_MS)
+    sync._apply(time_sync._STEP_MS, 0)
+    assert sync.drift_ppb == time_sync._MAX_PPB